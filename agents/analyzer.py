@@ -1,21 +1,18 @@
 # Agente Analista: Compara código e documentação para encontrar discrepâncias.
 # agents/analyzer.py
 import json
-from dotenv import load_dotenv
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import budget
+import database
+import crossref
+import metrics
+import retrieval
 import tools
-
-# Carrega as variáveis de ambiente (ex: ANTHROPIC_API_KEY)
-load_dotenv()
-
-try:
-    from agno.agent import Agent
-    from agno.models.anthropic import Claude
-except ImportError:
-    print("Erro: A biblioteca 'agno' não parece estar instalada.")
-    raise
-
-# Carrega as variáveis de ambiente
-load_dotenv()
+from knowledge_base import build_context_block
+from . import runtime, scheduler
 
 # Instruções para o Agente Analista
 analyzer_instructions = """
@@ -33,41 +30,46 @@ Exemplo de Resposta Válida:
 {"discrepancies": ["A função `getUser` em `user_controller.py` não está documentada no `README.md`.", "O `README.md` menciona um sistema de cache, mas não há código de cache visível."]}
 """
 
-# Instância do Agente Analista
-# Usamos um modelo mais capaz (Sonnet) para esta tarefa de raciocínio complexo.
-analyzer_agent = Agent(
-    instructions=analyzer_instructions,
-    model=Claude(id="claude-3-5-sonnet-20241022"),
-    tools=[]  # O Analista não precisa de ferramentas, ele apenas raciocina sobre o conteúdo.
-)
+# Estimativa grosseira usada para dimensionar os lotes do modo fragmentado
+CHARS_PER_TOKEN = 4
+# Orçamento padrão de tokens de conteúdo por lote e paralelismo do modo fragmentado
+DEFAULT_SHARD_TOKEN_BUDGET = 60000
+DEFAULT_SHARD_WORKERS = 4
 
-def run_analyzer(all_file_paths):
+
+def build_analyzer_agent():
     """
-    Executa o Agente Analista para comparar todos os arquivos fornecidos.
-    Args:
-        all_file_paths (list): Uma lista com os caminhos de todos os arquivos a serem analisados.
+    Cria uma nova instância do Agente Analista.
+    Usamos um modelo mais capaz (Sonnet) para esta tarefa de raciocínio complexo.
+    O conteúdo dos arquivos é enviado como bloco de contexto (ver runtime.build_context_agent).
+    """
+    return runtime.build_context_agent("analyzer", analyzer_instructions, "claude-3-5-sonnet-20241022")
+
+
+def get_analyzer_agent():
+    """Retorna a instância compartilhada do Agente Analista, criada no primeiro uso."""
+    return runtime.get_agent("analyzer", build_analyzer_agent)
+
+
+# Tarefa enviada no prompt; o conteúdo dos arquivos vai no bloco de contexto canônico
+ANALYSIS_TASK = ("Analise o conteúdo de todos os arquivos do projeto fornecidos no contexto e gere seu "
+                 "relatório de discrepâncias em formato JSON.\n")
+
+
+def _build_prompt(file_paths, file_contents):
+    """
+    Monta a chamada de análise dos arquivos fornecidos.
     Returns:
-        list: Uma lista de strings contendo as discrepâncias encontradas.
+        tuple: (bloco de contexto canônico, prompt com a tarefa).
     """
-    print(f"[Agente Analista] Lendo e preparando o conteúdo de {len(all_file_paths)} arquivos...")
-    
-    # Constrói um grande prompt com todo o conteúdo dos arquivos
-    content_prompt_part = ""
-    for file_path in all_file_paths:
-        # Usamos nossa ferramenta para ler o conteúdo de cada arquivo
-        content = tools.read_file_content(file_path)
-        content_prompt_part += f"--- Início do conteúdo de: {file_path} ---\n{content}\n--- Fim do conteúdo de: {file_path}---\n\n"
-    
-    prompt = f"""
-Analise o conteúdo de todos os arquivos do projeto fornecidos abaixo e gere seu relatório de discrepâncias em formato JSON.
+    return build_context_block(file_paths, file_contents), ANALYSIS_TASK
 
-{content_prompt_part}
-"""
-    
-    print("[Agente Analista] Enviando o conteúdo para análise do modelo. Isso pode levar um momento...")
-    response = analyzer_agent.run(prompt)
-    print(f"[Agente Analista] Resposta bruta do modelo: {response}")
-    
+
+def _parse_response(response, label="[Agente Analista]"):
+    """
+    Extrai a lista de discrepâncias da resposta do modelo.
+    Em caso de erro, retorna uma lista com uma única mensagem iniciada por "Erro".
+    """
     try:
         # Se a resposta for um objeto RunResponse, extraia o conteúdo
         if hasattr(response, 'content'):
@@ -78,13 +80,502 @@ Analise o conteúdo de todos os arquivos do projeto fornecidos abaixo e gere seu
         report = json.loads(response_content)
         if isinstance(report, dict) and 'discrepancies' in report:
             discrepancies = report['discrepancies']
-            print(f"[Agente Analista] Sucesso: {len(discrepancies)} discrepâncias encontradas.")
+            print(f"{label} Sucesso: {len(discrepancies)} discrepâncias encontradas.")
             return discrepancies
         else:
             error_msg = f"Erro de formato na resposta do Analista: {response_content}"
-            print(f"[Agente Analista] {error_msg}")
+            print(f"{label} {error_msg}")
             return [error_msg]
     except json.JSONDecodeError:
         error_msg = f"Erro de decodificação na resposta do Analista: {response}"
-        print(f"[Agente Analista] {error_msg}")
-        return [error_msg]
\ No newline at end of file
+        print(f"{label} {error_msg}")
+        return [error_msg]
+
+
+def _is_valid_report(response_content):
+    """Indica se a resposta do modelo é um relatório JSON válido (e pode ir para o cache)."""
+    try:
+        report = json.loads(response_content)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(report, dict) and 'discrepancies' in report
+
+
+def run_analyzer(all_file_paths, sharded=False, shard_token_budget=DEFAULT_SHARD_TOKEN_BUDGET,
+                 max_workers=DEFAULT_SHARD_WORKERS, context_mode='full', file_contents=None,
+                 retrieval_top_k=None, use_crossref=False):
+    """
+    Executa o Agente Analista para comparar todos os arquivos fornecidos.
+    Args:
+        all_file_paths (list): Uma lista com os caminhos de todos os arquivos a serem analisados,
+            já em ordem de prioridade.
+        sharded (bool): Se True, divide os arquivos em lotes limitados por shard_token_budget
+            e analisa os lotes em paralelo (ver run_sharded_analyzer).
+        shard_token_budget (int): Orçamento aproximado de tokens de conteúdo por lote.
+        max_workers (int): Número máximo de lotes analisados simultaneamente.
+        context_mode (str): 'full' envia o conteúdo completo; 'skeleton' envia apenas os
+            esqueletos dos arquivos de código; 'summary', os resumos (ver tools.read_project_context).
+        file_contents (dict): Conteúdo já lido dos arquivos (ex: KnowledgeBase.contents);
+            se omitido, os arquivos são lidos aqui.
+        retrieval_top_k (int): Se informado, cada documento é analisado apenas contra os
+            retrieval_top_k arquivos de código mais relevantes (ver run_retrieval_analyzer).
+        use_crossref (bool): Se True, uma verificação cruzada determinística emite as
+            discrepâncias certas e só os casos ambíguos vão ao modelo (ver run_crossref_analyzer).
+    Returns:
+        list: Uma lista de strings contendo as discrepâncias encontradas.
+    """
+    if use_crossref:
+        return run_crossref_analyzer(all_file_paths, context_mode, file_contents)
+    if retrieval_top_k:
+        return run_retrieval_analyzer(all_file_paths, retrieval_top_k, shard_token_budget, max_workers,
+                                      context_mode, file_contents)
+    if sharded:
+        return run_sharded_analyzer(all_file_paths, shard_token_budget, max_workers, context_mode, file_contents)
+
+    print(f"[Agente Analista] Lendo e preparando o conteúdo de {len(all_file_paths)} arquivos...")
+    
+    # Lê o conteúdo através do cache compartilhado com o Escritor
+    if file_contents is None:
+        file_contents = tools.read_project_context(all_file_paths, context_mode)
+    context, prompt = _build_prompt(all_file_paths, file_contents)
+    
+    print("[Agente Analista] Enviando o conteúdo para análise do modelo. Isso pode levar um momento...")
+    response = runtime.run_agent(get_analyzer_agent(), prompt, validate=_is_valid_report, context=context)
+    print(f"[Agente Analista] Resposta bruta do modelo: {response}")
+    
+    return _parse_response(response)
+
+
+def _estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _group_related_files(file_paths, file_contents):
+    """
+    Agrupa arquivos relacionados para que fiquem no mesmo lote: arquivos do mesmo
+    diretório e documentos junto com os arquivos de código que eles citam.
+    Os grupos preservam a ordem de prioridade recebida.
+    """
+    parent = list(range(len(file_paths)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            # A raiz é sempre o arquivo de maior prioridade do grupo
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    first_in_dir = {}
+    doc_indexes = []
+    code_indexes = []
+    for index, path in enumerate(file_paths):
+        directory = os.path.dirname(path)
+        if directory in first_in_dir:
+            union(first_in_dir[directory], index)
+        else:
+            first_in_dir[directory] = index
+        if path.endswith(tools.DOC_EXTENSIONS):
+            doc_indexes.append(index)
+        else:
+            code_indexes.append(index)
+
+    for doc_index in doc_indexes:
+        doc_content = file_contents[file_paths[doc_index]]
+        for code_index in code_indexes:
+            if _mentions(doc_content, file_paths[code_index]):
+                union(doc_index, code_index)
+
+    groups = {}
+    for index, path in enumerate(file_paths):
+        groups.setdefault(find(index), []).append(path)
+    return [groups[root] for root in sorted(groups)]
+
+
+def _plan_shards(file_paths, file_contents, token_budget):
+    """
+    Distribui os grupos de arquivos relacionados em lotes cujo conteúdo estimado não
+    ultrapasse token_budget. Grupos maiores que o orçamento são divididos.
+    """
+    shards = []
+    current = []
+    current_tokens = 0
+    for group in _group_related_files(file_paths, file_contents):
+        group_tokens = sum(_estimate_tokens(file_contents[path]) for path in group)
+        if current and current_tokens + group_tokens > token_budget:
+            shards.append(current)
+            current, current_tokens = [], 0
+        for path in group:
+            tokens = _estimate_tokens(file_contents[path])
+            if current and current_tokens + tokens > token_budget:
+                shards.append(current)
+                current, current_tokens = [], 0
+            current.append(path)
+            current_tokens += tokens
+    if current:
+        shards.append(current)
+    return shards
+
+
+def _normalize_discrepancy(discrepancy):
+    return re.sub(r"\s+", " ", str(discrepancy)).strip().casefold()
+
+
+def merge_discrepancies(results):
+    """
+    Combina as listas de discrepâncias de vários lotes, removendo duplicatas
+    (comparação sem diferenciar maiúsculas nem espaços) e preservando a ordem.
+    """
+    merged = []
+    seen = set()
+    for discrepancies in results:
+        for discrepancy in discrepancies:
+            key = _normalize_discrepancy(discrepancy)
+            if key not in seen:
+                seen.add(key)
+                merged.append(discrepancy)
+    return merged
+
+
+def _analyze_shard(index, total, shard_paths, file_contents):
+    label = f"[Agente Analista | lote {index + 1}/{total}]"
+    print(f"{label} Analisando {len(shard_paths)} arquivos...")
+    # Cada lote usa sua própria instância do agente para que as chamadas sejam independentes
+    # Lotes são especulativos: o Escritor e as análises únicas passam na frente no escalonador
+    context, prompt = _build_prompt(shard_paths, file_contents)
+    response = runtime.run_agent(build_analyzer_agent(), prompt, validate=_is_valid_report,
+                                 priority=scheduler.PRIORITY_LOW, context=context)
+    return _parse_response(response, label)
+
+
+def run_sharded_analyzer(all_file_paths, shard_token_budget=DEFAULT_SHARD_TOKEN_BUDGET,
+                         max_workers=DEFAULT_SHARD_WORKERS, context_mode='full', file_contents=None):
+    """
+    Modo fragmentado (map-reduce) do Agente Analista.
+
+    A lista priorizada é dividida em lotes limitados por um orçamento de tokens,
+    mantendo documentos e código relacionados juntos; os lotes são analisados em
+    paralelo e os resultados combinados em uma única lista sem duplicatas.
+    Returns:
+        list: A lista combinada de discrepâncias, ou uma lista com a mensagem de erro
+        se todos os lotes falharem.
+    """
+    print(f"[Agente Analista] Lendo e preparando o conteúdo de {len(all_file_paths)} arquivos...")
+    if file_contents is None:
+        file_contents = tools.read_project_context(all_file_paths, context_mode)
+    shards = _plan_shards(all_file_paths, file_contents, shard_token_budget)
+    print(f"[Agente Analista] {len(shards)} lotes de até ~{shard_token_budget} tokens, "
+          f"analisados com até {max_workers} chamadas simultâneas.")
+    return _run_shards(shards, file_contents, max_workers)
+
+
+def _run_shards(shards, file_contents, max_workers):
+    """Analisa os lotes em paralelo e combina os resultados, ignorando os lotes com erro."""
+    results = []
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(shards)))) as executor:
+        futures = [
+            metrics.submit(executor, _analyze_shard, index, len(shards), shard_paths, file_contents)
+            for index, shard_paths in enumerate(shards)
+        ]
+        for index, future in enumerate(futures):
+            try:
+                discrepancies = future.result()
+            except Exception as e:
+                discrepancies = [f"Erro ao analisar o lote {index + 1}: {e}"]
+            if discrepancies and "Erro" in discrepancies[0]:
+                errors.append(discrepancies[0])
+            else:
+                results.append(discrepancies)
+
+    if errors and not results:
+        return errors[:1]
+    for error in errors:
+        print(f"[Agente Analista] Aviso: lote ignorado. {error}")
+
+    merged = merge_discrepancies(results)
+    print(f"[Agente Analista] Sucesso: {len(merged)} discrepâncias únicas em {len(shards)} lotes.")
+    return merged
+
+
+def _plan_retrieval_shards(all_file_paths, file_contents, top_k, shard_token_budget):
+    """
+    Monta um lote por documento com os top_k arquivos de código recuperados pelo índice
+    BM25. O código que nenhum documento recuperou é distribuído em lotes extras junto
+    com o documento principal, para que funções não documentadas continuem sendo apontadas.
+    """
+    doc_paths = [path for path in all_file_paths if path.endswith(tools.DOC_EXTENSIONS)]
+    code_paths = [path for path in all_file_paths if not path.endswith(tools.DOC_EXTENSIONS)]
+    # Apenas o código entra no índice; os documentos são as consultas
+    index, vectors = retrieval.build_index(all_file_paths, file_contents, indexed_paths=code_paths)
+
+    matches_by_doc = {}
+    retrieved = set()
+    for doc_path in doc_paths:
+        terms = index.query_terms(vectors[doc_path])
+        matches_by_doc[doc_path] = [path for path, _ in index.search(terms, top_k)]
+        retrieved.update(matches_by_doc[doc_path])
+    orphans = [path for path in code_paths if path not in retrieved]
+
+    # O documento principal (README, se houver) acompanha os lotes de código órfão
+    primary_doc = next((path for path in doc_paths if os.path.basename(path).lower() == 'readme.md'), doc_paths[0])
+    shards = [
+        [doc_path] + matches for doc_path, matches in matches_by_doc.items()
+        if matches or not (orphans and doc_path == primary_doc)
+    ]
+    for orphan_shard in _plan_shards(orphans, file_contents, shard_token_budget):
+        shards.append([primary_doc] + orphan_shard)
+    print(f"[Agente Analista] Recuperação: {len(doc_paths)} documentos com até {top_k} arquivos de código cada, "
+          f"{len(orphans)} arquivos de código sem documento relacionado.")
+    return shards
+
+
+def run_retrieval_analyzer(all_file_paths, top_k=retrieval.DEFAULT_TOP_K, shard_token_budget=DEFAULT_SHARD_TOKEN_BUDGET,
+                           max_workers=DEFAULT_SHARD_WORKERS, context_mode='full', file_contents=None):
+    """
+    Modo por recuperação do Agente Analista.
+
+    Cada documento é analisado apenas contra os top_k arquivos de código mais
+    relevantes segundo um índice BM25 (ver retrieval.py), em chamadas paralelas
+    e independentes. Sem documentos no projeto, recai no modo fragmentado.
+    Returns:
+        list: A lista combinada de discrepâncias, ou uma lista com a mensagem de erro
+        se todas as chamadas falharem.
+    """
+    print(f"[Agente Analista] Lendo e preparando o conteúdo de {len(all_file_paths)} arquivos...")
+    if file_contents is None:
+        file_contents = tools.read_project_context(all_file_paths, context_mode)
+    if not any(path.endswith(tools.DOC_EXTENSIONS) for path in all_file_paths):
+        print("[Agente Analista] Nenhum documento para emparelhar; usando o modo fragmentado.")
+        return run_sharded_analyzer(all_file_paths, shard_token_budget, max_workers, context_mode, file_contents)
+    shards = _plan_retrieval_shards(all_file_paths, file_contents, top_k, shard_token_budget)
+    return _run_shards(shards, file_contents, max_workers)
+
+
+def run_crossref_analyzer(all_file_paths, context_mode='full', file_contents=None):
+    """
+    Modo de verificação cruzada do Agente Analista.
+
+    Uma passada determinística (ver crossref.py) compara as referências da documentação
+    com a tabela de símbolos do código e emite diretamente as discrepâncias certas; apenas
+    os casos ambíguos, com trechos curtos do documento e do código, são enviados ao modelo.
+    Sem casos ambíguos, nenhuma chamada ao modelo é feita.
+    Returns:
+        list: As discrepâncias certas somadas às confirmadas pelo modelo.
+    """
+    print(f"[Agente Analista] Verificação cruzada de {len(all_file_paths)} arquivos...")
+    # A verificação precisa do conteúdo completo, mesmo no modo de contexto 'skeleton'
+    if file_contents is None or context_mode != 'full':
+        file_contents = tools.read_project_files(all_file_paths)
+    certain, ambiguous = crossref.cross_reference(all_file_paths, file_contents)
+    if not ambiguous:
+        return certain
+
+    print(f"[Agente Analista] Enviando {len(ambiguous)} casos ambíguos para o modelo...")
+    response = runtime.run_agent(get_analyzer_agent(), crossref.build_ambiguous_prompt(ambiguous, file_contents),
+                                 validate=_is_valid_report)
+    confirmed = _parse_response(response)
+    if confirmed and "Erro" in confirmed[0]:
+        if not certain:
+            return confirmed
+        print(f"[Agente Analista] Aviso: casos ambíguos não verificados. {confirmed[0]}")
+        return certain
+    return merge_discrepancies([certain, confirmed])
+
+
+def plan_calls(all_file_paths, file_contents, sharded=False, shard_token_budget=DEFAULT_SHARD_TOKEN_BUDGET,
+               retrieval_top_k=None, use_crossref=False):
+    """
+    As chamadas ao modelo que run_analyzer faria com os mesmos argumentos, sem fazê-las
+    (usado pelo modo --dry-run). A verificação cruzada e a recuperação são locais e são
+    executadas aqui para saber quais chamadas restam.
+    Returns:
+        list: Uma tupla (caminhos do bloco de contexto, prompt) por chamada.
+    """
+    if use_crossref:
+        raw_contents = tools.read_project_files(all_file_paths)
+        _, ambiguous = crossref.cross_reference(all_file_paths, raw_contents)
+        return [([], crossref.build_ambiguous_prompt(ambiguous, raw_contents))] if ambiguous else []
+    has_docs = any(path.endswith(tools.DOC_EXTENSIONS) for path in all_file_paths)
+    if retrieval_top_k and has_docs:
+        shards = _plan_retrieval_shards(all_file_paths, file_contents, retrieval_top_k, shard_token_budget)
+    elif sharded or retrieval_top_k:
+        shards = _plan_shards(all_file_paths, file_contents, shard_token_budget)
+    else:
+        shards = [list(all_file_paths)]
+    return [(shard_paths, ANALYSIS_TASK) for shard_paths in shards]
+
+
+# Nome usado nas tabelas 'memory' e 'run_history' para o estado incremental
+INCREMENTAL_MEMORY_AGENT = "analyzer_incremental"
+
+
+def _memory_key(project_path, file_path):
+    return f"{project_path}\n{file_path}"
+
+
+def _mentions(text, file_path):
+    """Indica se o texto cita o arquivo pelo nome (ex: 'auth.py') ou pelo nome sem extensão."""
+    base_name = os.path.basename(file_path)
+    stem = os.path.splitext(base_name)[0]
+    return base_name in text or (len(stem) >= 3 and stem in text)
+
+
+def _attribute_discrepancies(discrepancies, analyzed_paths):
+    """
+    Associa cada discrepância aos arquivos citados em seu texto. Discrepâncias que não
+    citam nenhum arquivo são atribuídas a todos os arquivos analisados nesta execução,
+    para que sejam reavaliadas quando qualquer um deles mudar.
+    """
+    findings = {path: [] for path in analyzed_paths}
+    # Mesmo critério de _mentions, com os nomes calculados uma única vez por arquivo
+    names = []
+    for path in analyzed_paths:
+        base_name = os.path.basename(path)
+        stem = os.path.splitext(base_name)[0]
+        names.append((path, base_name, stem if len(stem) >= 3 else None))
+    for discrepancy in discrepancies:
+        cited = [path for path, base_name, stem in names
+                 if base_name in discrepancy or (stem is not None and stem in discrepancy)]
+        for path in cited or analyzed_paths:
+            findings[path].append(discrepancy)
+    return findings
+
+
+def _load_incremental_state(project_path):
+    """Carrega o estado incremental do projeto: caminho -> {'hash', 'findings'}."""
+    key_prefix = _memory_key(project_path, "")
+    previous = {}
+    for key, value in database.load_memory_by_prefix(INCREMENTAL_MEMORY_AGENT, key_prefix).items():
+        try:
+            previous[key[len(key_prefix):]] = json.loads(value)
+        except json.JSONDecodeError:
+            continue
+    return previous
+
+
+def _diff_state(previous, all_paths, hashes):
+    changed = [path for path in all_paths
+               if path not in previous or previous[path].get('hash') != hashes.get(path)]
+    removed = [path for path in previous if path not in hashes]
+    return changed, removed
+
+
+def pending_changes(project_path, all_paths, hashes):
+    """
+    Compara os hashes atuais com o estado incremental salvo do projeto, sem analisar nada
+    (usado pelo daemon para antecipar o trabalho da próxima execução incremental).
+    Returns:
+        tuple: (caminhos novos ou alterados, caminhos removidos).
+    """
+    return _diff_state(_load_incremental_state(os.path.abspath(project_path)), all_paths, hashes)
+
+
+def incremental_delta(project_path, knowledge_base):
+    """
+    Arquivos que a próxima execução incremental vai reanalisar: os novos ou alterados e os
+    documentos que citam algum arquivo de código alterado. Nada é analisado aqui.
+    Returns:
+        tuple: (caminhos a reanalisar, hashes atuais, estado salvo, caminhos removidos).
+    """
+    project_path = os.path.abspath(project_path)
+    all_paths = knowledge_base.paths()
+    contents, hashes = tools.read_project_files(all_paths, with_hashes=True)
+
+    previous = _load_incremental_state(project_path)
+    changed, removed = _diff_state(previous, all_paths, hashes)
+
+    # Documentos que citam código alterado também precisam ser reavaliados
+    changed_set = set(changed)
+    file_types = knowledge_base.types()
+    changed_code = [path for path in changed if file_types[path] == 'codigo']
+    dependent_docs = [
+        entry.path for entry in knowledge_base.documentation()
+        if entry.path not in changed_set
+        and any(_mentions(contents[entry.path], code_path) for code_path in changed_code)
+    ]
+    to_analyze = changed + dependent_docs
+    print(f"[Agente Analista] Modo incremental: {len(changed)} arquivos alterados, "
+          f"{len(dependent_docs)} documentos dependentes, {len(all_paths) - len(to_analyze)} reaproveitados.")
+    return to_analyze, hashes, previous, removed
+
+
+def run_incremental_analyzer(project_path, knowledge_base, sharded=False,
+                             shard_token_budget=DEFAULT_SHARD_TOKEN_BUDGET, context_mode='full',
+                             retrieval_top_k=None, use_crossref=False, token_budget=None):
+    """
+    Executa o Agente Analista apenas sobre o que mudou desde a última execução.
+
+    A impressão digital (hash do conteúdo) e as discrepâncias atribuídas a cada arquivo
+    ficam na tabela 'memory'. São reanalisados os arquivos novos ou alterados e os
+    documentos que citam algum arquivo de código alterado; o resultado é combinado com
+    as discrepâncias já conhecidas dos demais arquivos.
+    Args:
+        project_path (str): O diretório do projeto (parte da chave do estado persistido).
+        knowledge_base (KnowledgeBase): Os arquivos encontrados pelo Pesquisador.
+        sharded (bool): Analisa o delta no modo fragmentado (ver run_analyzer).
+        shard_token_budget (int): Orçamento aproximado de tokens por lote.
+        context_mode (str): Modo de contexto enviado ao modelo ('full', 'skeleton' ou 'summary').
+        retrieval_top_k (int): Analisa o delta no modo por recuperação (ver run_analyzer).
+        use_crossref (bool): Analisa o delta com a verificação cruzada (ver run_analyzer).
+        token_budget (int): Se informado, o conteúdo do delta é reduzido para caber no
+            orçamento (ver budget.select_within_budget); não se aplica à verificação cruzada.
+    Returns:
+        list: A lista combinada de discrepâncias.
+    """
+    project_path = os.path.abspath(project_path)
+    all_paths = knowledge_base.paths()
+    to_analyze, hashes, previous, removed = incremental_delta(project_path, knowledge_base)
+
+    # Arquivos omitidos pelo orçamento não são marcados como analisados e voltam na próxima execução
+    analyzed_paths = to_analyze
+    if to_analyze:
+        file_contents = None
+        if token_budget and not use_crossref:
+            selection = budget.select_within_budget(
+                to_analyze, tools.read_project_context(to_analyze, context_mode), token_budget, context_mode)
+            file_contents = selection.contents
+            analyzed_paths = selection.paths()
+            print(f"[Agente Analista] Orçamento de {token_budget} tokens aplicado ao delta: {selection}.")
+        new_discrepancies = run_analyzer(analyzed_paths, sharded=sharded, shard_token_budget=shard_token_budget,
+                                         context_mode=context_mode, file_contents=file_contents,
+                                         retrieval_top_k=retrieval_top_k, use_crossref=use_crossref)
+        if new_discrepancies and "Erro" in new_discrepancies[0]:
+            # Não persiste nada: a próxima execução tentará novamente os mesmos arquivos
+            return new_discrepancies
+        findings = _attribute_discrepancies(new_discrepancies, analyzed_paths)
+    else:
+        new_discrepancies = []
+        findings = {}
+
+    items = {
+        _memory_key(project_path, path): json.dumps({"hash": hashes[path], "findings": findings[path]})
+        for path in analyzed_paths if path in hashes
+    }
+    database.save_memory(
+        INCREMENTAL_MEMORY_AGENT, items,
+        delete_keys=[_memory_key(project_path, path) for path in removed]
+    )
+
+    # Combina as descobertas novas com as dos arquivos inalterados, sem duplicatas
+    merged = []
+    seen = set()
+    for path in all_paths:
+        path_findings = findings[path] if path in findings else previous.get(path, {}).get('findings', [])
+        for discrepancy in path_findings:
+            if discrepancy not in seen:
+                seen.add(discrepancy)
+                merged.append(discrepancy)
+
+    database.record_run(
+        metrics.current_run_id() or str(uuid.uuid4()), INCREMENTAL_MEMORY_AGENT,
+        json.dumps({"project_path": project_path, "analyzed": analyzed_paths, "removed": removed,
+                    "reused": len(all_paths) - len(analyzed_paths)}, ensure_ascii=False),
+        json.dumps({"new": new_discrepancies, "merged": merged}, ensure_ascii=False)
+    )
+    print(f"[Agente Analista] {len(new_discrepancies)} discrepâncias novas, {len(merged)} no total.")
+    return merged
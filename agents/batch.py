@@ -0,0 +1,122 @@
+# agents/batch.py
+# Modo batch: analisa muitos projetos em paralelo, sem interação com o usuário.
+import contextlib
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Diretório padrão dos logs de cada projeto analisado em batch
+DEFAULT_LOG_DIR = "batch_logs"
+
+
+def read_manifest(manifest_path):
+    """
+    Lê um manifesto de projetos: um caminho por linha; linhas vazias e iniciadas
+    por '#' são ignoradas. Caminhos relativos são resolvidos a partir do manifesto.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    paths = []
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                paths.append(os.path.normpath(os.path.join(base_dir, os.path.expanduser(line))))
+    return paths
+
+
+def _init_worker(limiter, use_llm_cache):
+    # Cada processo do pool compartilha o mesmo semáforo de requisições ao modelo
+    from . import runtime
+    runtime.set_request_limiter(limiter)
+    runtime.set_llm_cache_enabled(use_llm_cache)
+
+
+def _log_path(log_dir, project_path):
+    digest = hashlib.sha1(project_path.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(log_dir, f"{os.path.basename(project_path.rstrip(os.sep)) or 'projeto'}-{digest}.log")
+
+
+def _analyze_project(project_path, options, log_dir):
+    """Executa a orquestração de um projeto em um processo do pool, com a saída em um log próprio."""
+    from .orchestrator import run_orchestration
+    started = time.monotonic()
+    log_path = _log_path(log_dir, project_path)
+    with open(log_path, 'w', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            summary = run_orchestration(project_path, **options)
+        except Exception as e:
+            print(f"❌ Erro inesperado: {e!r}")
+            summary = {"project_path": project_path, "status": "erro", "error": repr(e)}
+    summary["wall_time"] = round(time.monotonic() - started, 2)
+    summary["log_path"] = log_path
+    return summary
+
+
+def run_batch(project_paths, workers=None, max_requests=4, log_dir=DEFAULT_LOG_DIR, use_llm_cache=True,
+              **options):
+    """
+    Analisa vários projetos em paralelo em um pool de processos.
+
+    O número de requisições simultâneas ao modelo é limitado globalmente (entre todos os
+    processos) por max_requests. A confirmação interativa de arquivamento é substituída
+    pela política em options['archive_policy'] ('never' por padrão).
+    Args:
+        project_paths (list): Os diretórios dos projetos.
+        workers (int): Número de processos (padrão: número de CPUs, limitado ao de projetos).
+        max_requests (int): Máximo de requisições ao modelo em andamento ao mesmo tempo.
+        log_dir (str): Diretório onde a saída de cada projeto é gravada.
+        use_llm_cache (bool): Se False, ignora o cache de respostas do modelo.
+        **options: Opções repassadas para run_orchestration.
+    Returns:
+        list: O resumo de cada projeto, na ordem recebida.
+    """
+    options.setdefault('archive_policy', 'never')
+    if options['archive_policy'] == 'ask':
+        raise ValueError("O modo batch não é interativo: use a política de arquivamento 'always' ou 'never'.")
+
+    valid_paths = []
+    summaries = {}
+    for path in project_paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            valid_paths.append(path)
+        else:
+            summaries[path] = {"project_path": path, "status": "erro", "error": "Diretório inválido."}
+
+    os.makedirs(log_dir, exist_ok=True)
+    log_dir = os.path.abspath(log_dir)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(valid_paths) or 1))
+    print(f"[Batch] {len(valid_paths)} projetos, {workers} processos, "
+          f"até {max_requests} requisições simultâneas ao modelo. Logs em: {log_dir}")
+
+    with multiprocessing.Manager() as manager:
+        limiter = manager.BoundedSemaphore(max_requests)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(limiter, use_llm_cache)) as executor:
+            futures = {executor.submit(_analyze_project, path, options, log_dir): path for path in valid_paths}
+            for future, path in futures.items():
+                try:
+                    summaries[path] = future.result()
+                except Exception as e:
+                    summaries[path] = {"project_path": path, "status": "erro", "error": repr(e)}
+                summary = summaries[path]
+                print(f"[Batch] {summary['status']:<18} {path}")
+
+    return [summaries[os.path.abspath(path)] for path in project_paths]
+
+
+def print_batch_summary(summaries):
+    """Imprime uma linha de resumo por projeto e os totais do batch."""
+    print("\n" + "-" * 60)
+    print(f"{'status':<18} {'arquivos':>8} {'discrep.':>8} {'arquiv.':>7} {'tempo (s)':>9}  projeto")
+    for summary in summaries:
+        print(f"{summary.get('status') or '-':<18} {summary.get('files', 0):>8} {summary.get('discrepancies', 0):>8} "
+              f"{summary.get('archived', 0):>7} {summary.get('wall_time', 0):>9}  {summary['project_path']}")
+        if summary.get('error'):
+            print(f"{'':<18} erro: {summary['error']}")
+    completed = sum(1 for summary in summaries if summary.get('status') == 'concluido')
+    print("-" * 60)
+    print(f"{completed} de {len(summaries)} projetos concluídos.")
@@ -1,69 +1,258 @@
 # agents/orchestrator.py
 import os
 import shutil
+import budget
+import metrics
+import tools
+from knowledge_base import CONTEXT_CLOSING, CONTEXT_HEADER, CONTEXT_OPENING
+from . import runtime
 from .researcher import run_researcher
-from .analyzer import run_analyzer
-from .writer import run_writer
+from .analyzer import (run_analyzer, run_incremental_analyzer, incremental_delta, plan_calls, analyzer_instructions,
+                       DEFAULT_SHARD_TOKEN_BUDGET, DEFAULT_SHARD_WORKERS)
+from .writer import run_writer, run_writer_stream, run_section_writer, writer_instructions
+from .summarizer import run_summarizer, plan_summarizer, SUMMARY_WORKERS
+from summaries import DEFAULT_SUMMARY_TOKEN_BUDGET
 
-def run_orchestration(project_path):
+# Políticas aceitas para o arquivamento da documentação antiga em docs.old
+ARCHIVE_POLICIES = ('ask', 'always', 'never')
+
+# Padrões glob dos arquivos analisados
+SEARCH_PATTERNS = [
+    '**/*.py', '**/*.js', '**/*.ts',  # Código
+    '**/*.md', '**/*.txt'  # Documentação
+]
+
+
+def run_orchestration(project_path, use_researcher_agent=False, incremental=False, sharded=False,
+                      shard_token_budget=DEFAULT_SHARD_TOKEN_BUDGET, stream_writer=False, context_mode='full',
+                      archive_policy='ask', retrieval_top_k=None, use_crossref=False, section_writer=False,
+                      deduplicate=False, summary_token_budget=DEFAULT_SUMMARY_TOKEN_BUDGET, token_budget=None,
+                      cost_budget=None, dry_run=False):
     """
     Orquestra todo o fluxo de trabalho de análise e reescrita de documentação.
+    Args:
+        project_path (str): O diretório do projeto a ser analisado.
+        use_researcher_agent (bool): Se True, a descoberta de arquivos é feita pelo
+            modelo de linguagem em vez da varredura local.
+        incremental (bool): Se True, reanalisa apenas os arquivos alterados desde a
+            última execução e reaproveita as discrepâncias já conhecidas.
+        sharded (bool): Se True, o Analista divide os arquivos em lotes limitados por
+            shard_token_budget e os analisa em paralelo.
+        shard_token_budget (int): Orçamento aproximado de tokens por lote.
+        stream_writer (bool): Se True, o Escritor grava o README incrementalmente
+            enquanto ele é gerado.
+        context_mode (str): 'full' envia o conteúdo completo dos arquivos ao Analista e ao
+            Escritor; 'skeleton' envia apenas os esqueletos dos arquivos de código; 'summary'
+            envia a árvore de resumos do projeto na profundidade que cabe em summary_token_budget.
+        archive_policy (str): O que fazer com os arquivos de documentação antigos após gerar
+            o novo README: 'ask' (pergunta ao usuário), 'always' (arquiva sem perguntar) ou
+            'never' (não arquiva). Execuções não interativas devem usar 'always' ou 'never'.
+        retrieval_top_k (int): Se informado, cada documento é analisado apenas contra os
+            retrieval_top_k arquivos de código mais relevantes de um índice BM25.
+        use_crossref (bool): Se True, uma verificação cruzada determinística entre documentação
+            e código substitui a análise completa; só os casos ambíguos vão ao modelo.
+        section_writer (bool): Se True, o Escritor regenera apenas as seções do README
+            existente afetadas pelas discrepâncias (tem precedência sobre stream_writer).
+        deduplicate (bool): Se True, arquivos idênticos ou quase idênticos a outro de maior
+            prioridade são omitidos dos prompts; o representante mantido recebe uma nota com
+            os caminhos omitidos.
+        summary_token_budget (int): Orçamento aproximado de tokens do contexto no modo 'summary'.
+        token_budget (int): Limite de tokens de entrada por etapa (Analista e Escritor). Os
+            arquivos de menor prioridade que não couberem são reduzidos ao esqueleto,
+            truncados ou omitidos (ver budget.select_within_budget).
+        cost_budget (float): Limite de custo por etapa, em US$, convertido em tokens pelos
+            preços do modelo; com token_budget, vale o menor dos dois.
+        dry_run (bool): Se True, imprime os tokens, o custo e a latência estimados de cada
+            etapa e encerra sem chamar o modelo (a descoberta é sempre local).
+    Returns:
+        dict: Resumo da execução, com 'status' ('concluido', 'simulado', 'sem_arquivos',
+        'sem_discrepancias', 'erro_analise' ou 'erro_escrita'), 'run_id', 'files',
+        'discrepancies', 'readme_path', 'archived' e 'error'; no modo dry_run, 'estimates'
+        traz a estimativa de cada etapa.
     """
+    if archive_policy not in ARCHIVE_POLICIES:
+        raise ValueError(f"Política de arquivamento desconhecida: {archive_policy!r}. Use uma de {ARCHIVE_POLICIES}.")
+    summary = {
+        "project_path": os.path.abspath(project_path),
+        "status": None,
+        "run_id": None,
+        "files": 0,
+        "discrepancies": 0,
+        "readme_path": None,
+        "archived": 0,
+        "error": None,
+    }
+    # Todas as etapas e chamadas ao modelo são registradas em 'run_history' sob o mesmo run_id
+    with metrics.run(os.path.abspath(project_path)) as recorder:
+        summary["run_id"] = recorder.run_id
+        print(f"[Orquestrador] Execução {recorder.run_id}")
+        _orchestrate(project_path, use_researcher_agent, incremental, sharded, shard_token_budget,
+                     stream_writer, context_mode, archive_policy, retrieval_top_k, use_crossref,
+                     section_writer, deduplicate, summary_token_budget, token_budget, cost_budget, dry_run,
+                     summary)
+    return summary
+
+
+def _orchestrate(project_path, use_researcher_agent, incremental, sharded, shard_token_budget,
+                 stream_writer, context_mode, archive_policy, retrieval_top_k, use_crossref,
+                 section_writer, deduplicate, summary_token_budget, token_budget, cost_budget, dry_run, summary):
     print("--- Iniciando Orquestração da Análise de Documentação ---")
     print(f"Projeto Alvo: {os.path.abspath(project_path)}")
     print("-" * 60)
     
     # ETAPA 1: PESQUISA
-    search_patterns = [
-        '**/*.py', '**/*.js', '**/*.ts',  # Código
-        '**/*.md', '**/*.txt'  # Documentação
-    ]
-    knowledge_base = run_researcher(project_path, search_patterns)
+    if dry_run and use_researcher_agent:
+        print("[Orquestrador] Simulação: a descoberta de arquivos usa a varredura local em vez do modelo.")
+        use_researcher_agent = False
+    with metrics.stage("discovery") as stage_metrics:
+        knowledge_base = run_researcher(project_path, SEARCH_PATTERNS, use_agent=use_researcher_agent)
+        stage_metrics.update(files=len(knowledge_base), bytes=knowledge_base.total_size())
     
     if not knowledge_base:
         print("\n[Orquestrador] O Agente Pesquisador não encontrou arquivos relevantes. Encerrando.")
+        summary["status"] = "sem_arquivos"
         return
+    summary["files"] = len(knowledge_base)
     
     # ETAPA 2: ORGANIZAÇÃO
     print(f"\n[Orquestrador] O Pesquisador encontrou {len(knowledge_base)} arquivos.")
-    knowledge_base.sort(key=lambda x: (x['is_readme'], x['last_modified']), reverse=True)
+    with metrics.stage("organization", files=len(knowledge_base)):
+        knowledge_base.sort_by_priority()
     print("Ordem de prioridade para análise definida (READMEs e arquivos recentes primeiro).")
     
-    file_paths_for_analyzer = [item['path'] for item in knowledge_base]
+    # ETAPA 2.1: ELIMINAÇÃO DE DUPLICATAS
+    if deduplicate:
+        with metrics.stage("dedup", files=len(knowledge_base)) as stage_metrics:
+            clusters = knowledge_base.deduplicate()
+            stage_metrics["duplicates"] = len(knowledge_base.duplicates)
+        if clusters:
+            print(f"[Orquestrador] {len(knowledge_base.duplicates)} arquivos duplicados omitidos; "
+                  f"{len(clusters)} representantes mantidos.")
+    
+    # ETAPA 2.2: ÁRVORE DE RESUMOS
+    estimates = []
+    if context_mode == 'summary':
+        with metrics.stage("summarization", files=len(knowledge_base)) as stage_metrics:
+            if dry_run:
+                call_tokens, selection = plan_summarizer(project_path, knowledge_base, summary_token_budget)
+                estimates.append(budget.StageEstimate("summarization", call_tokens, agent="summarizer",
+                                                      workers=SUMMARY_WORKERS))
+            else:
+                selection = run_summarizer(project_path, knowledge_base, summary_token_budget)
+            knowledge_base.use_contents('summary', selection)
+            stage_metrics["nodes"] = len(selection)
+    
+    # ETAPA 2.3: ORÇAMENTO DE TOKENS
+    context_budget = budget.context_token_budget(token_budget, cost_budget)
+    if context_budget is not None:
+        with metrics.stage("budget", budget=context_budget) as stage_metrics:
+            selection = budget.select_within_budget(
+                knowledge_base.context_paths(context_mode), knowledge_base.contents(context_mode), context_budget,
+                context_mode, skeletons=lambda paths: knowledge_base.contents_of('skeleton', paths))
+            knowledge_base.use_contents(context_mode, selection.contents)
+            stage_metrics.update(tokens=selection.tokens, original_tokens=selection.original_tokens,
+                                 skeleton=selection.count('skeleton'), truncated=selection.count('truncated'),
+                                 omitted=selection.count('omitted'))
+        print(f"[Orquestrador] Orçamento de {context_budget} tokens de contexto por etapa: "
+              f"~{selection.original_tokens} -> ~{selection.tokens} tokens ({selection.count('skeleton')} "
+              f"reduzidos ao esqueleto, {selection.count('truncated')} truncados, "
+              f"{selection.count('omitted')} omitidos).")
+    
+    # A verificação cruzada compara arquivos reais; os demais modos recebem os nós do contexto
+    file_paths_for_analyzer = knowledge_base.paths() if use_crossref else knowledge_base.context_paths(context_mode)
+    
+    if dry_run:
+        estimates += _estimate_stages(project_path, knowledge_base, file_paths_for_analyzer, context_mode, incremental,
+                                      sharded, shard_token_budget, retrieval_top_k, use_crossref, section_writer,
+                                      context_budget)
+        print("\n[Orquestrador] Simulação (--dry-run): estimativas por etapa, sem chamar o modelo.")
+        budget.print_estimates(estimates)
+        summary["status"] = "simulado"
+        summary["estimates"] = [estimate.as_dict() for estimate in estimates]
+        return
     print(f"\n[Orquestrador] Enviando {len(file_paths_for_analyzer)} arquivos para o Analista.")
     print("-" * 60)
     
     # ETAPA 3: ANÁLISE
-    discrepancies = run_analyzer(file_paths_for_analyzer)
+    with metrics.stage("analysis", files=len(file_paths_for_analyzer)) as stage_metrics:
+        if incremental:
+            discrepancies = run_incremental_analyzer(project_path, knowledge_base, sharded=sharded,
+                                                     shard_token_budget=shard_token_budget,
+                                                     context_mode=context_mode, retrieval_top_k=retrieval_top_k,
+                                                     use_crossref=use_crossref, token_budget=context_budget)
+        else:
+            # O conteúdo lido aqui fica na base de conhecimento e é reaproveitado pelo Escritor;
+            # a verificação cruzada relê os arquivos completos se o orçamento reduziu o conteúdo
+            file_contents = knowledge_base.contents(context_mode)
+            if use_crossref and context_budget is not None:
+                file_contents = None
+            discrepancies = run_analyzer(file_paths_for_analyzer, sharded=sharded,
+                                         shard_token_budget=shard_token_budget, context_mode=context_mode,
+                                         file_contents=file_contents,
+                                         retrieval_top_k=retrieval_top_k, use_crossref=use_crossref)
+        stage_metrics["discrepancies"] = len(discrepancies or [])
     
     if not discrepancies or (isinstance(discrepancies, list) and discrepancies and "Erro" in discrepancies[0]):
         print("\n[Orquestrador] Nenhuma discrepância encontrada ou ocorreu um erro na análise. Processo finalizado.")
         if discrepancies and "Erro" in discrepancies[0]:
             print(f"   Detalhe do erro: {discrepancies[0]}")
+            summary["status"] = "erro_analise"
+            summary["error"] = discrepancies[0]
+        else:
+            summary["status"] = "sem_discrepancias"
         return
+    summary["discrepancies"] = len(discrepancies)
     
     print(f"\n[Orquestrador] O Analista encontrou {len(discrepancies)} pontos para melhorar.")
     print("-" * 60)
     
     # ETAPA 4: ESCRITA (NOVO)
-    new_readme_content = run_writer(discrepancies, knowledge_base)
-    
-    # ETAPA 5: FINALIZAÇÃO (NOVO)
-    print("\n[Orquestrador] Processo de escrita finalizado. Salvando e organizando arquivos...")
-    
-    # Salva o novo README
     new_readme_path = os.path.join(project_path, 'README_gerado.md')
-    try:
-        with open(new_readme_path, 'w', encoding='utf-8') as f:
-            f.write(new_readme_content)
-        print(f"✅ Novo README salvo em: {new_readme_path}")
-    except Exception as e:
-        print(f"❌ Erro ao salvar o novo README: {e}")
-        return
+    with metrics.stage("writing", files=len(knowledge_base)):
+        if stream_writer and not section_writer:
+            # O modo streaming já grava o arquivo durante a geração
+            if run_writer_stream(discrepancies, knowledge_base, new_readme_path, context_mode) is None:
+                print("❌ Erro ao gerar o novo README.")
+                summary["status"] = "erro_escrita"
+                summary["error"] = "Falha na geração do README em modo streaming."
+                return
+            print("\n[Orquestrador] Processo de escrita finalizado. Organizando arquivos...")
+            print(f"✅ Novo README salvo em: {new_readme_path}")
+        else:
+            try:
+                if section_writer:
+                    new_readme_content = run_section_writer(discrepancies, knowledge_base, context_mode)
+                else:
+                    new_readme_content = run_writer(discrepancies, knowledge_base, context_mode)
+            except RuntimeError as e:
+                # Uma resposta de erro do modelo nunca é gravada como README
+                print(f"❌ Erro ao gerar o novo README: {e}")
+                summary["status"] = "erro_escrita"
+                summary["error"] = f"Falha na geração do README: {e}"
+                return
+            
+            # ETAPA 5: FINALIZAÇÃO (NOVO)
+            print("\n[Orquestrador] Processo de escrita finalizado. Salvando e organizando arquivos...")
+            
+            # Salva o novo README
+            try:
+                with open(new_readme_path, 'w', encoding='utf-8') as f:
+                    f.write(new_readme_content)
+                print(f"✅ Novo README salvo em: {new_readme_path}")
+            except Exception as e:
+                print(f"❌ Erro ao salvar o novo README: {e}")
+                summary["status"] = "erro_escrita"
+                summary["error"] = f"Erro ao salvar o novo README: {e}"
+                return
+    knowledge_base.release_contents()
+    summary["readme_path"] = new_readme_path
+    summary["status"] = "concluido"
     
     # Prepara para mover os arquivos antigos
     old_docs_path = os.path.join(project_path, 'docs.old')
-    doc_files_to_move = [item['path'] for item in knowledge_base if item['type'] == 'documentacao']
+    # As duplicatas omitidas dos prompts foram representadas e também são arquivadas
+    doc_files_to_move = [entry.path for entry in knowledge_base.documentation()]
+    doc_files_to_move += [entry.path for entry in knowledge_base.duplicates if entry.type == 'documentacao']
     
     if not doc_files_to_move:
         print("\n[Orquestrador] Nenhum arquivo de documentação antigo para mover.")
@@ -73,8 +262,12 @@ def run_orchestration(project_path):
             print(f"  - {os.path.basename(f_path)}")
         
         try:
-            # Solicita confirmação do usuário
-            confirm = input(f"\nDeseja mover esses {len(doc_files_to_move)} arquivos para '{old_docs_path}'? (s/n): ").lower()
+            if archive_policy == 'ask':
+                # Solicita confirmação do usuário
+                confirm = input(f"\nDeseja mover esses {len(doc_files_to_move)} arquivos para '{old_docs_path}'? (s/n): ").lower()
+            else:
+                confirm = 's' if archive_policy == 'always' else 'n'
+                print(f"\nPolítica de arquivamento '{archive_policy}' aplicada sem confirmação.")
             if confirm == 's':
                 if not os.path.exists(old_docs_path):
                     os.makedirs(old_docs_path)
@@ -83,12 +276,73 @@ def run_orchestration(project_path):
                     base_name = os.path.basename(f_path)
                     destination = os.path.join(old_docs_path, base_name)
                     shutil.move(f_path, destination)
+                    summary["archived"] += 1
                     print(f"  -> Movido: {base_name}")
                 print(f"✅ Arquivos antigos arquivados em: {old_docs_path}")
-            else:
+            elif archive_policy == 'ask':
                 print("\nOperação de arquivamento cancelada pelo usuário.")
+            else:
+                print("\nArquivamento desativado pela política 'never'.")
         except Exception as e:
             print(f"❌ Erro ao mover arquivos antigos: {e}")
     
     print("\n" + "-" * 60)
-    print("--- Orquestração Concluída --- ")
\ No newline at end of file
+    print("--- Orquestração Concluída --- ")
+
+
+def _context_tokens(paths, file_tokens):
+    """Tokens estimados de um bloco de contexto canônico com os caminhos (ver build_context_block)."""
+    delimiters = "".join(CONTEXT_OPENING.format(path=path) + CONTEXT_CLOSING.format(path=path) for path in paths)
+    return (sum(file_tokens[path] for path in paths)
+            + budget.estimate_text_tokens(CONTEXT_HEADER + delimiters)) if paths else 0
+
+
+def _estimate_stages(project_path, knowledge_base, file_paths_for_analyzer, context_mode, incremental, sharded,
+                     shard_token_budget, retrieval_top_k, use_crossref, section_writer, context_budget):
+    """
+    Estimativas das etapas de análise e escrita do modo dry_run: as mesmas chamadas que a
+    execução faria (lotes, recuperação, verificação cruzada, delta incremental), com os
+    tokens de cada uma contados pelo estimador local.
+    Returns:
+        list: As budget.StageEstimate das etapas 'analysis' e 'writing'.
+    """
+    notes = []
+    analysis_paths = file_paths_for_analyzer
+    file_contents = knowledge_base.contents(context_mode)
+    if incremental:
+        analysis_paths = incremental_delta(project_path, knowledge_base)[0]
+        if not use_crossref:
+            file_contents = tools.read_project_context(analysis_paths, context_mode)
+            if context_budget is not None:
+                file_contents = budget.select_within_budget(analysis_paths, file_contents, context_budget,
+                                                            context_mode).contents
+                analysis_paths = list(file_contents)
+        notes.append(f"modo incremental: {len(analysis_paths)} arquivos a reanalisar")
+    calls = plan_calls(analysis_paths, file_contents, sharded=sharded, shard_token_budget=shard_token_budget,
+                       retrieval_top_k=retrieval_top_k, use_crossref=use_crossref) if analysis_paths else []
+    if use_crossref:
+        notes.append(f"verificação cruzada: {len(calls)} chamada(s) para os casos ambíguos")
+
+    file_tokens = budget.count_tokens(file_contents) if not use_crossref else {}
+    instructions_tokens = budget.estimate_text_tokens(analyzer_instructions)
+    analysis_tokens = [_context_tokens(paths, file_tokens) + budget.estimate_text_tokens(prompt) + instructions_tokens
+                       for paths, prompt in calls]
+    # O Escritor recebe o bloco de contexto da base e as discrepâncias (estimadas pela saída da análise)
+    writer_paths = knowledge_base.context_paths(context_mode)
+    writer_context = _context_tokens(writer_paths, budget.count_tokens(knowledge_base.contents(context_mode)))
+    # Com uma única chamada de análise sobre os mesmos arquivos, o Analista grava o prefixo no cache
+    # de prompts e o Escritor o lê de lá
+    shares_prefix = (runtime.PROMPT_CACHE_ENABLED and len(calls) == 1 and not incremental and not section_writer
+                     and sorted(calls[0][0]) == sorted(writer_paths))
+
+    analysis = budget.StageEstimate("analysis", analysis_tokens, agent="analyzer",
+                                    workers=DEFAULT_SHARD_WORKERS if len(calls) > 1 else 1,
+                                    cache_write_tokens=writer_context if shares_prefix else 0,
+                                    note="; ".join(notes) or None)
+    writer_tokens = (writer_context + budget.estimate_text_tokens(writer_instructions)
+                     + analysis.output_tokens)
+    writing = budget.StageEstimate(
+        "writing", [writer_tokens], agent="writer", cached_tokens=writer_context if shares_prefix else 0,
+        note="estimado como reescrita completa; as seções afetadas só são conhecidas após a análise"
+        if section_writer else ("contexto lido do cache de prompts do provedor" if shares_prefix else None))
+    return [analysis, writing]
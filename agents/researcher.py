@@ -1,20 +1,9 @@
 # agents/researcher.py
 import os
 import json
-from datetime import datetime
-from dotenv import load_dotenv
-
-# Carrega as variáveis de ambiente (ex: ANTHROPIC_API_KEY)
-load_dotenv()
-
 import tools
-
-try:
-    from agno.agent import Agent
-    from agno.models.anthropic import Claude
-except ImportError:
-    print("Erro: A biblioteca 'agno' não parece estar instalada.")
-    raise
+from knowledge_base import FileEntry, KnowledgeBase
+from . import runtime
 
 # As instruções do agente não mudam, ele ainda usa a mesma ferramenta.
 researcher_instructions = """
@@ -24,25 +13,62 @@ Exemplo de Resposta Válida:
 ["/path/to/file1.py", "/path/to/docs/file2.md"]
 """
 
-researcher_agent = Agent(
-    instructions=researcher_instructions,
-    model=Claude(id="claude-3-5-sonnet-20241022"),
-    tools=[tools.find_files_in_project]
-)
+def build_researcher_agent():
+    """Cria uma nova instância do Agente Pesquisador."""
+    Agent, Claude = runtime.agno_classes()
+    return Agent(
+        name="researcher",
+        instructions=researcher_instructions,
+        model=Claude(id="claude-3-5-sonnet-20241022"),
+        tools=tools.agent_tools('find_files_in_project')
+    )
+
+
+def get_researcher_agent():
+    """Retorna a instância compartilhada do Agente Pesquisador, criada no primeiro uso."""
+    return runtime.get_agent("researcher", build_researcher_agent)
 
-def run_researcher(project_path, patterns):
+
+def run_researcher(project_path, patterns, use_agent=False):
     """
-    Executa o Agente Pesquisador para encontrar arquivos e retorna uma lista de objetos com metadados.
+    Encontra os arquivos do projeto e retorna uma lista de objetos com metadados.
+
+    Por padrão a descoberta é feita localmente, sem chamar o modelo: uma única
+    varredura do diretório (tools.scan_project) aplica todos os padrões e coleta
+    os metadados na mesma passada. O caminho via Agente Pesquisador continua
+    disponível com use_agent=True.
+    Args:
+        project_path (str): O diretório do projeto.
+        patterns (list): Os padrões glob a procurar.
+        use_agent (bool): Se True, delega a busca ao modelo de linguagem.
     Returns:
-        list: Uma lista de dicionários, cada um representando um arquivo com seus metadados.
+        KnowledgeBase: Os arquivos encontrados, com seus metadados.
     """
     print(f"[Agente Pesquisador] Buscando arquivos em '{project_path}' com padrões: {patterns}")
-    
+
+    if use_agent:
+        return _run_researcher_agent(project_path, patterns)
+
+    knowledge_base = tools.scan_project(project_path, patterns)
+    print(f"[Agente Pesquisador] Varredura local concluída: {len(knowledge_base)} arquivos com metadados.")
+    return knowledge_base
+
+
+def _is_path_list(content):
+    try:
+        return isinstance(json.loads(content.replace('\\', '\\\\')), list)
+    except json.JSONDecodeError:
+        return False
+
+
+def _run_researcher_agent(project_path, patterns):
+    """
+    Caminho opcional: pede ao modelo que use a ferramenta `find_files_in_project`
+    e extrai os metadados dos caminhos retornados.
+    """
     prompt = f"Encontre todos os arquivos no diretório '{project_path}' que correspondam aos padrões: {patterns}"
     
-    response = researcher_agent.run(prompt)
-
-    content = response.get_content_as_string()
+    content = runtime.run_agent(get_researcher_agent(), prompt, validate=_is_path_list)
     print(f"[Agente Pesquisador] Resposta bruta do modelo: {content}")
     # Corrige as barras invertidas para garantir que o JSON seja válido em Windows
     corrected_content = content.replace('\\', '\\\\')
@@ -50,20 +76,13 @@ def run_researcher(project_path, patterns):
         file_paths = json.loads(corrected_content)
         if not isinstance(file_paths, list):
             print(f"[Agente Pesquisador] Erro: A resposta JSON não é uma lista: {corrected_content}")
-            return []
+            return KnowledgeBase()
         print(f"[Agente Pesquisador] Encontrados {len(file_paths)} arquivos. Extraindo metadados...")
         
-        knowledge_base = []
+        knowledge_base = KnowledgeBase()
         for path in file_paths:
             try:
-                stat = os.stat(path)
-                file_info = {
-                    "path": path,
-                    "last_modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                    "type": 'documentacao' if path.endswith(('.md', '.txt')) else 'codigo',
-                    "is_readme": os.path.basename(path).lower() == 'readme.md'
-                }
-                knowledge_base.append(file_info)
+                knowledge_base.append(FileEntry.from_stat(path, os.stat(path)))
             except FileNotFoundError:
                 print(f"[Agente Pesquisador] Aviso: Arquivo '{path}' não encontrado durante extração de metadados.")
             except Exception as e:
@@ -71,5 +90,5 @@ def run_researcher(project_path, patterns):
         print(f"[Agente Pesquisador] Metadados extraídos para {len(knowledge_base)} arquivos.")
         return knowledge_base
     except json.JSONDecodeError:
-        print(f"[Agente Pesquisador] Erro: A resposta não é um JSON válido: {response}")
-        return []
\ No newline at end of file
+        print(f"[Agente Pesquisador] Erro: A resposta não é um JSON válido: {content}")
+        return KnowledgeBase()
\ No newline at end of file
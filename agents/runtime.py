@@ -0,0 +1,324 @@
+# agents/runtime.py
+# Execução compartilhada dos agentes: todas as chamadas ao modelo passam por aqui.
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+import database
+import metrics
+from . import scheduler
+
+# Instâncias dos agentes, criadas sob demanda por get_agent()
+_agents = {}
+_agents_lock = threading.Lock()
+_environment_loaded = False
+
+
+def load_environment():
+    """Carrega as variáveis de ambiente do .env (ex: ANTHROPIC_API_KEY) uma única vez por processo."""
+    global _environment_loaded
+    if _environment_loaded:
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    _environment_loaded = True
+
+
+def agno_classes():
+    """
+    Importa o agno apenas quando um agente é de fato construído, para que comandos que não
+    chamam o modelo (--help, stats, inicialização do banco) não paguem esse custo.
+    Returns:
+        tuple: As classes (Agent, Claude).
+    """
+    load_environment()
+    try:
+        from agno.agent import Agent
+        from agno.models.anthropic import Claude
+    except ImportError:
+        print("Erro: A biblioteca 'agno' não parece estar instalada.")
+        raise
+    return Agent, Claude
+
+
+# Cache de prompts do provedor (prompt caching da Anthropic): o bloco de contexto canônico
+# (ver knowledge_base.build_context_block) é o primeiro bloco do system, com cache_control,
+# para que o Analista, o Escritor e as execuções seguintes reaproveitem o mesmo prefixo
+PROMPT_CACHE_ENABLED = os.getenv("DOC_AGENT_PROMPT_CACHE", "1") != "0"
+# Tempo de vida do prefixo em cache: '5m' (padrão) ou '1h'
+PROMPT_CACHE_TTL = os.getenv("DOC_AGENT_PROMPT_CACHE_TTL", "5m")
+
+# Bloco de contexto da chamada em andamento, lido pelo modelo ao montar o system
+_request_context = contextvars.ContextVar("doc_agent_request_context", default=None)
+
+
+def current_context():
+    """Bloco de contexto da chamada ao modelo em andamento nesta thread, ou None."""
+    return _request_context.get()
+
+
+@contextmanager
+def request_context(context):
+    """Define o bloco de contexto enviado no system das chamadas feitas dentro do bloco."""
+    token = _request_context.set(context)
+    try:
+        yield
+    finally:
+        _request_context.reset(token)
+
+
+def build_context_agent(name, instructions, model_id):
+    """
+    Cria um agente que recebe o conteúdo dos arquivos como bloco de contexto canônico.
+
+    O system da requisição é montado a cada chamada como [contexto, instruções]: o contexto
+    vem primeiro e leva o cache_control, e as instruções (diferentes por agente) vêm depois,
+    fora do prefixo em cache. Assim o Analista e o Escritor compartilham o mesmo prefixo
+    quando recebem os mesmos arquivos. O prompt do usuário leva apenas a tarefa e as partes
+    voláteis (ex: discrepâncias).
+    """
+    Agent, Claude = agno_classes()
+    from agno.models.anthropic.claude import SystemPromptBlock
+
+    def system_blocks():
+        blocks = []
+        context = _request_context.get()
+        if context:
+            blocks.append(SystemPromptBlock(text=context, cache=PROMPT_CACHE_ENABLED, ttl=PROMPT_CACHE_TTL))
+        blocks.append(SystemPromptBlock(text=instructions, cache=False))
+        return blocks
+
+    return Agent(
+        name=name,
+        instructions=instructions,
+        # O system gerado pelo agno ficaria antes do contexto; as instruções vão em system_blocks
+        system_message="",
+        model=Claude(id=model_id, system_prompt_blocks=system_blocks),
+        tools=[],
+    )
+
+
+def get_agent(name, factory):
+    """
+    Retorna a instância compartilhada do agente `name`, criando-a com `factory` na
+    primeira chamada.
+    """
+    with _agents_lock:
+        agent = _agents.get(name)
+        if agent is None:
+            agent = _agents[name] = factory()
+        return agent
+
+
+# Permite desligar o cache de respostas para toda a execução (ex: run.py analyze --no-cache)
+_llm_cache_enabled = os.getenv("DOC_AGENT_LLM_CACHE", "1") != "0"
+
+
+# Limite global de requisições simultâneas ao modelo (ex: semáforo compartilhado entre
+# os processos do modo batch); None significa sem limite
+_request_limiter = None
+
+
+def set_request_limiter(limiter):
+    """
+    Define o semáforo que limita as requisições simultâneas ao modelo. Pode ser um
+    threading.BoundedSemaphore ou um semáforo de multiprocessing.Manager(), compartilhado
+    entre processos.
+    """
+    global _request_limiter
+    _request_limiter = limiter
+
+
+@contextmanager
+def model_slot():
+    """Ocupa uma vaga do limite global de requisições enquanto o bloco executa."""
+    limiter = _request_limiter
+    if limiter is None:
+        yield
+        return
+    limiter.acquire()
+    try:
+        yield
+    finally:
+        limiter.release()
+
+
+def set_llm_cache_enabled(enabled):
+    """Liga ou desliga o cache de respostas do modelo para as próximas chamadas."""
+    global _llm_cache_enabled
+    _llm_cache_enabled = enabled
+
+
+def response_cache_key(agent, prompt):
+    """
+    Calcula a chave do cache de respostas: modelo + instruções do agente + prompt.
+    Qualquer mudança em um dos três produz uma chave diferente.
+    """
+    digest = hashlib.sha256()
+    for part in (agent.model.id, str(agent.instructions), prompt):
+        digest.update(part.encode('utf-8', errors='surrogatepass'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def response_text(response):
+    """Extrai o texto de uma resposta do agente (RunOutput ou equivalente)."""
+    if hasattr(response, 'get_content_as_string'):
+        return response.get_content_as_string()
+    if hasattr(response, 'content'):
+        return response.content if isinstance(response.content, str) else str(response.content)
+    return str(response)
+
+
+def _is_error(response):
+    status = getattr(response, 'status', None)
+    return getattr(status, 'value', status) == 'ERROR'
+
+
+def stream_error(event):
+    """
+    Mensagem de erro de um evento do streaming, ou None. O agno não lança exceção quando
+    o stream falha: ele emite um evento RunError (ou uma resposta final com status ERROR).
+    """
+    if getattr(event, 'event', None) == 'RunError' or _is_error(event):
+        return response_text(event) or "erro desconhecido do modelo"
+    return None
+
+
+def full_prompt(prompt, context=None):
+    """Texto completo de uma chamada (contexto + prompt), usado nas chaves de cache e nas métricas."""
+    return context + prompt if context else prompt
+
+
+def get_cached_response(agent, prompt, use_cache=None, context=None):
+    """Retorna a resposta em cache para o agente, o contexto e o prompt, ou None."""
+    if not (_llm_cache_enabled if use_cache is None else use_cache):
+        return None
+    return database.get_llm_response(response_cache_key(agent, full_prompt(prompt, context)))
+
+
+def store_response(agent, prompt, text, use_cache=None, context=None):
+    """Grava no cache a resposta bem-sucedida do agente para o contexto e o prompt."""
+    if not (_llm_cache_enabled if use_cache is None else use_cache) or not text:
+        return
+    database.store_llm_response(response_cache_key(agent, full_prompt(prompt, context)), agent.model.id, text)
+
+
+def _error_message(response):
+    """Mensagem de erro de uma resposta com status ERROR, ou None (ver scheduler.ModelScheduler.call)."""
+    return response_text(response) if _is_error(response) else None
+
+
+def run_agent(agent, prompt, use_cache=None, validate=None, priority=scheduler.PRIORITY_NORMAL, context=None,
+              raise_on_error=False):
+    """
+    Executa o agente com o prompt, consultando antes o cache persistente de respostas.
+
+    A chamada passa pelo escalonador do processo (scheduler.get_scheduler()), que aplica os
+    limites de requisições e tokens por minuto, a prioridade, as novas tentativas em erros
+    transitórios e a desduplicação de prompts idênticos em andamento.
+    Args:
+        agent: A instância do agente (agno.agent.Agent).
+        prompt (str): O prompt a enviar.
+        use_cache (bool): Sobrescreve a configuração global do cache para esta chamada.
+        validate (callable): Se fornecida, apenas respostas para as quais ela retorna
+            True são gravadas no cache (ex: JSON válido).
+        priority (int): Prioridade no escalonador (ex: scheduler.PRIORITY_HIGH para o Escritor).
+        context (str): Bloco de contexto canônico, enviado no system antes das instruções
+            (ver build_context_agent); o prompt leva apenas a tarefa.
+        raise_on_error (bool): Se True, uma resposta com status ERROR (depois das novas
+            tentativas) lança RuntimeError em vez de ter a mensagem de erro retornada.
+    Returns:
+        str: O texto da resposta do modelo.
+    """
+    started = time.perf_counter()
+    text_sent = full_prompt(prompt, context)
+    cached = get_cached_response(agent, prompt, use_cache, context)
+    if cached is not None:
+        print(f"[Cache LLM] Resposta reaproveitada do cache ({agent.model.id}).")
+        record_call(agent, prompt, time.perf_counter() - started, cached=True, context=context)
+        return cached
+
+    def attempt():
+        with model_slot(), request_context(context):
+            return agent.run(prompt)
+
+    response, deduplicated = scheduler.get_scheduler().call(
+        attempt, priority=priority, tokens=metrics.estimate_tokens(text_sent),
+        key=response_cache_key(agent, text_sent), check=_error_message,
+    )
+    # Uma resposta compartilhada com outra chamada idêntica não gerou uma nova requisição
+    record_call(agent, prompt, time.perf_counter() - started, None if deduplicated else response,
+                cached=deduplicated, context=context)
+    text = response_text(response)
+    if raise_on_error and _is_error(response):
+        raise RuntimeError(text or "erro desconhecido do modelo")
+    if not deduplicated and not _is_error(response) and (validate is None or validate(text)):
+        store_response(agent, prompt, text, use_cache, context)
+    return text
+
+
+def stream_agent(agent, prompt, priority=scheduler.PRIORITY_NORMAL, context=None):
+    """
+    Executa o agente em modo streaming, produzindo os trechos de texto da resposta.
+
+    O stream passa pelo escalonador do processo (scheduler.ModelScheduler.stream): a vaga
+    fica ocupada durante todo o streaming e erros transitórios antes do primeiro trecho
+    são tentados de novo com backoff. O cache de respostas não é consultado aqui.
+    Args:
+        agent: A instância do agente (agno.agent.Agent).
+        prompt (str): O prompt a enviar.
+        priority (int): Prioridade no escalonador.
+        context (str): Bloco de contexto canônico (ver run_agent).
+    Yields:
+        str: Os trechos de texto, na ordem recebida. Um evento de erro do stream (ver
+        stream_error) é lançado como RuntimeError.
+    """
+    def open_stream():
+        # A requisição só é feita ao iterar o stream, então os contextos valem durante o laço
+        with model_slot(), request_context(context):
+            for event in agent.run(prompt, stream=True):
+                if isinstance(event, str):
+                    chunk = event
+                else:
+                    error = stream_error(event)
+                    if error is not None:
+                        raise RuntimeError(error)
+                    if getattr(event, 'event', None) != 'RunContent':
+                        continue
+                    chunk = event.content
+                if isinstance(chunk, str) and chunk:
+                    yield chunk
+
+    tokens = metrics.estimate_tokens(full_prompt(prompt, context))
+    yield from scheduler.get_scheduler().stream(open_stream, priority=priority, tokens=tokens)
+
+
+def agent_label(agent):
+    """Nome do agente usado nas métricas (ex: 'analyzer')."""
+    return getattr(agent, 'name', None) or agent.model.id
+
+
+def record_call(agent, prompt, latency, response=None, cached=False, context=None):
+    """
+    Registra as métricas de uma chamada ao modelo (ver metrics.record_agent_call).
+    prompt é a tarefa e context o bloco de contexto, como em run_agent.
+    """
+    run_metrics = getattr(response, 'metrics', None)
+    metrics.record_agent_call(
+        agent_label(agent), agent.model.id, len(full_prompt(prompt, context)), latency,
+        input_tokens=getattr(run_metrics, 'input_tokens', None),
+        output_tokens=getattr(run_metrics, 'output_tokens', None),
+        cached=cached,
+        cache_read_tokens=getattr(run_metrics, 'cache_read_tokens', None),
+        context_hash=context_hash(context) if context else None,
+        context=context,
+        prompt=prompt,
+    )
+
+
+def context_hash(context):
+    """Identificador curto do bloco de contexto; chamadas com o mesmo hash compartilham o prefixo em cache."""
+    return database.hash_content(context)[:16]
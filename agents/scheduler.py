@@ -0,0 +1,334 @@
+# agents/scheduler.py
+# Escalonador central das chamadas ao modelo: limites de requisições e tokens por minuto
+# (token buckets), fila de prioridade, novas tentativas com backoff exponencial e
+# desduplicação de pedidos idênticos em andamento. Todas as chamadas de runtime.run_agent
+# (e de runtime.stream_agent, usado pelo streaming do Escritor) passam por aqui.
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+# Prioridades: valores menores são atendidos primeiro
+PRIORITY_HIGH = 0     # Escritor: o usuário está esperando pelo README
+PRIORITY_NORMAL = 1   # Análise única, verificação cruzada, Pesquisador
+PRIORITY_LOW = 2      # Lotes do Analista (modos fragmentado e por recuperação)
+
+# Limites por minuto; 0 desativa o limite (padrão)
+DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("DOC_AGENT_RPM", "0"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("DOC_AGENT_TPM", "0"))
+# Novas tentativas após erros transitórios (429, 529, 5xx, timeouts)
+DEFAULT_MAX_RETRIES = int(os.getenv("DOC_AGENT_MAX_RETRIES", "4"))
+DEFAULT_BASE_DELAY = float(os.getenv("DOC_AGENT_RETRY_BASE_DELAY", "1.0"))
+DEFAULT_MAX_DELAY = 60.0
+
+# Mensagens sem status_code: o código só conta quando aparece como código de status
+# (ex: "Error code: 529", "status_code=503"), nunca como um número qualquer do texto
+_STATUS_IN_MESSAGE = re.compile(r"\b(?:error code|status(?:[ _]code)?)\s*[=:]?\s*(\d{3})\b")
+_RETRYABLE_WORDS = ("rate limit", "rate_limit", "overloaded", "timeout", "timed out", "temporarily unavailable",
+                    "connection error", "connection reset", "api_error", "internal server error",
+                    "service unavailable", "bad gateway")
+_RATE_LIMIT_WORDS = ("rate limit", "rate_limit", "overloaded")
+
+
+def _status_code(error):
+    """Código de status HTTP do erro: o atributo status_code ou, em mensagens, o código explícito."""
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code
+    match = _STATUS_IN_MESSAGE.search(str(error).lower())
+    return int(match.group(1)) if match else None
+
+
+def is_retryable_error(error):
+    """
+    Indica se um erro do modelo é transitório: limite de taxa (429), sobrecarga (529),
+    erros 5xx e falhas de conexão. Aceita uma exceção (com ou sem status_code) ou a
+    mensagem de erro de uma resposta com status ERROR.
+    """
+    status_code = _status_code(error)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    message = str(error).lower()
+    return any(word in message for word in _RETRYABLE_WORDS)
+
+
+def _is_rate_limit(error):
+    status_code = _status_code(error)
+    if status_code is not None:
+        return status_code in (429, 529)
+    message = str(error).lower()
+    return any(word in message for word in _RATE_LIMIT_WORDS)
+
+
+class RetryableResponse(Exception):
+    """Sinaliza, dentro de ModelScheduler.call, uma resposta de erro que deve ser tentada de novo."""
+
+    def __init__(self, response, message):
+        super().__init__(message)
+        self.response = response
+
+
+class TokenBucket:
+    """
+    Balde de fichas reabastecido continuamente a `rate_per_minute` fichas por minuto,
+    com capacidade de um minuto. rate_per_minute <= 0 desativa o limite.
+    """
+
+    def __init__(self, rate_per_minute, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.clock = clock
+        self.available = self.capacity
+        self.updated = clock()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _refill(self):
+        now = self.clock()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Segundos até haver `amount` fichas (pedidos maiores que a capacidade esperam o balde cheio)."""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        missing = min(amount, self.capacity) - self.available
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount):
+        if self.enabled:
+            self._refill()
+            self.available -= min(amount, self.capacity)
+
+
+class _Ticket:
+    __slots__ = ("priority", "sequence", "tokens")
+
+    def __init__(self, priority, sequence, tokens):
+        self.priority = priority
+        self.sequence = sequence
+        self.tokens = tokens
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class ModelScheduler:
+    """
+    Controla a admissão das chamadas ao modelo. Cada chamada entra em uma fila de
+    prioridade e só é liberada quando é a primeira da fila, há vaga de concorrência e os
+    baldes de requisições e de tokens permitem; a chamada em si roda na thread de quem
+    pediu (preservando o contexto de métricas). Um erro de limite de taxa pausa todas as
+    chamadas pelo tempo de backoff, não apenas a que falhou.
+
+    O estado é por processo; no modo batch, o limite de concorrência entre processos
+    continua sendo o semáforo de runtime.set_request_limiter.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 max_concurrent=None, max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, clock=time.monotonic, sleep=time.sleep, rng=None):
+        self.requests = TokenBucket(requests_per_minute, clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock)
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.stats = {"calls": 0, "retries": 0, "deduplicated": 0, "rate_limited": 0, "queued_seconds": 0.0}
+        self._condition = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._paused_until = 0.0
+        self._inflight = {}
+
+    # ----------------------------------------
+    # Admissão
+    # ----------------------------------------
+
+    def _admission_wait(self, ticket):
+        """Segundos que a primeira chamada da fila ainda precisa esperar (0 se puder sair)."""
+        if self.max_concurrent is not None and self._active >= self.max_concurrent:
+            return None
+        return max(self._paused_until - self.clock(), self.requests.wait_time(1),
+                   self.tokens.wait_time(ticket.tokens), 0.0)
+
+    def _acquire(self, priority, tokens):
+        started = self.clock()
+        with self._condition:
+            ticket = _Ticket(priority, next(self._sequence), tokens)
+            heapq.heappush(self._queue, ticket)
+            while True:
+                if self._queue[0] is ticket:
+                    wait = self._admission_wait(ticket)
+                    if wait == 0.0:
+                        break
+                else:
+                    wait = None
+                # Reavaliado quando outra chamada terminar/entrar ou quando os baldes reabastecerem
+                self._condition.wait(wait)
+            heapq.heappop(self._queue)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            self._active += 1
+            self.stats["queued_seconds"] += self.clock() - started
+            self._condition.notify_all()
+
+    def _release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_NORMAL, tokens=0):
+        """Ocupa uma vaga do escalonador enquanto o bloco executa (ex: streaming do Escritor)."""
+        self._acquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _backoff(self, attempt, error):
+        """Backoff exponencial com jitter completo; erros de limite de taxa pausam todas as chamadas."""
+        delay = self.rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        with self._condition:
+            self.stats["retries"] += 1
+            if _is_rate_limit(error):
+                self.stats["rate_limited"] += 1
+                self._paused_until = max(self._paused_until, self.clock() + delay)
+        print(f"[Escalonador] Erro transitório do modelo ({str(error)[:120]}); "
+              f"nova tentativa {attempt + 1}/{self.max_retries} em {delay:.1f}s.")
+        self.sleep(delay)
+
+    # ----------------------------------------
+    # Chamadas
+    # ----------------------------------------
+
+    def call(self, fn, priority=PRIORITY_NORMAL, tokens=0, key=None, check=None):
+        """
+        Executa fn() sob o controle do escalonador.
+        Args:
+            fn (callable): A chamada ao modelo; pode lançar exceções.
+            priority (int): PRIORITY_HIGH, PRIORITY_NORMAL ou PRIORITY_LOW.
+            tokens (int): Tokens estimados do pedido, descontados do balde de tokens.
+            key (str): Identificador do pedido; chamadas simultâneas com a mesma chave
+                compartilham uma única execução.
+            check (callable): Recebe o resultado e retorna uma mensagem de erro se ele
+                representar uma falha (ex: resposta com status ERROR), ou None.
+        Returns:
+            tuple: (resultado, desduplicado). Erros transitórios são tentados de novo até
+            max_retries vezes; depois disso, a última resposta de erro é retornada ou a
+            última exceção é lançada.
+        """
+        if key is not None:
+            with self._condition:
+                shared = self._inflight.get(key)
+                if shared is None:
+                    self._inflight[key] = future = Future()
+                else:
+                    self.stats["deduplicated"] += 1
+            if shared is not None:
+                return shared.result(), True
+            try:
+                result = self._call_with_retries(fn, priority, tokens, check)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+            finally:
+                with self._condition:
+                    self._inflight.pop(key, None)
+            return result, False
+        return self._call_with_retries(fn, priority, tokens, check), False
+
+    def stream(self, open_stream, priority=PRIORITY_NORMAL, tokens=0):
+        """
+        Itera o stream retornado por open_stream() sob o controle do escalonador; a vaga
+        fica ocupada até o fim do stream.
+        Args:
+            open_stream (callable): Abre o stream (ex: um gerador que chama o modelo).
+            priority (int): PRIORITY_HIGH, PRIORITY_NORMAL ou PRIORITY_LOW.
+            tokens (int): Tokens estimados do pedido, descontados do balde de tokens.
+        Yields:
+            Os itens do stream. Erros transitórios antes do primeiro item são tentados de
+            novo com um novo stream, como em call; depois do primeiro item, o erro é
+            lançado para quem itera, que já consumiu parte da resposta.
+        """
+        attempt = 0
+        while True:
+            with self.slot(priority, tokens):
+                with self._condition:
+                    self.stats["calls"] += 1
+                events = iter(open_stream())
+                try:
+                    first = next(events)
+                except StopIteration:
+                    return
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable_error(e):
+                        raise
+                    failure = e
+                else:
+                    yield first
+                    yield from events
+                    return
+            self._backoff(attempt, failure)
+            attempt += 1
+
+    def _call_with_retries(self, fn, priority, tokens, check):
+        attempt = 0
+        while True:
+            with self.slot(priority, tokens):
+                with self._condition:
+                    self.stats["calls"] += 1
+                try:
+                    result = fn()
+                    error = check(result) if check is not None else None
+                    if error is not None and is_retryable_error(error):
+                        raise RetryableResponse(result, error)
+                    return result
+                except RetryableResponse as e:
+                    if attempt >= self.max_retries:
+                        return e.response
+                    failure = e
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable_error(e):
+                        raise
+                    failure = e
+            # O backoff acontece fora da vaga, liberando-a para as demais chamadas
+            self._backoff(attempt, failure)
+            attempt += 1
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Retorna o escalonador do processo, criado no primeiro uso com a configuração do ambiente."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ModelScheduler()
+        return _scheduler
+
+
+def set_scheduler(scheduler):
+    """Substitui o escalonador do processo (ex: limites da CLI, testes com relógio falso)."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
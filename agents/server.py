@@ -0,0 +1,458 @@
+# agents/server.py
+# Modo daemon (run.py serve): um processo de longa duração que mantém o agno importado,
+# os agentes construídos, as conexões com o banco e os caches aquecidos, e atende pedidos
+# de análise por um socket local. Os projetos registrados são observados por snapshots
+# de os.stat e seus caches são recalculados em segundo plano quando algo muda.
+import hmac
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Socket Unix padrão do daemon, ao lado do banco de dados
+DEFAULT_SOCKET_PATH = os.getenv(
+    "DOC_AGENT_SOCKET", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "doc_agent.sock"))
+)
+# Endereço usado quando o servidor escuta em TCP (--port ou sistemas sem socket Unix)
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Em TCP, qualquer usuário da máquina alcança a porta: os pedidos levam um token secreto,
+# gravado pelo servidor neste arquivo (legível apenas pelo dono) e lido pelo cliente
+DEFAULT_TOKEN_PATH = os.getenv(
+    "DOC_AGENT_TOKEN_FILE", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "doc_agent.token"))
+)
+# Pedidos atendidos em paralelo (análises de um mesmo projeto são sempre serializadas)
+DEFAULT_WORKERS = 4
+# Intervalo, em segundos, entre os snapshots dos projetos observados
+WATCH_INTERVAL = float(os.getenv("DOC_AGENT_WATCH_INTERVAL", "2"))
+# Em projetos grandes, o intervalo de cada projeto cresce com o tempo da varredura: ela
+# ocupa no máximo 1/WATCH_SCAN_FACTOR do tempo (ex: varredura de 1s -> a cada 20s)
+WATCH_SCAN_FACTOR = 20
+# Tamanho máximo de um pedido (uma linha JSON)
+MAX_REQUEST_BYTES = 1024 * 1024
+
+# Opções de run_orchestration aceitas em um pedido 'analyze'
+ANALYSIS_OPTIONS = frozenset({
+    "use_researcher_agent", "incremental", "sharded", "shard_token_budget", "stream_writer",
+    "context_mode", "archive_policy", "retrieval_top_k", "use_crossref", "section_writer", "deduplicate",
+    "summary_token_budget", "token_budget", "cost_budget", "dry_run",
+})
+
+
+def _use_tcp(port):
+    return port is not None or not hasattr(socket, "AF_UNIX")
+
+
+# ========================================
+# ESTADO DO DAEMON
+# ========================================
+
+class DocAgentDaemon:
+    """
+    Estado compartilhado do daemon: projetos observados, um lock por projeto e os
+    contadores exibidos por 'status'. Os pedidos são dicionários com a chave 'command'
+    ('analyze', 'watch', 'unwatch', 'status' ou 'shutdown') e as respostas sempre têm 'ok'.
+    """
+
+    def __init__(self):
+        self.projects = {}
+        self.started = time.time()
+        self.jobs = 0
+        self.stop_event = threading.Event()
+        self.server = None
+        self._lock = threading.Lock()
+        self._project_locks = {}
+
+    def _project_lock(self, project_path):
+        with self._lock:
+            return self._project_locks.setdefault(project_path, threading.Lock())
+
+    def handle(self, request):
+        """Atende um pedido e retorna a resposta (nunca lança exceção)."""
+        command = request.get("command") if isinstance(request, dict) else None
+        try:
+            if command == "analyze":
+                return self.analyze(request.get("project_path"), request.get("options") or {})
+            if command == "watch":
+                return self.watch(request.get("project_path"), request.get("options") or {})
+            if command == "unwatch":
+                return self.unwatch(request.get("project_path"))
+            if command == "status":
+                return self.status()
+            if command == "shutdown":
+                print("[Servidor] Desligamento solicitado.")
+                self.stop_event.set()
+                if self.server is not None:
+                    # shutdown() bloqueia até o laço do servidor terminar; não pode rodar nesta thread
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return {"ok": True}
+            return {"ok": False, "error": f"Erro: comando desconhecido: {command!r}."}
+        except Exception as e:
+            print(f"[Servidor] Erro inesperado no comando {command!r}: {e!r}")
+            return {"ok": False, "error": f"Erro inesperado: {e!r}"}
+
+    def _validate_project(self, project_path):
+        if not project_path or not os.path.isdir(project_path):
+            return None
+        return os.path.abspath(project_path)
+
+    def analyze(self, project_path, options):
+        """Executa uma análise completa com os caches do processo já aquecidos."""
+        from .orchestrator import run_orchestration
+        path = self._validate_project(project_path)
+        if path is None:
+            return {"ok": False, "error": f"Erro: O caminho fornecido '{project_path}' não é um diretório válido."}
+        unknown = set(options) - ANALYSIS_OPTIONS
+        if unknown:
+            return {"ok": False, "error": f"Erro: opções desconhecidas: {sorted(unknown)}."}
+        options = dict(options)
+        options.setdefault("archive_policy", "never")
+        if options["archive_policy"] == "ask":
+            return {"ok": False, "error": "Erro: o servidor não é interativo: use o arquivamento 'always' ou 'never'."}
+
+        # Projetos analisados passam a ser observados com as mesmas opções
+        self.watch(path, options, warm=False)
+        started = time.monotonic()
+        with self._project_lock(path):
+            print(f"[Servidor] Analisando {path}...")
+            summary = run_orchestration(path, **options)
+        summary["wall_time"] = round(time.monotonic() - started, 2)
+        with self._lock:
+            self.jobs += 1
+        print(f"[Servidor] {summary['status']} em {summary['wall_time']}s: {path}")
+        return {"ok": True, "summary": summary}
+
+    def watch(self, project_path, options=None, warm=True):
+        """Registra um projeto para observação; o aquecimento ocorre no próximo ciclo do observador."""
+        path = self._validate_project(project_path)
+        if path is None:
+            return {"ok": False, "error": f"Erro: O caminho fornecido '{project_path}' não é um diretório válido."}
+        with self._lock:
+            project = self.projects.setdefault(path, {"options": {}, "snapshot": None, "warmed_at": None,
+                                                      "pending_changes": None, "next_check": 0.0,
+                                                      "scan_seconds": None})
+            if options:
+                project["options"] = {key: value for key, value in options.items() if key in ANALYSIS_OPTIONS}
+            if warm:
+                # Força o aquecimento, no próximo ciclo, mesmo que nada tenha mudado desde o último snapshot
+                project["snapshot"] = None
+                project["next_check"] = 0.0
+        return {"ok": True, "project_path": path}
+
+    def unwatch(self, project_path):
+        path = os.path.abspath(project_path or "")
+        with self._lock:
+            removed = self.projects.pop(path, None) is not None
+        return {"ok": removed, "error": None if removed else f"Erro: projeto não observado: {path}"}
+
+    def status(self):
+        with self._lock:
+            projects = {
+                path: {"warmed_at": project["warmed_at"], "pending_changes": project["pending_changes"],
+                       "files": len(project["snapshot"] or {}), "scan_seconds": project["scan_seconds"]}
+                for path, project in self.projects.items()
+            }
+            return {"ok": True, "pid": os.getpid(), "uptime": round(time.time() - self.started, 1),
+                    "jobs": self.jobs, "projects": projects}
+
+    # ----------------------------------------
+    # Observação e aquecimento em segundo plano
+    # ----------------------------------------
+
+    def watch_loop(self, interval=WATCH_INTERVAL):
+        """
+        Laço do observador: compara snapshots de os.stat e aquece os projetos alterados.
+        Cada projeto é varrido a cada `interval` segundos ou, se a varredura for demorada,
+        a cada WATCH_SCAN_FACTOR vezes o tempo da última varredura.
+        """
+        while not self.stop_event.is_set():
+            with self._lock:
+                projects = list(self.projects.items())
+            for path, project in projects:
+                if self.stop_event.is_set():
+                    break
+                if project["next_check"] > time.monotonic():
+                    continue
+                try:
+                    self._check_project(path, project, interval)
+                except Exception as e:
+                    print(f"[Servidor] Erro ao observar {path}: {e!r}")
+            self.stop_event.wait(interval)
+
+    def _check_project(self, path, project, interval=WATCH_INTERVAL):
+        import tools
+        from .orchestrator import SEARCH_PATTERNS
+        started = time.monotonic()
+        knowledge_base = tools.scan_project(path, SEARCH_PATTERNS)
+        scan_seconds = time.monotonic() - started
+        with self._lock:
+            project["scan_seconds"] = round(scan_seconds, 3)
+            project["next_check"] = time.monotonic() + max(interval, scan_seconds * WATCH_SCAN_FACTOR)
+        snapshot = {entry.path: (entry.mtime, entry.size) for entry in knowledge_base}
+        if snapshot == project["snapshot"]:
+            return
+        lock = self._project_lock(path)
+        # Uma análise em andamento já aquece os caches; o próximo ciclo confere de novo
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            pending = self.warm(path, knowledge_base.paths(), project["options"])
+        finally:
+            lock.release()
+        with self._lock:
+            project["snapshot"] = snapshot
+            project["warmed_at"] = time.time()
+            project["pending_changes"] = pending
+
+    def warm(self, project_path, paths, options):
+        """
+        Pré-calcula o que a próxima análise do projeto vai precisar, sem chamar o modelo:
+        cache de conteúdo e hashes, esqueletos, vetores do índice BM25, tabela de símbolos
+        da verificação cruzada, assinaturas MinHash das duplicatas, contagens de tokens do
+        orçamento e o delta do modo incremental.
+        Returns:
+            int: Arquivos pendentes para a próxima execução incremental (ou None).
+        """
+        import budget
+        import crossref
+        import dedup
+        import retrieval
+        import tools
+        from .analyzer import pending_changes
+        from knowledge_base import DOC_EXTENSIONS
+
+        started = time.monotonic()
+        contents, hashes = tools.read_project_files(paths, with_hashes=True)
+        code_paths = [path for path in paths if not path.endswith(DOC_EXTENSIONS)]
+        context_contents = contents
+        if options.get("context_mode") in ("skeleton", "summary"):
+            # No modo 'summary', os resumos dos arquivos (folhas da árvore); os de diretório exigem o modelo
+            context_contents = tools.read_project_context(paths, options["context_mode"])
+        if options.get("token_budget") or options.get("cost_budget") or options.get("dry_run"):
+            budget.count_tokens(context_contents)
+        if options.get("retrieval_top_k"):
+            retrieval.build_index(paths, contents, code_paths)
+        if options.get("use_crossref"):
+            crossref.load_code_symbols(code_paths, contents)
+        if options.get("deduplicate"):
+            types = {path: 'documentacao' if path.endswith(DOC_EXTENSIONS) else 'codigo' for path in paths}
+            dedup.find_duplicates(paths, types, contents, hashes)
+        pending = None
+        if options.get("incremental"):
+            changed, removed = pending_changes(project_path, paths, hashes)
+            pending = len(changed) + len(removed)
+        print(f"[Servidor] {project_path} aquecido: {len(paths)} arquivos em {time.monotonic() - started:.2f}s"
+              + (f", {pending} pendentes para a análise incremental." if pending is not None else "."))
+        return pending
+
+
+# ========================================
+# SERVIDOR
+# ========================================
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Protocolo: uma linha JSON por pedido e uma linha JSON por resposta. Em TCP, o pedido
+    precisa da chave 'token' com o conteúdo do arquivo de token do servidor.
+    """
+
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST_BYTES)
+        try:
+            request = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            request = None
+        if not isinstance(request, dict):
+            response = {"ok": False, "error": "Erro: pedido inválido, esperado um objeto JSON por linha."}
+        elif not _authorized(self.server.auth_token, request.pop("token", None)):
+            response = {"ok": False, "error": "Erro: token de autenticação ausente ou inválido."}
+        else:
+            response = self.server.doc_daemon.handle(request)
+        self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+class _PooledServerMixIn:
+    """
+    Atende cada conexão em um pool fixo de threads em vez de uma thread nova por pedido:
+    as threads (e suas conexões persistentes com o SQLite) são reaproveitadas.
+    """
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class _TCPServer(_PooledServerMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+
+
+if hasattr(socket, "AF_UNIX"):
+    class _UnixServer(_PooledServerMixIn, socketserver.UnixStreamServer):
+        pass
+
+
+def _authorized(expected, token):
+    """Confere o token do pedido (comparação em tempo constante); sem token esperado, tudo é aceito."""
+    if expected is None:
+        return True
+    return isinstance(token, str) and hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8"))
+
+
+def _write_token(token_path):
+    """Gera um token novo e o grava com permissão 0600, substituindo um arquivo anterior."""
+    token = secrets.token_urlsafe(32)
+    if os.path.exists(token_path):
+        os.unlink(token_path)
+    # O_EXCL: o arquivo é criado por este processo, já com a permissão final
+    fd = os.open(token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def _read_token(token_path):
+    try:
+        with open(token_path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _remove_stale_socket(socket_path):
+    """Remove um socket deixado por um servidor encerrado; retorna False se outro servidor estiver ativo."""
+    if not os.path.exists(socket_path):
+        return True
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.unlink(socket_path)
+        return True
+    finally:
+        probe.close()
+    return False
+
+
+def _prewarm_agents():
+    """Importa o agno e constrói os agentes uma única vez, antes do primeiro pedido."""
+    from .analyzer import get_analyzer_agent
+    from .writer import get_writer_agent
+    started = time.monotonic()
+    try:
+        get_analyzer_agent()
+        get_writer_agent()
+    except Exception as e:
+        print(f"[Servidor] Aviso: agentes não pré-carregados ({e!r}); serão criados no primeiro pedido.")
+        return
+    print(f"[Servidor] Agentes prontos em {time.monotonic() - started:.2f}s.")
+
+
+def serve(socket_path=DEFAULT_SOCKET_PATH, port=None, workers=DEFAULT_WORKERS, watch_paths=(),
+          watch_interval=WATCH_INTERVAL, token_path=DEFAULT_TOKEN_PATH):
+    """
+    Inicia o daemon e atende pedidos até receber 'shutdown' ou Ctrl+C.
+    Args:
+        socket_path (str): Socket Unix onde o servidor escuta.
+        port (int): Se informado, escuta em TCP (127.0.0.1:port) em vez do socket Unix.
+        workers (int): Pedidos atendidos em paralelo.
+        watch_paths (list): Projetos observados desde o início.
+        watch_interval (float): Intervalo entre os snapshots dos projetos observados.
+        token_path (str): Em TCP, arquivo onde o token exigido nos pedidos é gravado.
+    """
+    daemon = DocAgentDaemon()
+    auth_token = None
+    if _use_tcp(port):
+        server = _TCPServer((DEFAULT_HOST, port or DEFAULT_PORT), _RequestHandler, bind_and_activate=True)
+        auth_token = _write_token(token_path)
+        address = f"{DEFAULT_HOST}:{server.server_address[1]}, token em {token_path}"
+    else:
+        if not _remove_stale_socket(socket_path):
+            print(f"Erro: já existe um servidor ativo em {socket_path}.")
+            return
+        # Apenas o próprio usuário pode enviar pedidos ao daemon: o socket já nasce acessível
+        # só ao dono (um chmod depois do bind deixaria uma janela para outros usuários)
+        previous_umask = os.umask(0o077)
+        try:
+            server = _UnixServer(socket_path, _RequestHandler)
+        finally:
+            os.umask(previous_umask)
+        address = socket_path
+    server.doc_daemon = daemon
+    server.auth_token = auth_token
+    server.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="doc-agent-server")
+    daemon.server = server
+
+    _prewarm_agents()
+    for path in watch_paths:
+        response = daemon.watch(path)
+        if not response["ok"]:
+            print(f"[Servidor] {response['error']}")
+    watcher = threading.Thread(target=daemon.watch_loop, args=(watch_interval,), daemon=True,
+                               name="doc-agent-watcher")
+    watcher.start()
+
+    print(f"[Servidor] Escutando em {address} ({workers} pedidos em paralelo). Ctrl+C para encerrar.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[Servidor] Interrompido pelo usuário.")
+    finally:
+        daemon.stop_event.set()
+        server.server_close()
+        server.executor.shutdown(wait=True)
+        if not _use_tcp(port) and os.path.exists(socket_path):
+            os.unlink(socket_path)
+        if auth_token is not None and _read_token(token_path) == auth_token:
+            os.unlink(token_path)
+        print("[Servidor] Encerrado.")
+
+
+# ========================================
+# CLIENTE
+# ========================================
+
+def send_request(request, socket_path=DEFAULT_SOCKET_PATH, port=None, timeout=None, token_path=DEFAULT_TOKEN_PATH):
+    """
+    Envia um pedido ao daemon e aguarda a resposta.
+    Args:
+        request (dict): O pedido (ver DocAgentDaemon.handle).
+        socket_path (str): Socket Unix do servidor.
+        port (int): Porta TCP do servidor, se ele escuta em TCP.
+        timeout (float): Tempo máximo de espera, em segundos (padrão: sem limite).
+        token_path (str): Em TCP, arquivo com o token gravado pelo servidor.
+    Returns:
+        dict: A resposta do servidor; falhas de conexão viram {'ok': False, 'error': ...}.
+    """
+    if _use_tcp(port):
+        token = _read_token(token_path)
+        if token is None:
+            return {"ok": False, "error": f"Erro: token do servidor não encontrado em {token_path}. "
+                                         "Ele foi iniciado com 'run.py serve --port'?"}
+        request = dict(request, token=token)
+    try:
+        if _use_tcp(port):
+            client = socket.create_connection((DEFAULT_HOST, port or DEFAULT_PORT), timeout=timeout)
+        else:
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.settimeout(timeout)
+            client.connect(socket_path)
+        with client, client.makefile("rwb") as stream:
+            stream.write((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+            stream.flush()
+            line = stream.readline()
+    except OSError as e:
+        return {"ok": False, "error": f"Erro ao conectar ao servidor: {e}. Ele foi iniciado com 'run.py serve'?"}
+    if not line:
+        return {"ok": False, "error": "Erro: o servidor encerrou a conexão sem responder."}
+    return json.loads(line)
@@ -0,0 +1,145 @@
+# agents/summarizer.py
+# Agente Resumidor: monta a árvore de resumos do projeto de baixo para cima (ver
+# summaries.py), chamando o modelo apenas para os diretórios que ainda não estão em cache.
+import os
+from concurrent.futures import ThreadPoolExecutor
+import budget
+import metrics
+import summaries
+import tools
+from knowledge_base import build_context_block
+from . import runtime
+
+# Instruções para o Agente Resumidor
+summarizer_instructions = """
+Você é um desenvolvedor de software sênior que resume projetos grandes para outros agentes de documentação.
+
+Você receberá os resumos dos arquivos e subdiretórios de um diretório do projeto. Escreva um resumo técnico e denso desse diretório, em Português do Brasil, preservando exatamente os nomes que importam para a documentação: funções, classes e métodos públicos, rotas HTTP, variáveis de ambiente, comandos, arquivos de configuração e o propósito de cada subdiretório. Aponte também o que a documentação do diretório afirma.
+
+Sua resposta DEVE começar com a linha de título indicada na tarefa e conter apenas o resumo, com no máximo 400 palavras. NÃO inclua nenhuma outra explicação.
+"""
+
+# Diretórios resumidos em paralelo em cada nível da árvore
+SUMMARY_WORKERS = 4
+
+
+def build_summarizer_agent():
+    """Cria uma nova instância do Agente Resumidor; os resumos dos filhos vão no bloco de contexto."""
+    return runtime.build_context_agent("summarizer", summarizer_instructions, "claude-3-5-sonnet-20241022")
+
+
+def get_summarizer_agent():
+    """Retorna a instância compartilhada do Agente Resumidor, criada no primeiro uso."""
+    return runtime.get_agent("summarizer", build_summarizer_agent)
+
+
+def _heading(node):
+    return f"## {node.label}"
+
+
+def _summarize_directory(node):
+    """
+    Resume um diretório, em partes se os filhos não couberem em uma chamada.
+    Returns:
+        tuple: (texto do resumo, válido). Resumos inválidos (erro do modelo) usam o texto
+        dos filhos truncado e não vão para o cache.
+    """
+    parts = []
+    for chunk in summaries.chunk_children(node):
+        labels = [child.label for child in chunk]
+        context = build_context_block(labels, {child.label: child.text for child in chunk})
+        prompt = (f"Resuma o diretório {node.label} a partir dos resumos dos seus filhos, fornecidos no "
+                  f"contexto. Comece a resposta com a linha:\n{_heading(node)}\n")
+        text = runtime.run_agent(get_summarizer_agent(), prompt, context=context,
+                                 validate=lambda content: content.lstrip().startswith(_heading(node)))
+        text = (text or "").strip()
+        if not text.startswith(_heading(node)):
+            print(f"[Agente Resumidor] Resposta inválida para {node.label}; usando os resumos dos filhos.")
+            return summaries.leaf_summary(f"{_heading(node)}\n{node.children_text()}"), False
+        parts.append(text)
+    return "\n\n".join(parts), True
+
+
+def run_summarizer(project_path, knowledge_base, token_budget=summaries.DEFAULT_SUMMARY_TOKEN_BUDGET):
+    """
+    Monta a árvore de resumos do projeto e escolhe a profundidade que cabe no orçamento.
+
+    Os arquivos são resumidos sem o modelo (esqueleto do código, texto da documentação,
+    truncados); os diretórios são resumidos pelo modelo de baixo para cima, em paralelo
+    dentro de cada nível. Cada resumo de diretório fica em cache na tabela 'memory',
+    indexado pelo hash dos filhos: alterar um arquivo só recalcula os diretórios no
+    caminho até a raiz. Diretórios pequenos usam o próprio texto dos filhos.
+    Args:
+        project_path (str): Raiz do projeto.
+        knowledge_base (KnowledgeBase): Os arquivos do projeto.
+        token_budget (int): Orçamento aproximado de tokens do contexto escolhido.
+    Returns:
+        dict: Texto de cada nó escolhido (arquivos e diretórios), para o modo de contexto 'summary'.
+    """
+    print(f"[Agente Resumidor] Montando a árvore de resumos de {len(knowledge_base)} arquivos...")
+    leaf_texts = tools.read_project_context(knowledge_base.paths(), 'summary')
+    root = summaries.build_tree(project_path, leaf_texts)
+    directories = summaries.directories_bottom_up(root)
+    cached = summaries.load_cached(directories)
+
+    generated = 0
+    levels = {}
+    for node in directories:
+        if node.text is None:
+            levels.setdefault(node.depth, []).append(node)
+    with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+        # Um nível só começa quando os resumos dos filhos (nível abaixo) estão prontos
+        for depth in sorted(levels, reverse=True):
+            pending = []
+            for node in levels[depth]:
+                children_text = node.children_text()
+                if len(children_text) < summaries.MIN_SUMMARY_CHARS:
+                    node.text = f"{_heading(node)}\n{children_text}"
+                else:
+                    pending.append(node)
+            futures = [metrics.submit(executor, _summarize_directory, node) for node in pending]
+            new_nodes = []
+            for node, future in zip(pending, futures):
+                node.text, valid = future.result()
+                if valid:
+                    new_nodes.append(node)
+            summaries.save(new_nodes)
+            generated += len(new_nodes)
+
+    selection = summaries.select_context(root, token_budget)
+    directories_selected = sum(1 for label in selection if label.endswith(os.sep))
+    print(f"[Agente Resumidor] {len(directories)} diretórios ({cached} do cache, {generated} resumidos pelo "
+          f"modelo); contexto com {len(selection)} nós ({directories_selected} diretórios, "
+          f"~{metrics.estimate_tokens(sum(len(text) for text in selection.values()))} tokens).")
+    return selection
+
+
+def plan_summarizer(project_path, knowledge_base, token_budget=summaries.DEFAULT_SUMMARY_TOKEN_BUDGET):
+    """
+    Estima, sem chamar o modelo, as chamadas que run_summarizer faria (usado pelo modo
+    --dry-run). Os diretórios que ainda não estão em cache recebem um resumo fictício
+    do tamanho esperado de uma resposta, para que os níveis de cima sejam estimados.
+    Returns:
+        tuple: (tokens de entrada de cada chamada, texto estimado de cada nó escolhido
+        para o contexto, como em run_summarizer).
+    """
+    leaf_texts = tools.read_project_context(knowledge_base.paths(), 'summary')
+    root = summaries.build_tree(project_path, leaf_texts)
+    directories = summaries.directories_bottom_up(root)
+    summaries.load_cached(directories)
+    placeholder = "resumo " * budget.OUTPUT_TOKENS["summarizer"]
+    instructions_tokens = budget.estimate_text_tokens(summarizer_instructions)
+    call_tokens = []
+    # directories_bottom_up já vem dos níveis mais profundos para a raiz
+    for node in directories:
+        if node.text is not None:
+            continue
+        children_text = node.children_text()
+        if len(children_text) < summaries.MIN_SUMMARY_CHARS:
+            node.text = f"{_heading(node)}\n{children_text}"
+            continue
+        for chunk in summaries.chunk_children(node):
+            chunk_tokens = budget.count_tokens({child.label: child.text for child in chunk})
+            call_tokens.append(sum(chunk_tokens.values()) + instructions_tokens)
+        node.text = f"{_heading(node)}\n{placeholder}"
+    return call_tokens, summaries.select_context(root, token_budget)
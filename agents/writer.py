@@ -1,17 +1,15 @@
 # agents/writer.py
+import contextlib
 import json
-from dotenv import load_dotenv
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+import retrieval
+import sections
 import tools
-
-try:
-    from agno.agent import Agent
-    from agno.models.anthropic import Claude
-except ImportError:
-    print("Erro: A biblioteca 'agno' não parece estar instalada.")
-    raise
-
-# Carrega as variáveis de ambiente
-load_dotenv()
+from knowledge_base import build_context_block
+from . import runtime, scheduler
 
 # Instruções para o Agente Escritor
 writer_instructions = """
@@ -33,47 +31,328 @@ Seu objetivo é produzir um único e abrangente arquivo `README.md`. Este arquiv
 Sua resposta final DEVE SER apenas o conteúdo de texto completo do novo arquivo `README.md`. NÃO inclua nenhuma outra explicação ou texto introdutório.
 """
 
-# Usamos um modelo mais capaz para esta tarefa de escrita criativa e técnica
-writer_agent = Agent(
-    instructions=writer_instructions,
-    model=Claude(id="claude-3-5-sonnet-20241022"),
-    tools=[]  # O Escritor não precisa de ferramentas, ele apenas gera texto.
-)
 
-def run_writer(discrepancies, knowledge_base):
+def build_writer_agent():
+    """
+    Cria uma nova instância do Agente Escritor.
+    Usamos um modelo mais capaz para esta tarefa de escrita criativa e técnica.
+    O conteúdo dos arquivos é enviado como bloco de contexto (ver runtime.build_context_agent).
+    """
+    return runtime.build_context_agent("writer", writer_instructions, "claude-3-5-sonnet-20241022")
+
+
+def get_writer_agent():
+    """Retorna a instância compartilhada do Agente Escritor, criada no primeiro uso."""
+    return runtime.get_agent("writer", build_writer_agent)
+
+
+def _build_writer_prompt(discrepancies, knowledge_base, context_mode='full'):
+    """
+    Monta a chamada do Escritor. O conteúdo dos arquivos vai no bloco de contexto canônico,
+    idêntico ao enviado ao Analista; as discrepâncias, que mudam a cada execução, vão no prompt.
+    Returns:
+        tuple: (bloco de contexto canônico, prompt com as discrepâncias e a tarefa).
+    """
+    discrepancies_prompt_part = "Baseado na seguinte análise de discrepâncias:\n" + "\n".join(f"- {d}" for d in discrepancies)
+    prompt = (f"{discrepancies_prompt_part}\n\nE no conteúdo dos arquivos do projeto fornecidos no contexto, "
+              "por favor, gere o novo arquivo README.md completo, em português-br, que resolve esses problemas.\n")
+    return knowledge_base.context_block(context_mode), prompt
+
+
+def run_writer(discrepancies, knowledge_base, context_mode='full'):
     """
     Executa o Agente Escritor para gerar a nova documentação.
     Args:
         discrepancies (list): A lista de problemas encontrados pelo Analista.
-        knowledge_base (list): A lista de objetos de arquivo (com metadados e conteúdo).
+        knowledge_base (KnowledgeBase): Os arquivos do projeto, em ordem de prioridade.
+        context_mode (str): 'full' envia o conteúdo completo; 'skeleton' envia apenas os
+            esqueletos dos arquivos de código; 'summary', a árvore de resumos.
     Returns:
         str: O conteúdo do novo arquivo README.md.
+    Raises:
+        RuntimeError: Se o modelo responder com erro depois das novas tentativas.
     """
     print("[Agente Escritor] Preparando o contexto para a reescrita da documentação...")
+    context, prompt = _build_writer_prompt(discrepancies, knowledge_base, context_mode)
     
-    # Monta o prompt com as discrepâncias e o conteúdo dos arquivos
-    discrepancies_prompt_part = "Baseado na seguinte análise de discrepâncias:\n" + "\n".join(f"- {d}" for d in discrepancies)
-    
-    content_prompt_part = "E no conteúdo dos seguintes arquivos do projeto:\n\n"
-    for file_info in knowledge_base:
-        content = tools.read_file_content(file_info['path'])
-        content_prompt_part += f"--- Início de {file_info['path']} ---\n{content}\n--- Fim de {file_info['path']} ---\n\n"
+    print("[Agente Escritor] Enviando contexto para o modelo de linguagem. A geração do novo README pode levar alguns instantes...")
+    new_readme_content = runtime.run_agent(get_writer_agent(), prompt, priority=scheduler.PRIORITY_HIGH,
+                                           context=context, raise_on_error=True)
     
-    prompt = f"""
-{discrepancies_prompt_part}
+    print("[Agente Escritor] Novo README.md gerado com sucesso.")
+    return new_readme_content
+
 
-{content_prompt_part}
+# Intervalo mínimo, em segundos, entre as mensagens de progresso do modo streaming
+STREAM_PROGRESS_INTERVAL = 2.0
 
-Agora, por favor, gere o novo arquivo README.md completo, em português-br, que resolve esses problemas.
+
+def run_writer_stream(discrepancies, knowledge_base, output_path, context_mode='full'):
+    """
+    Executa o Agente Escritor em modo streaming, gravando o README à medida que é gerado.
+
+    Os trechos recebidos são gravados em `<output_path>.partial` e o arquivo só é
+    renomeado para output_path (de forma atômica) quando a geração termina. Erros
+    transitórios antes do primeiro trecho são tentados de novo pelo escalonador; depois
+    dele, a geração é refeita sem streaming (runtime.run_agent). Se a geração for
+    interrompida ou o modelo reportar um erro no stream (evento RunError), o arquivo
+    parcial permanece disponível para inspeção e a resposta não vai para o cache.
+    Args:
+        discrepancies (list): A lista de problemas encontrados pelo Analista.
+        knowledge_base (KnowledgeBase): Os arquivos do projeto, em ordem de prioridade.
+        output_path (str): Caminho final do novo README.
+        context_mode (str): Modo de contexto enviado ao modelo ('full', 'skeleton' ou 'summary').
+    Returns:
+        str: O caminho do README gravado, ou None se a geração falhar.
+    """
+    print("[Agente Escritor] Preparando o contexto para a reescrita da documentação...")
+    context, prompt = _build_writer_prompt(discrepancies, knowledge_base, context_mode)
+    partial_path = output_path + ".partial"
+    writer_agent = get_writer_agent()
+
+    print(f"[Agente Escritor] Gerando o novo README em modo streaming para: {partial_path}")
+    started = time.monotonic()
+    last_report = started
+    received_chars = 0
+    first_chunk_at = None
+    cached = runtime.get_cached_response(writer_agent, prompt, context=context)
+    if cached is not None:
+        print("[Cache LLM] Resposta reaproveitada do cache; gravando o README diretamente.")
+        chunks_source = (text for text in [cached])
+    else:
+        # O stream passa pelo escalonador: erros transitórios antes do primeiro trecho são tentados de novo
+        chunks_source = runtime.stream_agent(writer_agent, prompt, priority=scheduler.PRIORITY_HIGH,
+                                             context=context)
+    chunks = []
+    try:
+        with contextlib.closing(chunks_source), open(partial_path, 'w', encoding='utf-8') as f:
+            try:
+                for chunk in chunks_source:
+                    chunks.append(chunk)
+                    if first_chunk_at is None:
+                        first_chunk_at = time.monotonic()
+                        print(f"[Agente Escritor] Primeiro trecho recebido após {first_chunk_at - started:.1f}s.")
+                    f.write(chunk)
+                    f.flush()
+                    received_chars += len(chunk)
+                    now = time.monotonic()
+                    if now - last_report >= STREAM_PROGRESS_INTERVAL:
+                        print(f"[Agente Escritor] {received_chars} caracteres recebidos ({now - started:.1f}s)...")
+                        last_report = now
+            except Exception as e:
+                # Parte da resposta já foi gravada, então o stream não pode ser retomado: em erros
+                # transitórios, a geração é refeita sem streaming (com novas tentativas e cache)
+                if not chunks or not scheduler.is_retryable_error(e):
+                    raise
+                print(f"[Agente Escritor] Stream interrompido após {received_chars} caracteres ({e}); "
+                      "gerando o README sem streaming...")
+                text = runtime.run_agent(writer_agent, prompt, priority=scheduler.PRIORITY_HIGH,
+                                         context=context, raise_on_error=True)
+                f.seek(0)
+                f.truncate()
+                f.write(text)
+                received_chars = len(text)
+                chunks = None
+            os.fsync(f.fileno())
+        os.replace(partial_path, output_path)
+        # Com a geração refeita sem streaming, run_agent já registrou a chamada e gravou o cache
+        if chunks is not None:
+            runtime.record_call(writer_agent, prompt, time.monotonic() - started,
+                                cached=cached is not None, context=context)
+            if cached is None:
+                runtime.store_response(writer_agent, prompt, "".join(chunks), context=context)
+    except KeyboardInterrupt:
+        print(f"\n[Agente Escritor] Geração interrompida pelo usuário. Resultado parcial em: {partial_path}")
+        raise
+    except Exception as e:
+        print(f"[Agente Escritor] Erro durante a geração: {e}. Resultado parcial em: {partial_path}")
+        return None
+
+    print(f"[Agente Escritor] Novo README.md gerado com sucesso: {received_chars} caracteres "
+          f"em {time.monotonic() - started:.1f}s.")
+    return output_path
+
+
+# ========================================
+# REGENERAÇÃO POR SEÇÕES
+# ========================================
+
+# Instruções para o Agente Escritor de seções
+section_writer_instructions = """
+Você é um escritor técnico e desenvolvedor de software sênior, especializado em documentação em Português do Brasil (pt-br).
+
+Você receberá uma única seção de um `README.md` existente, as discrepâncias que a afetam e o conteúdo dos arquivos do projeto relacionados a elas.
+
+Reescreva apenas essa seção corrigindo as discrepâncias, mantendo o título, o nível do título, o estilo e todo o conteúdo que continua correto. Quando receber discrepâncias sem uma seção correspondente, escreva uma ou mais seções novas (títulos de nível ##) que as resolvam.
+
+Sua resposta final DEVE SER apenas o markdown da seção (ou das seções novas), começando pela linha de título. NÃO inclua nenhuma outra explicação ou texto introdutório.
 """
-    
-    print("[Agente Escritor] Enviando contexto para o modelo de linguagem. A geração do novo README pode levar alguns instantes...")
-    response = writer_agent.run(prompt)
-    
-    print("[Agente Escritor] Novo README.md gerado com sucesso.")
-    
-    # Se a resposta for um objeto RunResponse, extraia o conteúdo
-    if hasattr(response, 'content'):
-        return response.content
+
+# Máximo de arquivos de código enviados como contexto de uma seção
+MAX_SECTION_CONTEXT_FILES = 4
+# Seções regeneradas em paralelo
+SECTION_WORKERS = 4
+
+
+def build_section_writer_agent():
+    """Cria uma nova instância do Agente Escritor de seções."""
+    return runtime.build_context_agent("section_writer", section_writer_instructions, "claude-3-5-sonnet-20241022")
+
+
+def get_section_writer_agent():
+    """Retorna a instância compartilhada do Agente Escritor de seções, criada no primeiro uso."""
+    return runtime.get_agent("section_writer", build_section_writer_agent)
+
+
+def _main_readme(knowledge_base):
+    """O README mais próximo da raiz do projeto, ou None."""
+    readmes = [entry.path for entry in knowledge_base if entry.is_readme]
+    return min(readmes, key=lambda path: (path.count(os.sep), path)) if readmes else None
+
+
+class _ContextSelector:
+    """Escolhe os arquivos de código relevantes para um grupo de discrepâncias."""
+
+    def __init__(self, knowledge_base, file_contents):
+        self.file_contents = file_contents
+        # Arquivos omitidos pelo orçamento de tokens (ver --token-budget) não têm conteúdo
+        self.all_paths = [path for path in knowledge_base.paths() if path in file_contents]
+        self.code_paths = [entry.path for entry in knowledge_base
+                           if entry.type == 'codigo' and entry.path in file_contents]
+        self._index = None
+
+    def select(self, discrepancies):
+        """Arquivos citados pelo nome nas discrepâncias; na falta deles, os recuperados pelo índice BM25."""
+        text = "\n".join(discrepancies)
+        names = set(sections.cited_names(text))
+        selected = []
+        for path in self.code_paths:
+            base_name = os.path.basename(path)
+            if base_name in text or os.path.splitext(base_name)[0] in names:
+                selected.append(path)
+        if not selected and self.code_paths:
+            if self._index is None:
+                # Índice montado apenas se alguma seção precisar dele (vetores em cache, ver retrieval.py)
+                self._index, _ = retrieval.build_index(self.all_paths, self.file_contents, self.code_paths)
+            terms = retrieval.term_frequencies("", text)
+            selected = [path for path, _ in self._index.search(self._index.query_terms(terms), k=2)]
+        return selected[:MAX_SECTION_CONTEXT_FILES]
+
+
+def _build_section_prompt(section_text, discrepancies, context_paths, file_contents):
+    """
+    Monta a chamada de regeneração de uma seção.
+    Returns:
+        tuple: (bloco de contexto canônico com os arquivos relacionados, prompt com a seção e
+        as discrepâncias). Seções que citam os mesmos arquivos compartilham o prefixo em cache.
+    """
+    discrepancies_part = "\n".join(f"- {d}" for d in discrepancies)
+    if section_text is None:
+        target = ("As discrepâncias abaixo não correspondem a nenhuma seção do README.md atual. "
+                  "Escreva as seções novas que as resolvem.\n\n")
     else:
-        return str(response)
\ No newline at end of file
+        target = f"Reescreva a seção abaixo do README.md.\n\n--- Seção atual ---\n{section_text}\n--- Fim da seção ---\n\n"
+    prompt = (f"{target}Discrepâncias a corrigir:\n{discrepancies_part}\n\n"
+              "Use o conteúdo dos arquivos do projeto relacionados, fornecido no contexto. "
+              "Responda apenas com o markdown, em português-br, começando pela linha de título.\n")
+    return build_context_block(context_paths, file_contents), prompt
+
+
+def _regenerate_section(section, discrepancies, selector):
+    """
+    Regenera uma seção (ou escreve seções novas, se section for None). Respostas já
+    geradas para o mesmo prompt vêm do cache de respostas do modelo (ver runtime.run_agent).
+    Retorna o texto, ou None se a resposta do modelo não for uma seção válida.
+    """
+    context_paths = selector.select(discrepancies)
+    original = section.text if section is not None else None
+    context, prompt = _build_section_prompt(original, discrepancies, context_paths, selector.file_contents)
+    try:
+        text = runtime.run_agent(get_section_writer_agent(), prompt, priority=scheduler.PRIORITY_HIGH,
+                                 validate=lambda content: content.lstrip().startswith('#'), context=context,
+                                 raise_on_error=True)
+    except RuntimeError as e:
+        print(f"[Agente Escritor] Erro do modelo ao regenerar a seção: {e}")
+        return None
+    text = (text or "").strip('\n')
+    # Respostas de erro ou sem título não substituem a seção original
+    if not text.lstrip().startswith('#'):
+        return None
+    if original is not None:
+        # Preserva o espaçamento entre esta seção e a seguinte
+        text += original[len(original.rstrip('\n')):] or '\n'
+    else:
+        text += '\n'
+    return text
+
+
+def run_section_writer(discrepancies, knowledge_base, context_mode='full'):
+    """
+    Executa o Agente Escritor apenas sobre as seções do README afetadas pelas discrepâncias.
+
+    O README existente é dividido em seções por título (ver sections.py) e cada discrepância
+    é associada à seção mais relevante. Só essas seções são regeneradas, em paralelo e cada
+    uma apenas com os arquivos de código relacionados às suas discrepâncias; as demais são
+    mantidas sem alteração. Discrepâncias sem seção correspondente viram seções novas no final.
+    Seções regeneradas com o mesmo prompt são reaproveitadas do cache de respostas do modelo.
+    Sem um README existente, recai na reescrita completa (run_writer).
+    Args:
+        discrepancies (list): A lista de problemas encontrados pelo Analista.
+        knowledge_base (KnowledgeBase): Os arquivos do projeto, em ordem de prioridade.
+        context_mode (str): Modo de contexto dos arquivos de código ('full', 'skeleton' ou 'summary').
+    Returns:
+        str: O conteúdo do novo arquivo README.md.
+    Raises:
+        RuntimeError: Se nenhuma das seções afetadas puder ser regenerada (ou, sem README
+            existente, se a reescrita completa falhar).
+    """
+    readme_path = _main_readme(knowledge_base)
+    # Cada seção recebe arquivos específicos; no modo 'summary' eles vão como esqueletos
+    file_contents = knowledge_base.contents('skeleton' if context_mode == 'summary' else context_mode)
+    # O README é lido sem as notas de duplicatas que a base acrescenta ao conteúdo (ver --dedup)
+    readme_text = tools.read_project_files([readme_path])[readme_path] if readme_path else None
+    if not readme_text or not readme_text.strip() or readme_text.startswith("Erro"):
+        print("[Agente Escritor] Nenhum README existente para atualizar por seções; reescrevendo o documento completo.")
+        return run_writer(discrepancies, knowledge_base, context_mode)
+
+    readme_sections = sections.split_sections(readme_text)
+    mapping, unmatched = sections.map_discrepancies(readme_sections, discrepancies)
+    print(f"[Agente Escritor] {len(readme_sections)} seções em {os.path.basename(readme_path)}: "
+          f"{len(mapping)} afetadas, {len(unmatched)} discrepâncias sem seção correspondente.")
+
+    selector = _ContextSelector(knowledge_base, file_contents)
+    jobs = [(position, readme_sections[position], mapping[position]) for position in sorted(mapping)]
+    if unmatched:
+        jobs.append((None, None, unmatched))
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(SECTION_WORKERS, len(jobs)))) as executor:
+        futures = {position: metrics.submit(executor, _regenerate_section, section, section_discrepancies, selector)
+                   for position, section, section_discrepancies in jobs}
+        for position, future in futures.items():
+            results[position] = future.result()
+
+    output = []
+    failed = 0
+    for position, section in enumerate(readme_sections):
+        text = results.get(position, section.text)
+        if text is None:
+            failed += 1
+            text = section.text
+        output.append(sections.Section(section.level, section.title, text))
+    if unmatched:
+        text = results[None]
+        if text is None:
+            failed += 1
+        else:
+            # Seções novas vão para o final, separadas da última por uma linha em branco
+            last = output[-1]
+            last.text = last.text.rstrip('\n') + '\n\n'
+            output.append(sections.Section(2, "", text))
+
+    if jobs and failed == len(jobs):
+        raise RuntimeError(f"nenhuma das {len(jobs)} seções afetadas pôde ser regenerada")
+    metrics.add(sections_total=len(readme_sections), sections_regenerated=len(jobs))
+    print(f"[Agente Escritor] {len(jobs) - failed} seções geradas, "
+          f"{len(readme_sections) - len(mapping)} reaproveitadas sem alteração"
+          + (f", {failed} mantidas por falha na geração." if failed else "."))
+    return sections.join_sections(output)
@@ -0,0 +1,550 @@
+# benchmark.py
+# Benchmark offline do pipeline: troca o modelo Claude por um modelo local determinístico,
+# gera projetos sintéticos e mede cada etapa do orquestrador separadamente.
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Onde os resultados são acumulados para comparação entre versões
+RESULTS_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "benchmark_results.jsonl"))
+# Onde os projetos sintéticos são gerados (reaproveitados entre execuções)
+SYNTHETIC_ROOT = os.path.join(tempfile.gettempdir(), "doc_agent_bench")
+
+DEFAULT_SIZES = [10, 1000, 10000, 100000]
+SEARCH_PATTERNS = ['**/*.py', '**/*.js', '**/*.ts', '**/*.md', '**/*.txt']
+STAGES = ['discovery', 'metadata', 'reading', 'prompt_assembly', 'model_call', 'parsing', 'writing']
+
+_ROUTE_METHODS = ['GET', 'POST', 'PUT', 'DELETE']
+_WORDS = ("usuario conta token sessao cache fila evento pedido pagamento relatorio "
+          "arquivo projeto servico cliente produto estoque nota envio login senha").split()
+
+
+# ========================================
+# MODELO LOCAL (substitui o Claude)
+# ========================================
+
+class FakeModel:
+    """
+    Substituto determinístico do modelo Claude. A latência simulada é
+    latency + tokens_de_entrada / input_throughput + tokens_de_saída / output_throughput;
+    o tempo efetivamente esperado é multiplicado por time_scale.
+    """
+
+    def __init__(self, model_id, latency=0.5, input_throughput=20000.0, output_throughput=80.0,
+                 output_tokens=800, time_scale=1.0):
+        self.id = model_id
+        self.latency = latency
+        self.input_throughput = input_throughput
+        self.output_throughput = output_throughput
+        self.output_tokens = output_tokens
+        self.time_scale = time_scale
+
+    def simulated_seconds(self, input_tokens, output_tokens, cached_tokens=0):
+        # Tokens lidos do cache de prompts são processados CACHE_READ_SPEEDUP vezes mais rápido
+        return (self.latency + (input_tokens - cached_tokens) / self.input_throughput
+                + cached_tokens / (self.input_throughput * CACHE_READ_SPEEDUP)
+                + output_tokens / self.output_throughput)
+
+
+# Mensagem das falhas simuladas (--failure-rate), no formato dos erros do provedor
+SIMULATED_RATE_LIMIT = "Error code: 429 - rate_limit_error: simulated rate limit"
+# Aceleração simulada da leitura de um prefixo em cache em relação a tokens novos
+CACHE_READ_SPEEDUP = 10.0
+
+
+class FakePromptCache:
+    """
+    Imita o cache de prompts do provedor: um bloco de contexto já visto (pelo hash, como
+    em runtime.context_hash) é servido do cache, por qualquer agente.
+    """
+
+    def __init__(self):
+        self.seen = set()
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, context_hash):
+        """Registra o prefixo e indica se ele já estava em cache."""
+        with self._lock:
+            hit = context_hash in self.seen
+            self.seen.add(context_hash)
+            self.hits += hit
+            return hit
+
+
+class FakeRunOutput:
+    """Imita o RunOutput do agno: conteúdo, status e métricas de tokens."""
+
+    def __init__(self, content, input_tokens, output_tokens, status=None, cache_read_tokens=0):
+        self.content = content
+        self.status = status
+        self.metrics = FakeMetrics(input_tokens, output_tokens, cache_read_tokens)
+
+    def get_content_as_string(self):
+        return self.content
+
+
+class FakeMetrics:
+    def __init__(self, input_tokens, output_tokens, cache_read_tokens=0):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_read_tokens = cache_read_tokens
+
+
+class FakeRunContentEvent:
+    event = 'RunContent'
+
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeRunErrorEvent:
+    """Imita o evento RunError do agno: um stream que falha não lança exceção."""
+    event = 'RunError'
+
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeAgent:
+    """
+    Substituto local de agno.agent.Agent com o mesmo contrato usado pelos agentes deste
+    projeto: atributos `model` e `instructions` e o método run(prompt, stream=False).
+    A resposta é gerada a partir do prompt, conforme o papel do agente.
+    """
+
+    def __init__(self, role, instructions, model, failure_rate=0.0, prompt_cache=None):
+        self.role = role
+        self.name = role
+        self.instructions = instructions
+        self.model = model
+        self.calls = 0
+        self.failures = 0
+        self.simulated_seconds = 0.0
+        # Fração das chamadas que falham com um erro 429 simulado (ver scheduler.py); nos
+        # streams, a falha é um evento RunError antes do primeiro trecho ou no meio do stream
+        self.failure_rate = failure_rate
+        self._failure_rng = random.Random(role)
+        self._lock = threading.Lock()
+        # Cache de prompts compartilhado entre os agentes, como no provedor
+        self.prompt_cache = prompt_cache if prompt_cache is not None else FakePromptCache()
+        self.context_hashes = []
+
+    def _respond(self, prompt):
+        if self.role == 'analyzer':
+            paths = re.findall(r"--- Início de: (.*?) ---", prompt)
+            discrepancies = [f"O arquivo `{os.path.basename(p)}` não está documentado no README.md." for p in paths[:20]]
+            return json.dumps({"discrepancies": discrepancies}, ensure_ascii=False)
+        if self.role == 'researcher':
+            return "[]"
+        if self.role == 'summarizer':
+            heading = re.search(r"^## .*$", prompt, re.MULTILINE)
+            children = re.findall(r"--- Início de: (.*?) ---", prompt)
+            return (heading.group(0) if heading else "## Diretório") + "\n" + "\n".join(
+                f"- `{os.path.basename(child.rstrip(os.sep))}`: resumo simulado." for child in children)
+        if self.role == 'section_writer':
+            section = re.search(r"--- Seção atual ---\n(.*?)\n--- Fim da seção ---", prompt, re.DOTALL)
+            text = section.group(1).rstrip() if section else "## Nova seção"
+            return f"{text}\n\nConteúdo revisado pelo modelo simulado.\n"
+        words = []
+        rng = random.Random(len(prompt))
+        while len(words) < self.model.output_tokens:
+            words.extend(["##", "Seção", "\n"] + rng.sample(_WORDS, 8) + ["\n\n"])
+        return "# README\n\n" + " ".join(words)
+
+    def run(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            failed = self._failure_rng.random() < self.failure_rate
+            self.failures += failed
+            # Posição da falha no stream, em fração dos trechos (0 = antes do primeiro)
+            fail_at = self._failure_rng.choice((0.0, 0.5)) if failed and stream else None
+        if failed and not stream:
+            time.sleep(self.model.latency * self.model.time_scale)
+            return FakeRunOutput(SIMULATED_RATE_LIMIT, 0, 0, status='ERROR')
+        # O bloco de contexto chega pelo system, como no Claude (ver runtime.build_context_agent)
+        from agents import runtime
+        context = runtime.current_context() or ""
+        cached_tokens = 0
+        if context:
+            context_hash = runtime.context_hash(context)
+            self.context_hashes.append(context_hash)
+            if self.prompt_cache.lookup(context_hash):
+                cached_tokens = len(context) // 4
+        content = self._respond(context + prompt)
+        input_tokens = len(context + prompt) // 4
+        output_tokens = len(content) // 4
+        seconds = self.model.simulated_seconds(input_tokens, output_tokens, cached_tokens)
+        self.simulated_seconds += seconds
+        if not stream:
+            time.sleep(seconds * self.model.time_scale)
+            return FakeRunOutput(content, input_tokens, output_tokens, cache_read_tokens=cached_tokens)
+        return self._stream(content, seconds * self.model.time_scale, fail_at)
+
+    def _stream(self, content, seconds, fail_at=None):
+        chunks = [content[i:i + 200] for i in range(0, len(content), 200)] or [""]
+        for index, chunk in enumerate(chunks):
+            if fail_at is not None and index >= fail_at * len(chunks):
+                yield FakeRunErrorEvent(SIMULATED_RATE_LIMIT)
+                return
+            time.sleep(seconds / len(chunks))
+            yield FakeRunContentEvent(chunk)
+
+
+def install_fake_model(latency=0.5, input_throughput=20000.0, output_throughput=80.0, output_tokens=800,
+                       time_scale=1.0, failure_rate=0.0):
+    """
+    Substitui os agentes baseados no Claude por FakeAgent em researcher, analyzer, writer
+    (incluindo o Escritor de seções) e summarizer.
+    Com failure_rate > 0, essa fração das chamadas falha com um erro 429 simulado (nos
+    streams, um evento RunError), e o escalonador passa a usar backoff proporcional a time_scale.
+    Returns:
+        dict: Os agentes falsos, por papel.
+    """
+    from agents import analyzer, researcher, runtime, scheduler, summarizer, writer
+
+    prompt_cache = FakePromptCache()
+
+    def make(role, instructions):
+        model = FakeModel(f"fake-{role}", latency, input_throughput, output_throughput, output_tokens, time_scale)
+        return FakeAgent(role, instructions, model, failure_rate, prompt_cache)
+
+    fakes = {
+        'researcher': make('researcher', researcher.researcher_instructions),
+        'analyzer': make('analyzer', analyzer.analyzer_instructions),
+        'writer': make('writer', writer.writer_instructions),
+        'section_writer': make('section_writer', writer.section_writer_instructions),
+        'summarizer': make('summarizer', summarizer.summarizer_instructions),
+    }
+    # As fábricas são substituídas: o agno nunca chega a ser importado pelo benchmark
+    researcher.build_researcher_agent = lambda: fakes['researcher']
+    analyzer.build_analyzer_agent = lambda: fakes['analyzer']
+    writer.build_writer_agent = lambda: fakes['writer']
+    writer.build_section_writer_agent = lambda: fakes['section_writer']
+    summarizer.build_summarizer_agent = lambda: fakes['summarizer']
+    for role, agent in fakes.items():
+        runtime._agents[role] = agent
+    if failure_rate:
+        scheduler.set_scheduler(scheduler.ModelScheduler(base_delay=scheduler.DEFAULT_BASE_DELAY * time_scale))
+    return fakes
+
+
+# ========================================
+# PROJETOS SINTÉTICOS
+# ========================================
+
+def _python_file(rng, index):
+    functions = []
+    for j in range(rng.randint(2, 8)):
+        name = f"{rng.choice(_WORDS)}_{index}_{j}"
+        functions.append(
+            f"def {name}(request, {rng.choice(_WORDS)}=None):\n"
+            f"    \"\"\"Processa {rng.choice(_WORDS)} de {rng.choice(_WORDS)}.\"\"\"\n"
+            f"    timeout = os.getenv(\"{rng.choice(_WORDS).upper()}_TIMEOUT\", \"30\")\n"
+            + "".join(f"    valor_{k} = {k} * len(str(request))\n" for k in range(rng.randint(5, 40)))
+            + "    return timeout\n"
+        )
+    route = f"@app.route(\"/{rng.choice(_WORDS)}/{index}\", methods=[\"{rng.choice(_ROUTE_METHODS)}\"])\n"
+    return "import os\nfrom flask import Flask\n\napp = Flask(__name__)\n\n\n" + route + "\n\n".join(functions)
+
+
+def _ts_file(rng, index):
+    parts = ["import { Router } from 'express';\nconst router = Router();\n"]
+    for j in range(rng.randint(2, 6)):
+        name = f"{rng.choice(_WORDS)}{index}x{j}"
+        parts.append(
+            f"/** Manipula {rng.choice(_WORDS)}. */\n"
+            f"export async function {name}(req: any, res: any): Promise<void> {{\n"
+            f"  const url = process.env.{rng.choice(_WORDS).upper()}_URL;\n"
+            + "".join(f"  const v{k} = {k} + req.body.length;\n" for k in range(rng.randint(5, 30)))
+            + "  res.json({ url });\n}\n"
+            f"router.{rng.choice(_ROUTE_METHODS).lower()}('/{rng.choice(_WORDS)}/{index}', {name});\n"
+        )
+    return "\n".join(parts)
+
+
+def _md_file(rng, index):
+    lines = [f"# Módulo {index}", ""]
+    for _ in range(rng.randint(3, 12)):
+        lines.append(f"- `{rng.choice(_WORDS)}_{index}`: " + " ".join(rng.choice(_WORDS) for _ in range(15)))
+    lines.append(f"\n`{rng.choice(_ROUTE_METHODS)} /{rng.choice(_WORDS)}/{index}` retorna um JSON.")
+    return "\n".join(lines) + "\n"
+
+
+def generate_project(n_files, seed=42, root=SYNTHETIC_ROOT):
+    """
+    Gera (ou reaproveita) um projeto sintético com n_files arquivos .py/.ts/.md
+    distribuídos em diretórios aninhados.
+    Returns:
+        str: O caminho do projeto.
+    """
+    project_path = os.path.join(root, f"project_{n_files}_{seed}")
+    marker = os.path.join(project_path, ".bench_complete")
+    if os.path.exists(marker):
+        return project_path
+    shutil.rmtree(project_path, ignore_errors=True)
+    rng = random.Random(seed)
+    os.makedirs(project_path)
+    with open(os.path.join(project_path, "README.md"), 'w', encoding='utf-8') as f:
+        f.write(_md_file(rng, 0))
+    for index in range(1, n_files):
+        # Até 20 arquivos por diretório, em até três níveis
+        directory = os.path.join(project_path, f"pkg_{index // 400}", f"mod_{index // 20}")
+        os.makedirs(directory, exist_ok=True)
+        kind = rng.random()
+        if kind < 0.5:
+            path, content = os.path.join(directory, f"arquivo_{index}.py"), _python_file(rng, index)
+        elif kind < 0.75:
+            path, content = os.path.join(directory, f"arquivo_{index}.ts"), _ts_file(rng, index)
+        else:
+            path, content = os.path.join(directory, f"doc_{index}.md"), _md_file(rng, index)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    open(marker, 'w').close()
+    return project_path
+
+
+# ========================================
+# EXECUÇÃO
+# ========================================
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_benchmark(n_files, options):
+    """
+    Executa o pipeline completo sobre um projeto sintético com o modelo local,
+    cronometrando cada etapa. Deve ser chamada em um processo próprio para que o
+    pico de memória (RSS) seja o desta execução.
+    Returns:
+        dict: Tempos por etapa (segundos), bytes de prompt, pico de RSS e contadores.
+    """
+    project_path = generate_project(n_files, options['seed'])
+    workdir = tempfile.mkdtemp(prefix="doc_agent_bench_run_")
+
+    import database
+    # Bancos temporários: o benchmark não usa nem altera os caches do usuário
+    database.DB_FILE = os.path.join(workdir, "doc_agent.db")
+    database.LLM_CACHE_DB_FILE = os.path.join(workdir, "llm_cache.db")
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet):
+        database.initialize_database()
+
+    import tools
+    from agents import analyzer, runtime
+    runtime.set_llm_cache_enabled(False)
+    fakes = install_fake_model(options['latency'], options['input_throughput'],
+                               options['output_throughput'], options['output_tokens'], options['time_scale'],
+                               options.get('failure_rate', 0.0))
+
+    timings = {}
+
+    def timed(stage, func, *args, **kwargs):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(quiet):
+            result = func(*args, **kwargs)
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+        return result
+
+    knowledge_base = timed('discovery', tools.scan_project, project_path, SEARCH_PATTERNS)
+    timed('metadata', knowledge_base.sort_by_priority)
+    paths = knowledge_base.paths()
+    contents = timed('reading', knowledge_base.contents, options['context_mode'])
+    warm_started = time.perf_counter()
+    with contextlib.redirect_stdout(quiet):
+        tools.read_project_context(paths, options['context_mode'])
+    reading_warm = time.perf_counter() - warm_started
+    if options['context_mode'] == 'summary':
+        # A árvore de resumos (com as chamadas ao Resumidor) entra no tempo de leitura
+        from agents.summarizer import run_summarizer
+        knowledge_base.use_contents('summary', timed('reading', run_summarizer, project_path, knowledge_base))
+        paths = knowledge_base.context_paths('summary')
+        contents = knowledge_base.contents('summary')
+
+    from agents import writer
+    from knowledge_base import build_context_block
+    analyzer_context, analyzer_prompt = timed('prompt_assembly', analyzer._build_prompt, paths, contents)
+    response = timed('model_call', runtime.run_agent, analyzer.get_analyzer_agent(), analyzer_prompt,
+                     context=analyzer_context)
+    discrepancies = timed('parsing', analyzer._parse_response, response)
+    writer_context, writer_prompt = timed('prompt_assembly', writer._build_writer_prompt, discrepancies,
+                                          knowledge_base, options['context_mode'])
+    output_path = os.path.join(workdir, "README_gerado.md")
+    if options.get('stream_writer'):
+        # O streaming já grava o README durante a chamada (e refaz a geração se o stream falhar)
+        if timed('model_call', writer.run_writer_stream, discrepancies, knowledge_base, output_path,
+                 options['context_mode']) is None:
+            raise RuntimeError("O Escritor em modo streaming não gerou o README.")
+    else:
+        readme = timed('model_call', runtime.run_agent, writer.get_writer_agent(), writer_prompt,
+                       context=writer_context)
+    # Verificação offline do prefixo: o Escritor deve reenviar o mesmo bloco do Analista, e
+    # o bloco não pode depender da ordem dos arquivos (ex: mtime diferente em outra execução)
+    prefix_hashes = {
+        "analyzer": runtime.context_hash(analyzer_context),
+        "writer": runtime.context_hash(writer_context),
+        "rerun": runtime.context_hash(build_context_block(list(reversed(paths)), contents)),
+    }
+
+    def write_output():
+        with open(output_path + ".partial", 'w', encoding='utf-8') as f:
+            f.write(readme)
+        os.replace(output_path + ".partial", output_path)
+
+    if not options.get('stream_writer'):
+        timed('writing', write_output)
+    database.close_connections()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "files": len(knowledge_base),
+        "stages": {stage: round(timings.get(stage, 0.0), 4) for stage in STAGES},
+        "reading_warm": round(reading_warm, 4),
+        "total": round(sum(timings.values()), 4),
+        "simulated_model_seconds": round(sum(fake.simulated_seconds for fake in fakes.values()), 4),
+        "model_calls": sum(fake.calls for fake in fakes.values()),
+        "model_failures": sum(fake.failures for fake in fakes.values()),
+        "prompt_bytes": {
+            "analyzer": len((analyzer_context + analyzer_prompt).encode('utf-8')),
+            "writer": len((writer_context + writer_prompt).encode('utf-8')),
+        },
+        "prefix_shared": len(set(prefix_hashes.values())) == 1,
+        "prefix_cache_hits": fakes['analyzer'].prompt_cache.hits,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _run_in_child(n_files, options):
+    # Um processo novo por tamanho para medir o pico de memória isoladamente
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(run_benchmark, (n_files, options))
+
+
+def _git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def load_results(results_file=RESULTS_FILE):
+    """Lê os resultados acumulados de execuções anteriores."""
+    if not os.path.exists(results_file):
+        return []
+    with open(results_file, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_result(result, results_file=RESULTS_FILE):
+    with open(results_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def print_result(result, previous=None):
+    """Imprime os tempos por etapa e, se houver, a variação em relação à execução anterior."""
+    metrics = result['metrics']
+    print(f"\n=== {result['files']} arquivos | revisão {result['revision']} | {result['label']} ===")
+    for stage in STAGES + ['total']:
+        value = metrics['stages'][stage] if stage in metrics['stages'] else metrics[stage]
+        line = f"  {stage:<16} {value:>10.4f}s"
+        if previous:
+            old = previous['metrics']['stages'].get(stage) if stage in STAGES else previous['metrics'][stage]
+            if old:
+                line += f"  ({(value - old) / old * 100:+.1f}% vs {previous['revision']})"
+        print(line)
+    print(f"  leitura (cache)  {metrics['reading_warm']:>10.4f}s")
+    print(f"  prompt (bytes)   analista={metrics['prompt_bytes']['analyzer']} escritor={metrics['prompt_bytes']['writer']}")
+    print(f"  chamadas modelo  {metrics['model_calls']} (tempo simulado {metrics['simulated_model_seconds']}s)")
+    if 'prefix_shared' in metrics:
+        print(f"  prefixo comum    {'sim' if metrics['prefix_shared'] else 'NÃO'} "
+              f"({metrics['prefix_cache_hits']} leituras do cache de prompts simulado)")
+    if metrics.get('model_failures'):
+        print(f"  falhas simuladas {metrics['model_failures']} (recuperadas pelo escalonador)")
+    print(f"  pico de RSS      {metrics['peak_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="benchmark",
+        description="Benchmark offline do agente de documentação com um modelo local simulado."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help=f"Tamanhos (número de arquivos) dos projetos sintéticos (padrão: {DEFAULT_SIZES}).")
+    parser.add_argument("--latency", type=float, default=0.5, help="Latência fixa simulada por chamada (s).")
+    parser.add_argument("--input-throughput", type=float, default=20000.0,
+                        help="Tokens de entrada processados por segundo pelo modelo simulado.")
+    parser.add_argument("--output-throughput", type=float, default=80.0,
+                        help="Tokens de saída gerados por segundo pelo modelo simulado.")
+    parser.add_argument("--output-tokens", type=int, default=800, help="Tamanho aproximado do README simulado.")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Fator aplicado ao tempo simulado efetivamente esperado (0 = não espera).")
+    parser.add_argument("--context-mode", choices=('full', 'skeleton', 'summary'), default='full',
+                        help="Modo de contexto enviado ao modelo.")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="Fração das chamadas ao modelo que falham com um erro 429 simulado (padrão: 0).")
+    parser.add_argument("--stream-writer", action="store_true",
+                        help="Gera o README com o Escritor em modo streaming (como analyze --stream).")
+    parser.add_argument("--seed", type=int, default=42, help="Semente dos projetos sintéticos.")
+    parser.add_argument("--label", default="", help="Rótulo livre para identificar a execução.")
+    parser.add_argument("--no-save", action="store_true", help=f"Não grava os resultados em {RESULTS_FILE}.")
+    args = parser.parse_args()
+
+    options = {
+        'latency': args.latency,
+        'input_throughput': args.input_throughput,
+        'output_throughput': args.output_throughput,
+        'output_tokens': args.output_tokens,
+        'time_scale': args.time_scale,
+        'context_mode': args.context_mode,
+        'seed': args.seed,
+    }
+    if args.failure_rate:
+        # Só entra nas opções quando usado, para manter a comparação com o histórico
+        options['failure_rate'] = args.failure_rate
+    if args.stream_writer:
+        options['stream_writer'] = True
+    history = load_results()
+    revision = _git_revision()
+    for n_files in args.sizes:
+        print(f"Gerando/reaproveitando projeto sintético com {n_files} arquivos...")
+        metrics = _run_in_child(n_files, options)
+        result = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": revision,
+            "label": args.label,
+            "files": n_files,
+            "options": options,
+            "metrics": metrics,
+        }
+        previous = next((r for r in reversed(history)
+                         if r['files'] == n_files and r['options'] == options), None)
+        print_result(result, previous)
+        if not args.no_save:
+            save_result(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# budget.py
+# Orçamento de tokens e de custo das chamadas ao modelo: um estimador local de tokens (em
+# cache pelo hash do texto), a seleção dos arquivos que cabem no orçamento de uma etapa
+# (os de maior prioridade completos; os demais reduzidos ao esqueleto, truncados ou
+# omitidos) e as estimativas de tokens, custo e latência por etapa usadas pelo modo --dry-run.
+import os
+import re
+import database
+import skeleton
+
+# Versão do estimador; incrementar invalida as contagens em cache
+TOKEN_ESTIMATOR_VERSION = 1
+# Nome usado na tabela 'memory' para as contagens em cache
+TOKEN_MEMORY_AGENT = "tokens"
+
+# Cada trecho casado conta como um token: sequências de até 8 letras (palavras longas e
+# identificadores viram vários tokens), grupos de até 3 dígitos, cada pontuação e cada
+# quebra de linha com a indentação seguinte. É uma aproximação dos tokenizadores BPE, sem
+# depender de um tokenizador instalado; as contagens do provedor ficam em run_history.
+_TOKEN_RE = re.compile(r"[^\W\d_]{1,8}|\d{1,3}|[^\w\s]|_|\n\s*")
+
+# Modelo usado nas estimativas de custo (o mesmo dos agentes) e preços em US$ por milhão de
+# tokens: (entrada, saída). DOC_AGENT_PRICE_INPUT e DOC_AGENT_PRICE_OUTPUT sobrescrevem a tabela.
+DEFAULT_MODEL_ID = "claude-3-5-sonnet-20241022"
+MODEL_PRICES = {
+    "claude-3-5-sonnet-20241022": (3.00, 15.00),
+}
+# Janela de contexto do modelo, em tokens de entrada por chamada
+CONTEXT_WINDOW_TOKENS = 200000
+# Multiplicadores do preço de entrada para leituras e gravações do cache de prompts
+CACHE_READ_PRICE_RATIO = 0.1
+CACHE_WRITE_PRICE_RATIO = 1.25
+
+# Tokens reservados, dentro do orçamento de uma etapa, para as instruções, a tarefa e as
+# discrepâncias enviadas junto com o bloco de contexto
+PROMPT_RESERVE_TOKENS = 4000
+# Tokens de saída esperados por chamada de cada agente
+OUTPUT_TOKENS = {"analyzer": 1000, "writer": 4000, "section_writer": 800, "summarizer": 600}
+# Modelo de latência de uma chamada: atraso fixo + processamento da entrada + geração da saída
+LATENCY_BASE_SECONDS = 1.0
+INPUT_TOKENS_PER_SECOND = 10000
+OUTPUT_TOKENS_PER_SECOND = 60
+
+# Tamanho de um arquivo truncado pelo orçamento, em tokens
+TRUNCATED_TOKENS = 200
+# Arquivos de código cujos esqueletos são calculados por vez, na ordem de prioridade
+SKELETON_BATCH = 64
+
+# Contagens já calculadas neste processo, indexadas pela chave da tabela 'memory'
+_token_cache = {}
+
+
+def estimate_text_tokens(text):
+    """Número estimado de tokens de um texto (ver _TOKEN_RE). Não usa cache."""
+    return len(_TOKEN_RE.findall(text))
+
+
+def _memory_key(text_hash):
+    return f"v{TOKEN_ESTIMATOR_VERSION}:{text_hash}"
+
+
+def count_tokens(contents):
+    """
+    Estima os tokens de vários textos. As contagens ficam em cache, neste processo e na
+    tabela 'memory', indexadas pelo hash do texto: arquivos inalterados não são contados
+    de novo nas execuções seguintes.
+    Args:
+        contents (dict): Texto de cada caminho.
+    Returns:
+        dict: Tokens estimados de cada caminho.
+    """
+    keys = {path: _memory_key(database.hash_content(text)) for path, text in contents.items()}
+    missing = {key for key in keys.values() if key not in _token_cache}
+    if missing:
+        cached = database.load_memory(TOKEN_MEMORY_AGENT, missing, cache=True)
+        _token_cache.update((key, int(value)) for key, value in cached.items())
+    new_items = {}
+    for path, key in keys.items():
+        if key not in _token_cache:
+            _token_cache[key] = estimate_text_tokens(contents[path])
+            new_items[key] = str(_token_cache[key])
+    if new_items:
+        database.save_memory(TOKEN_MEMORY_AGENT, new_items, cache=True)
+    return {path: _token_cache[key] for path, key in keys.items()}
+
+
+def model_prices(model_id=DEFAULT_MODEL_ID):
+    """Preços (entrada, saída) do modelo em US$ por milhão de tokens."""
+    input_price, output_price = MODEL_PRICES.get(model_id, MODEL_PRICES[DEFAULT_MODEL_ID])
+    return (float(os.getenv("DOC_AGENT_PRICE_INPUT", input_price)),
+            float(os.getenv("DOC_AGENT_PRICE_OUTPUT", output_price)))
+
+
+def context_token_budget(token_budget=None, cost_budget=None, model_id=DEFAULT_MODEL_ID):
+    """
+    Orçamento de tokens do bloco de contexto de uma etapa, a partir de um limite de tokens
+    de entrada e/ou de custo (US$) por etapa. O custo reserva a saída da etapa mais cara (o
+    Escritor) e ambos reservam PROMPT_RESERVE_TOKENS para instruções, tarefa e discrepâncias.
+    Returns:
+        int: O orçamento do contexto, ou None se nenhum limite foi informado.
+    """
+    limits = []
+    if token_budget:
+        limits.append(token_budget)
+    if cost_budget:
+        input_price, output_price = model_prices(model_id)
+        output_cost = OUTPUT_TOKENS["writer"] * output_price / 1e6
+        limits.append(int((cost_budget - output_cost) * 1e6 / input_price))
+    if not limits:
+        return None
+    return max(0, min(limits) - PROMPT_RESERVE_TOKENS)
+
+
+def _truncate(text, tokens):
+    """Início do texto com aproximadamente TRUNCATED_TOKENS tokens e uma nota da omissão."""
+    chars = max(1, len(text) * TRUNCATED_TOKENS // max(tokens, 1))
+    omitted = tokens - TRUNCATED_TOKENS
+    return text[:chars] + f"\n[... truncado pelo orçamento de tokens: ~{omitted} tokens omitidos ...]\n"
+
+
+class BudgetSelection:
+    """Resultado de select_within_budget: o conteúdo escolhido e o nível de cada arquivo."""
+    __slots__ = ('contents', 'levels', 'tokens', 'original_tokens')
+
+    def __init__(self, contents, levels, tokens, original_tokens):
+        # Texto de cada caminho mantido, na ordem de prioridade
+        self.contents = contents
+        # Nível de cada caminho: 'full', 'skeleton', 'truncated' ou 'omitted'
+        self.levels = levels
+        self.tokens = tokens
+        self.original_tokens = original_tokens
+
+    def paths(self):
+        return list(self.contents)
+
+    def count(self, level):
+        return sum(1 for value in self.levels.values() if value == level)
+
+    def __repr__(self):
+        return (f"BudgetSelection(tokens={self.tokens}, original_tokens={self.original_tokens}, "
+                f"skeleton={self.count('skeleton')}, truncated={self.count('truncated')}, "
+                f"omitted={self.count('omitted')})")
+
+
+def select_within_budget(file_paths, file_contents, token_budget, context_mode='full', skeletons=None):
+    """
+    Escolhe o conteúdo que cabe no orçamento de tokens de uma etapa: os arquivos de maior
+    prioridade vão completos e os demais são reduzidos ao esqueleto ou truncados.
+
+    Todos os arquivos começam truncados em TRUNCATED_TOKENS (os menores, completos); se nem
+    assim o total couber, os de menor prioridade são omitidos (o de maior prioridade nunca
+    é). Em seguida, na ordem de prioridade, cada arquivo volta ao texto completo se a
+    diferença couber no orçamento restante ou, no modo 'full', ao esqueleto do código.
+    Args:
+        file_paths (list): Caminhos, em ordem de prioridade (ver KnowledgeBase.sort_by_priority).
+        file_contents (dict): Texto de cada caminho no modo de contexto.
+        token_budget (int): Orçamento de tokens do conteúdo (ver context_token_budget).
+        context_mode (str): O modo de contexto do texto ('full', 'skeleton' ou 'summary').
+        skeletons (callable): Recebe uma lista de caminhos e retorna o esqueleto de cada um;
+            por padrão, tools.read_project_context no modo 'skeleton'.
+    Returns:
+        BudgetSelection: O conteúdo escolhido, na ordem de prioridade.
+    """
+    full_tokens = count_tokens({path: file_contents[path] for path in file_paths})
+    original_tokens = sum(full_tokens.values())
+    if original_tokens <= token_budget:
+        return BudgetSelection({path: file_contents[path] for path in file_paths},
+                               {path: 'full' for path in file_paths}, original_tokens, original_tokens)
+
+    tokens = {path: min(full_tokens[path], TRUNCATED_TOKENS) for path in file_paths}
+    levels = {path: 'full' if full_tokens[path] <= TRUNCATED_TOKENS else 'truncated' for path in file_paths}
+    total = sum(tokens.values())
+    kept = list(file_paths)
+    while total > token_budget and len(kept) > 1:
+        path = kept.pop()
+        total -= tokens[path]
+        levels[path] = 'omitted'
+
+    if skeletons is None:
+        import tools  # importação tardia: tools depende de módulos que dependem deste
+        skeletons = lambda paths: tools.read_project_context(paths, 'skeleton')
+    code_paths = [path for path in kept if context_mode == 'full' and skeleton.supports_skeleton(path)]
+    code_positions = {path: position for position, path in enumerate(code_paths)}
+    reduced = {}
+    reduced_tokens = {}
+    for path in kept:
+        if levels[path] == 'full':
+            continue
+        if total - tokens[path] + full_tokens[path] <= token_budget:
+            total += full_tokens[path] - tokens[path]
+            tokens[path] = full_tokens[path]
+            levels[path] = 'full'
+            continue
+        if path not in code_positions:
+            continue
+        if path not in reduced:
+            # Esqueletos calculados em lotes, apenas para o código que não coube completo
+            position = code_positions[path]
+            batch = [candidate for candidate in code_paths[position:position + SKELETON_BATCH]
+                     if candidate not in reduced]
+            texts = skeletons(batch)
+            reduced.update((candidate, texts[candidate]) for candidate in batch)
+            reduced_tokens.update(count_tokens({candidate: texts[candidate] for candidate in batch}))
+        if tokens[path] < reduced_tokens[path] < full_tokens[path] and \
+                total - tokens[path] + reduced_tokens[path] <= token_budget:
+            total += reduced_tokens[path] - tokens[path]
+            tokens[path] = reduced_tokens[path]
+            levels[path] = 'skeleton'
+
+    contents = {}
+    for path in kept:
+        if levels[path] == 'full':
+            contents[path] = file_contents[path]
+        elif levels[path] == 'skeleton':
+            contents[path] = reduced[path]
+        else:
+            contents[path] = _truncate(file_contents[path], full_tokens[path])
+    return BudgetSelection(contents, levels, total, original_tokens)
+
+
+class StageEstimate:
+    """Estimativa de uma etapa: chamadas ao modelo, tokens, custo (US$) e latência (s)."""
+    __slots__ = ('name', 'calls', 'input_tokens', 'largest_call', 'cached_tokens', 'cache_write_tokens',
+                 'output_tokens', 'cost', 'latency', 'note')
+
+    def __init__(self, name, call_tokens=(), agent="analyzer", workers=1, cached_tokens=0, cache_write_tokens=0,
+                 model_id=DEFAULT_MODEL_ID, note=None):
+        """
+        Args:
+            name (str): Nome da etapa (ex: 'analysis').
+            call_tokens (list): Tokens de entrada de cada chamada da etapa.
+            agent (str): Agente que faz as chamadas, para os tokens de saída (ver OUTPUT_TOKENS).
+            workers (int): Chamadas simultâneas da etapa.
+            cached_tokens (int): Tokens de entrada servidos pelo cache de prompts do provedor
+                (cobrados a CACHE_READ_PRICE_RATIO do preço).
+            cache_write_tokens (int): Tokens de entrada gravados no cache de prompts para as
+                etapas seguintes (cobrados a CACHE_WRITE_PRICE_RATIO do preço).
+            note (str): Observação exibida junto com a estimativa.
+        """
+        input_price, output_price = model_prices(model_id)
+        call_tokens = list(call_tokens)
+        self.name = name
+        self.calls = len(call_tokens)
+        self.input_tokens = sum(call_tokens)
+        self.largest_call = max(call_tokens, default=0)
+        self.cached_tokens = cached_tokens
+        self.cache_write_tokens = cache_write_tokens
+        self.output_tokens = OUTPUT_TOKENS[agent] * self.calls
+        self.cost = ((self.input_tokens - cached_tokens - cache_write_tokens) * input_price
+                     + cached_tokens * input_price * CACHE_READ_PRICE_RATIO
+                     + cache_write_tokens * input_price * CACHE_WRITE_PRICE_RATIO
+                     + self.output_tokens * output_price) / 1e6
+        generation = OUTPUT_TOKENS[agent] / OUTPUT_TOKENS_PER_SECOND
+        latencies = [LATENCY_BASE_SECONDS + tokens / INPUT_TOKENS_PER_SECOND + generation for tokens in call_tokens]
+        # Chamadas paralelas: a etapa dura pelo menos a chamada mais longa
+        self.latency = max(max(latencies, default=0.0), sum(latencies) / max(workers, 1))
+        self.note = note
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def print_estimates(estimates):
+    """Imprime a tabela de estimativas por etapa e os totais."""
+    print(f"\n{'etapa':<16} {'chamadas':>8} {'tokens entrada':>15} {'tokens saída':>13} "
+          f"{'custo (US$)':>12} {'latência (s)':>13}")
+    for estimate in estimates:
+        print(f"{estimate.name:<16} {estimate.calls:>8} {estimate.input_tokens:>15} {estimate.output_tokens:>13} "
+              f"{estimate.cost:>12.4f} {estimate.latency:>13.1f}")
+    print(f"{'total':<16} {sum(e.calls for e in estimates):>8} {sum(e.input_tokens for e in estimates):>15} "
+          f"{sum(e.output_tokens for e in estimates):>13} {sum(e.cost for e in estimates):>12.4f} "
+          f"{sum(e.latency for e in estimates):>13.1f}")
+    for estimate in estimates:
+        if estimate.note:
+            print(f"  - {estimate.name}: {estimate.note}")
+        if estimate.largest_call > CONTEXT_WINDOW_TOKENS:
+            print(f"  - {estimate.name}: uma chamada com ~{estimate.largest_call} tokens excede a janela de contexto "
+                  f"do modelo ({CONTEXT_WINDOW_TOKENS}); use --token-budget ou --context-mode summary.")
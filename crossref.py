@@ -0,0 +1,272 @@
+# crossref.py
+# Verificação cruzada determinística entre documentação e código, executada antes de
+# qualquer chamada ao modelo: monta uma tabela de símbolos do código e uma tabela de
+# referências da documentação, emite as discrepâncias certas e separa os casos ambíguos.
+import bisect
+import json
+import os
+import re
+import database
+import skeleton
+from knowledge_base import DOC_EXTENSIONS
+
+# Versão do formato da tabela de símbolos; incrementar invalida o cache
+CROSSREF_VERSION = 1
+# Nome usado na tabela 'memory' para as tabelas de símbolos em cache
+CROSSREF_MEMORY_AGENT = "crossref"
+# Linhas de contexto enviadas ao modelo para cada caso ambíguo
+CONTEXT_LINES = 2
+# Máximo de trechos de código enviados por caso ambíguo
+MAX_CODE_EXCERPTS = 3
+
+_FENCE_RE = re.compile(r"^\s*(```|~~~).*?^\s*\1", re.MULTILINE | re.DOTALL)
+_INLINE_CODE_RE = re.compile(r"`([^`\n]+)`")
+_DOC_ROUTE_RE = re.compile(r"\b(GET|POST|PUT|PATCH|DELETE|HEAD|OPTIONS)\s+(/[\w\-./:{}<>*]*)")
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_$][\w$]*(?:\.[A-Za-z_$][\w$]*)*(?:\(\))?$")
+_ENV_LIKE_RE = re.compile(r"^[A-Z][A-Z0-9]*(?:_[A-Z0-9]+)+$")
+_FILE_LIKE_RE = re.compile(r"^[\w\-./]+\.(py|js|ts|jsx|tsx|mjs|cjs|md|txt|json|ya?ml|toml|cfg|ini|env|sh)$")
+_WORD_RE = re.compile(r"[\w$]+")
+_CODE_PATH_RE = re.compile(r"/[\w\-./:{}<>*]+")
+_ROUTE_PARAM_RE = re.compile(r"\{[^}/]*\}|<[^>/]*>|:[A-Za-z_]\w*|\*")
+
+
+def normalize_route(path):
+    """Normaliza parâmetros de rota (/users/:id, /users/{id}, /users/<int:id>) para /users/{}."""
+    path = _ROUTE_PARAM_RE.sub("{}", path.strip())
+    return path.rstrip('/') or '/'
+
+
+def _looks_like_code_identifier(name):
+    # Palavras simples (ex: `pip`, `docker`) são comuns em documentação e não são verificadas
+    return '_' in name or '.' in name or name.endswith('()') or re.search(r"[a-z][A-Z]", name) is not None
+
+
+def _line_of(text, position):
+    return text.count('\n', 0, position) + 1
+
+
+def _excerpt(text, line_number, context=CONTEXT_LINES):
+    lines = text.splitlines()
+    start = max(0, line_number - 1 - context)
+    return "\n".join(lines[start:line_number + context])
+
+
+# ========================================
+# TABELAS DE SÍMBOLOS E REFERÊNCIAS
+# ========================================
+
+def load_code_symbols(code_paths, file_contents):
+    """
+    Retorna a tabela de símbolos de cada arquivo de código suportado, usando o cache
+    da tabela 'memory' (indexado pelo hash do conteúdo) para os arquivos inalterados.
+    """
+    supported = [path for path in code_paths if skeleton.supports_skeleton(path)]
+    keys = {path: f"v{CROSSREF_VERSION}:{database.hash_content(file_contents[path])}" for path in supported}
+    cached = database.load_memory(CROSSREF_MEMORY_AGENT, set(keys.values()), cache=True)
+    symbols = {}
+    new_items = {}
+    for path in supported:
+        key = keys[path]
+        if key in cached:
+            symbols[path] = json.loads(cached[key])
+        else:
+            symbols[path] = skeleton.extract_symbols(path, file_contents[path])
+            new_items[key] = json.dumps(symbols[path], ensure_ascii=False)
+    if new_items:
+        database.save_memory(CROSSREF_MEMORY_AGENT, new_items, cache=True)
+    return symbols
+
+
+def extract_doc_references(doc_path, text):
+    """
+    Extrai as referências de um documento: identificadores entre crases (fora de blocos
+    de código), nomes de arquivo, variáveis de ambiente e rotas HTTP (método + caminho).
+    Returns:
+        list: Dicionários com 'kind' ('identifier', 'env', 'file' ou 'route'), 'value',
+        'doc' e 'line'.
+    """
+    references = []
+    seen = set()
+
+    def add(kind, value, position):
+        if (kind, value) in seen:
+            return
+        seen.add((kind, value))
+        references.append({"kind": kind, "value": value, "doc": doc_path, "line": _line_of(text, position)})
+
+    for match in _DOC_ROUTE_RE.finditer(text):
+        add("route", f"{match.group(1)} {match.group(2)}", match.start())
+
+    # Blocos de código cercados costumam conter comandos de shell e exemplos, não referências
+    masked = _FENCE_RE.sub(lambda m: "\n" * m.group(0).count("\n"), text)
+    for match in _INLINE_CODE_RE.finditer(masked):
+        value = match.group(1).strip()
+        if _DOC_ROUTE_RE.fullmatch(value) or value.startswith('/'):
+            continue
+        if _FILE_LIKE_RE.match(value):
+            add("file", value, match.start())
+        elif _ENV_LIKE_RE.match(value):
+            add("env", value, match.start())
+        elif _IDENTIFIER_RE.match(value) and _looks_like_code_identifier(value):
+            add("identifier", value, match.start())
+    return references
+
+
+# ========================================
+# VERIFICAÇÃO
+# ========================================
+
+def _file_exists(value, doc_path, root, basenames, relative_names, scanned_extensions):
+    """
+    Indica se um arquivo citado existe. Tipos cobertos pela varredura são procurados entre
+    os arquivos encontrados; os demais (ex: `package.json`), no disco, a partir do
+    documento e da raiz. Tipos não varridos citados só pelo nome contam como existentes,
+    pois podem estar em qualquer diretório.
+    """
+    if os.path.splitext(value)[1] in scanned_extensions:
+        return os.path.basename(value) in basenames if '/' not in value else \
+            any(name.endswith('/' + value.lstrip('./')) for name in relative_names)
+    for base in (os.path.dirname(doc_path), root):
+        if base and os.path.exists(os.path.join(base, value)):
+            return True
+    return '/' not in value
+
+
+def cross_reference(file_paths, file_contents):
+    """
+    Compara a documentação com o código sem chamar o modelo.
+
+    São certas: arquivos citados que não existem, identificadores e variáveis citados
+    que não aparecem em nenhum lugar do código, rotas documentadas sem nenhuma
+    ocorrência no código, e variáveis de ambiente ou rotas do código que nenhum
+    documento menciona. São ambíguos os identificadores e rotas que aparecem no
+    código apenas como texto (ex: em uma string), sem uma definição correspondente.
+    Args:
+        file_paths (list): Caminhos de todos os arquivos (documentação e código).
+        file_contents (dict): Conteúdo completo de cada caminho.
+    Returns:
+        tuple: (discrepâncias certas, casos ambíguos). Cada caso ambíguo é um dicionário
+        com a referência, o trecho do documento e trechos de código onde ela aparece.
+    """
+    doc_paths = [path for path in file_paths if path.endswith(DOC_EXTENSIONS)]
+    code_paths = [path for path in file_paths if not path.endswith(DOC_EXTENSIONS)]
+    symbols = load_code_symbols(code_paths, file_contents)
+
+    defined_names = {}
+    code_routes = {}
+    code_env = {}
+    for path, table in symbols.items():
+        for name in table["names"]:
+            defined_names.setdefault(name, path)
+        for method, route in table["routes"]:
+            code_routes.setdefault(normalize_route(route), []).append((method, route, path))
+        for key in table["env_keys"]:
+            code_env.setdefault(key, path)
+    basenames = {os.path.basename(path) for path in file_paths}
+    relative_names = {path.replace(os.sep, '/') for path in file_paths}
+    scanned_extensions = {os.path.splitext(path)[1] for path in file_paths}
+    root = os.path.commonpath(file_paths) if file_paths else ""
+    if root in file_paths:
+        root = os.path.dirname(root)
+
+    word_index = {}
+    route_index = {}
+    route_tokens = []
+
+    def code_occurrences(value):
+        """Arquivos de código em que value aparece como palavra (identificadores) ou início de caminho (rotas)."""
+        if '/' in value:
+            if not route_tokens:
+                # Índice de trechos com cara de caminho (/x/y), montado apenas se alguma rota precisar dele
+                for path in code_paths:
+                    for token in set(_CODE_PATH_RE.findall(file_contents[path])):
+                        route_index.setdefault(token, []).append(path)
+                route_tokens.extend(sorted(route_index))
+            found = []
+            position = bisect.bisect_left(route_tokens, value)
+            while position < len(route_tokens) and route_tokens[position].startswith(value) \
+                    and len(found) < MAX_CODE_EXCERPTS:
+                found.extend(path for path in route_index[route_tokens[position]] if path not in found)
+                position += 1
+            return found
+        if not word_index:
+            # Índice palavra -> arquivos, montado apenas se alguma referência precisar dele
+            for path in code_paths:
+                for word in set(_WORD_RE.findall(file_contents[path])):
+                    word_index.setdefault(word, []).append(path)
+        return word_index.get(value, [])
+
+    certain = []
+    ambiguous = []
+    for doc_path in doc_paths:
+        doc_name = os.path.basename(doc_path)
+        for reference in extract_doc_references(doc_path, file_contents[doc_path]):
+            kind, value = reference["kind"], reference["value"]
+            if kind == "file":
+                if not _file_exists(value, doc_path, root, basenames, relative_names, scanned_extensions):
+                    certain.append(f"O `{doc_name}` cita o arquivo `{value}`, que não existe no projeto.")
+                continue
+            if kind == "route":
+                method, _, route = value.partition(" ")
+                definitions = code_routes.get(normalize_route(route), [])
+                if any(not defined or method in defined.split('|') for defined, _, _ in definitions):
+                    continue
+                if not definitions and not code_occurrences(route.rstrip('/') or route):
+                    certain.append(f"O `{doc_name}` documenta o endpoint `{value}`, mas não há nenhum handler "
+                                   f"ou ocorrência de `{route}` no código.")
+                    continue
+                found_in = [path for _, _, path in definitions] or code_occurrences(route.rstrip('/') or route)
+            else:
+                name = value[:-2] if value.endswith('()') else value
+                last = name.rsplit('.', 1)[-1]
+                if last in defined_names or name in code_env:
+                    continue
+                found_in = code_occurrences(last)
+                if not found_in:
+                    label = "a variável de ambiente" if kind == "env" else "o identificador"
+                    certain.append(f"O `{doc_name}` menciona {label} `{value}`, que não aparece em nenhum "
+                                   f"arquivo de código.")
+                    continue
+            ambiguous.append(dict(reference, code_paths=found_in[:MAX_CODE_EXCERPTS]))
+
+    all_doc_text = "\n".join(file_contents[path] for path in doc_paths)
+    for key, path in code_env.items():
+        if key not in all_doc_text:
+            certain.append(f"A variável de ambiente `{key}`, lida em `{os.path.basename(path)}`, "
+                           f"não está documentada.")
+    normalized_doc_text = _ROUTE_PARAM_RE.sub("{}", all_doc_text)
+    for normalized, definitions in code_routes.items():
+        if normalized not in normalized_doc_text:
+            method, route, path = definitions[0]
+            endpoint = f"{method} {route}".strip()
+            certain.append(f"O endpoint `{endpoint}`, definido em `{os.path.basename(path)}`, não está documentado.")
+
+    print(f"[Verificação cruzada] {len(symbols)} arquivos de código, {len(doc_paths)} documentos: "
+          f"{len(certain)} discrepâncias certas, {len(ambiguous)} casos ambíguos.")
+    return certain, ambiguous
+
+
+def build_ambiguous_prompt(ambiguous, file_contents):
+    """
+    Monta o prompt do Analista apenas com os casos ambíguos: a referência, o trecho
+    do documento e os trechos de código em que ela aparece.
+    """
+    parts = [
+        "\nA verificação automática entre documentação e código encontrou as referências abaixo, "
+        "que aparecem no código sem uma definição correspondente clara. Para cada uma, decida se "
+        "existe uma discrepância real e gere seu relatório de discrepâncias em formato JSON "
+        "(apenas com as discrepâncias confirmadas).\n\n"
+    ]
+    for number, case in enumerate(ambiguous, 1):
+        doc_text = file_contents[case["doc"]]
+        parts.append(f"--- Caso {number}: `{case['value']}` ({case['kind']}) citado em {case['doc']}, "
+                     f"linha {case['line']} ---\n{_excerpt(doc_text, case['line'])}\n")
+        value = case["value"].partition(" ")[2] if case["kind"] == "route" else case["value"].rstrip('()')
+        needle = value.rsplit('.', 1)[-1] if case["kind"] != "route" else value
+        for code_path in case["code_paths"]:
+            code_text = file_contents[code_path]
+            position = code_text.find(needle)
+            if position >= 0:
+                parts.append(f"Trecho de {code_path}:\n{_excerpt(code_text, _line_of(code_text, position))}\n")
+        parts.append(f"--- Fim do caso {number} ---\n\n")
+    return "".join(parts)
@@ -1,64 +1,831 @@
 
 import sqlite3
 from sqlite3 import Error
+from contextlib import contextmanager
+import codecs
+import hashlib
 import os
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # dependência opcional; sem ela os blobs são comprimidos com zlib
+    zstandard = None
 
 # Define o caminho absoluto para o arquivo do banco de dados
 DB_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "doc_agent.db"))
 
-def create_connection():
-    """Cria e retorna uma conexão com o banco de dados SQLite."""
-    conn = None
+# Cache de respostas do modelo, mantido em um arquivo separado ao lado do doc_agent.db
+LLM_CACHE_DB_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "llm_cache.db"))
+# Validade (segundos) e número máximo de respostas em cache
+# (sobrescritos por DOC_AGENT_LLM_CACHE_TTL e DOC_AGENT_LLM_CACHE_MAX_ENTRIES)
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 2000
+
+# Limite padrão do cache de conteúdo de arquivos (sobrescrito por DOC_AGENT_FILE_CACHE_MAX_BYTES)
+FILE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Compressão dos blobs ('zstd', se o pacote zstandard estiver instalado, ou 'zlib'); o codec
+# fica gravado em cada blob, então trocar a configuração não invalida os já armazenados
+BLOB_CODEC = os.getenv("DOC_AGENT_BLOB_CODEC", "zstd" if zstandard else "zlib")
+# Saídas de 'run_history' maiores que isto (caracteres) são gravadas na tabela 'blobs'
+RUN_INLINE_MAX_CHARS = 4096
+# Execuções mantidas por projeto em 'run_history' (DOC_AGENT_RUN_RETENTION; 0 mantém todas)
+RUN_RETENTION = int(os.getenv("DOC_AGENT_RUN_RETENTION", "50"))
+# Tamanho dos trechos lidos de um blob na leitura em streaming
+BLOB_READ_CHUNK_BYTES = 64 * 1024
+
+# Caches derivados guardados na tabela 'memory' (esqueletos, contagens de tokens, assinaturas,
+# vetores, símbolos, resumos): entradas sem uso há mais que a validade são removidas e cada
+# agente mantém no máximo o limite de entradas, descartando as usadas há mais tempo
+# (sobrescritos por DOC_AGENT_MEMORY_CACHE_TTL e DOC_AGENT_MEMORY_CACHE_MAX_ENTRIES)
+MEMORY_CACHE_TTL_SECONDS = 30 * 24 * 3600
+MEMORY_CACHE_MAX_ENTRIES = 100000
+# O uso de uma entrada em cache só é regravado se o anterior for mais antigo que isto,
+# para que as leituras não virem uma escrita a cada execução
+MEMORY_CACHE_TOUCH_SECONDS = 24 * 3600
+
+# Conexões persistentes por thread (e por processo), indexadas pelo caminho do banco
+_local = threading.local()
+
+# Pragmas aplicados a cada nova conexão: WAL permite leituras concorrentes com uma escrita,
+# synchronous=NORMAL é seguro em WAL e evita um fsync por commit, e busy_timeout faz as
+# escritas concorrentes (threads do Analista, processos do batch) esperarem em vez de falhar
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=10000",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Migrações do esquema do doc_agent.db: (versão, descrição, comandos SQL).
+# A versão aplicada fica em PRAGMA user_version; novas alterações devem ser
+# adicionadas ao final com a próxima versão, nunca editando as já publicadas.
+MIGRATIONS = (
+    (1, "tabelas memory e run_history", (
+        """
+        CREATE TABLE IF NOT EXISTS memory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(agent_name, key)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS run_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL,
+            agent_name TEXT NOT NULL,
+            input_data TEXT,
+            output_data TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+    )),
+    # Cache de conteúdo: cada caminho aponta para um hash de conteúdo,
+    # e o texto decodificado é armazenado uma única vez por hash
+    (2, "cache de conteúdo de arquivos", (
+        """
+        CREATE TABLE IF NOT EXISTS file_cache (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            content_hash TEXT NOT NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS file_contents (
+            content_hash TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        );
+        """,
+    )),
+    (3, "índices de run_history e do cache de arquivos", (
+        "CREATE INDEX IF NOT EXISTS idx_run_history_run ON run_history (run_id, agent_name, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_run_history_agent ON run_history (agent_name, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_run_history_project "
+        "ON run_history (json_extract(input_data, '$.project_path'))",
+        "CREATE INDEX IF NOT EXISTS idx_file_cache_hash ON file_cache (content_hash)",
+        "CREATE INDEX IF NOT EXISTS idx_file_contents_access ON file_contents (last_access)",
+    )),
+    # Conteúdos grandes das execuções (prompts, saídas extensas) comprimidos e armazenados
+    # uma única vez por hash; run_blobs registra quais execuções usam cada blob
+    (4, "blobs comprimidos das execuções", (
+        """
+        CREATE TABLE IF NOT EXISTS blobs (
+            blob_hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            stored_bytes INTEGER NOT NULL,
+            data BLOB NOT NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS run_blobs (
+            run_id TEXT NOT NULL,
+            blob_hash TEXT NOT NULL,
+            PRIMARY KEY (run_id, blob_hash)
+        ) WITHOUT ROWID;
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_run_blobs_hash ON run_blobs (blob_hash)",
+        "ALTER TABLE run_history ADD COLUMN output_blob TEXT",
+    )),
+    (5, "índice de expiração dos caches da tabela memory", (
+        "CREATE INDEX IF NOT EXISTS idx_memory_agent_timestamp ON memory (agent_name, timestamp)",
+    )),
+    # As seções do Escritor passaram a vir apenas do cache de respostas (llm_cache.db)
+    (6, "remoção do antigo cache de seções do Escritor", (
+        "DELETE FROM memory WHERE agent_name = 'writer_sections'",
+    )),
+)
+
+# Migrações do llm_cache.db, versionadas da mesma forma
+LLM_CACHE_MIGRATIONS = (
+    (1, "tabela llm_cache", (
+        """
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            model_id TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        );
+        """,
+    )),
+    (2, "índices de expiração e LRU", (
+        "CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache (last_access)",
+    )),
+)
+
+
+def _apply_migrations(conn, migrations):
+    """
+    Aplica as migrações ainda não registradas em PRAGMA user_version. A verificação é
+    refeita dentro de uma transação IMMEDIATE para que processos concorrentes não
+    apliquem a mesma migração duas vezes.
+    """
+    latest = migrations[-1][0]
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= latest:
+        return
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        conn = sqlite3.connect(DB_FILE)
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, description, statements in migrations:
+            if version <= current:
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA não aceita parâmetros; a versão é sempre um inteiro das tabelas acima
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            print(f"[Banco] Migração {version} aplicada: {description}.")
+        conn.execute("COMMIT")
+    except Error:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _get_connection(db_file, migrations):
+    """
+    Retorna a conexão persistente da thread corrente com db_file, abrindo-a (com os
+    pragmas e as migrações) na primeira chamada. O pid faz parte da chave para que um
+    processo filho criado por fork nunca reutilize a conexão herdada do pai.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = (os.getpid(), db_file)
+    conn = connections.get(key)
+    if conn is not None:
         return conn
+    try:
+        # isolation_level=None: as transações são delimitadas explicitamente por transaction()
+        conn = sqlite3.connect(db_file, timeout=10, isolation_level=None)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        _apply_migrations(conn, migrations)
     except Error as e:
-        print(f"Erro ao conectar ao banco de dados: {e}")
+        print(f"Erro ao conectar ao banco de dados {db_file}: {e}")
+        if conn is not None:
+            conn.close()
+        return None
+    connections[key] = conn
     return conn
 
+
+def create_connection():
+    """
+    Retorna a conexão persistente da thread corrente com o banco de dados SQLite.
+    A conexão é reutilizada entre chamadas e não deve ser fechada pelo chamador.
+    """
+    return _get_connection(DB_FILE, MIGRATIONS)
+
+
+def close_connections():
+    """Fecha as conexões abertas pela thread corrente (ex: antes de apagar um banco temporário)."""
+    connections = getattr(_local, "connections", None) or {}
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+
+@contextmanager
+def transaction(conn):
+    """
+    Executa o bloco em uma transação: COMMIT ao final ou ROLLBACK em caso de erro,
+    mantendo a conexão persistente utilizável.
+
+    A transação é IMMEDIATE, como em _apply_migrations: o lock de escrita é obtido no
+    início, respeitando o busy_timeout. Com um BEGIN adiado, um bloco que lê e depois
+    escreve (ex: prune_runs) falharia na hora com SQLITE_BUSY ao promover o lock, se
+    outro processo (lotes, daemon) estivesse escrevendo.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
 def initialize_database():
     """
-    Cria o banco de dados e as tabelas necessárias se elas ainda não existirem.
+    Cria o banco de dados e aplica as migrações pendentes do esquema.
     """
-    # SQL para criar a tabela de memória persistente
-    sql_create_memory_table = """
-    CREATE TABLE IF NOT EXISTS memory (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        agent_name TEXT NOT NULL,
-        key TEXT NOT NULL,
-        value TEXT NOT NULL,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        UNIQUE(agent_name, key)
-    );
+    print(f"Inicializando banco de dados em: {DB_FILE}")
+    conn = create_connection()
+    if conn is None:
+        print("Erro! Não foi possível criar a conexão com o banco de dados.")
+        return
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    print(f"Esquema do banco de dados na versão {version} (tabelas 'memory', 'run_history' e de cache de arquivos).")
+
+
+def _chunks(values, size=500):
+    """Divide values em blocos que respeitam o limite de parâmetros do SQLite."""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def load_memory_by_prefix(agent_name, key_prefix):
     """
+    Retorna todas as entradas da tabela 'memory' de um agente cujas chaves começam com o prefixo.
+    Returns:
+        dict: Mapeamento chave -> valor.
+    """
+    conn = create_connection()
+    if conn is None:
+        return {}
+    try:
+        rows = conn.execute(
+            "SELECT key, value FROM memory WHERE agent_name = ? AND substr(key, 1, ?) = ?",
+            (agent_name, len(key_prefix), key_prefix)
+        ).fetchall()
+        return dict(rows)
+    except Error as e:
+        print(f"Erro ao ler a memória do agente '{agent_name}': {e}")
+        return {}
 
-    # SQL para criar a tabela de histórico de execuções
-    sql_create_run_history_table = """
-    CREATE TABLE IF NOT EXISTS run_history (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        run_id TEXT NOT NULL,
-        agent_name TEXT NOT NULL,
-        input_data TEXT,
-        output_data TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    );
+
+def load_memory(agent_name, keys, cache=False):
+    """
+    Retorna as entradas da tabela 'memory' de um agente para as chaves fornecidas.
+    Args:
+        agent_name (str): O agente dono das entradas.
+        keys (iterable): As chaves procuradas.
+        cache (bool): O agente é um cache derivado (ver save_memory): o uso das entradas
+            encontradas é registrado, no máximo uma vez por MEMORY_CACHE_TOUCH_SECONDS.
+    Returns:
+        dict: Mapeamento chave -> valor, apenas para as chaves encontradas.
     """
+    keys = list(keys)
+    if not keys:
+        return {}
+    conn = create_connection()
+    if conn is None:
+        return {}
+    try:
+        found = {}
+        stale = []
+        touch_before = f"-{MEMORY_CACHE_TOUCH_SECONDS} seconds"
+        # Consulta em blocos para respeitar o limite de parâmetros do SQLite
+        for chunk in _chunks(keys):
+            placeholders = ",".join("?" * len(chunk))
+            for key, value, is_stale in conn.execute(
+                f"SELECT key, value, timestamp < datetime('now', ?) FROM memory "
+                f"WHERE agent_name = ? AND key IN ({placeholders})",
+                [touch_before, agent_name] + chunk
+            ):
+                found[key] = value
+                if is_stale:
+                    stale.append((agent_name, key))
+        if cache and stale:
+            with transaction(conn):
+                conn.executemany("UPDATE memory SET timestamp = CURRENT_TIMESTAMP WHERE agent_name = ? AND key = ?",
+                                 stale)
+        return found
+    except Error as e:
+        print(f"Erro ao ler a memória do agente '{agent_name}': {e}")
+        return {}
 
+
+def save_memory(agent_name, items, delete_keys=(), cache=False):
+    """
+    Grava (ou substitui) várias entradas da tabela 'memory' em uma única transação,
+    removendo opcionalmente as chaves em delete_keys.
+    Args:
+        agent_name (str): O agente dono das entradas.
+        items (dict): Mapeamento chave -> valor (texto).
+        delete_keys (iterable): Chaves a remover.
+        cache (bool): O agente é um cache derivado, que pode ser recalculado: as entradas
+            sem uso há mais de DOC_AGENT_MEMORY_CACHE_TTL segundos são removidas e, acima de
+            DOC_AGENT_MEMORY_CACHE_MAX_ENTRIES entradas, as usadas há mais tempo (LRU).
+            Nunca deve ser usado para estado que não pode ser recalculado (ex: o modo incremental).
+    """
     conn = create_connection()
-    if conn is not None:
-        try:
-            c = conn.cursor()
-            print(f"Inicializando banco de dados em: {DB_FILE}")
-            c.execute(sql_create_memory_table)
-            c.execute(sql_create_run_history_table)
-            conn.commit()
-            print("Tabelas 'memory' e 'run_history' verificadas/criadas com sucesso.")
-        except Error as e:
-            print(f"Erro ao criar tabelas: {e}")
-        finally:
-            conn.close()
+    if conn is None:
+        return
+    try:
+        with transaction(conn):
+            conn.executemany(
+                "INSERT INTO memory (agent_name, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(agent_name, key) DO UPDATE SET value = excluded.value, timestamp = CURRENT_TIMESTAMP",
+                [(agent_name, key, value) for key, value in items.items()]
+            )
+            conn.executemany(
+                "DELETE FROM memory WHERE agent_name = ? AND key = ?",
+                [(agent_name, key) for key in delete_keys]
+            )
+            if cache and items:
+                _evict_memory_cache(conn, agent_name)
+    except Error as e:
+        print(f"Erro ao gravar a memória do agente '{agent_name}': {e}")
+
+
+def _evict_memory_cache(cursor, agent_name):
+    """Aplica a validade e o limite de entradas a um agente de cache da tabela 'memory'."""
+    ttl = int(float(os.getenv("DOC_AGENT_MEMORY_CACHE_TTL", MEMORY_CACHE_TTL_SECONDS)))
+    max_entries = int(os.getenv("DOC_AGENT_MEMORY_CACHE_MAX_ENTRIES", MEMORY_CACHE_MAX_ENTRIES))
+    cursor.execute("DELETE FROM memory WHERE agent_name = ? AND timestamp < datetime('now', ?)",
+                   (agent_name, f"-{ttl} seconds"))
+    cursor.execute(
+        "DELETE FROM memory WHERE id IN ("
+        "SELECT id FROM memory WHERE agent_name = ? ORDER BY timestamp DESC, id DESC LIMIT -1 OFFSET ?)",
+        (agent_name, max_entries)
+    )
+
+
+def record_run(run_id, agent_name, input_data, output_data):
+    """Registra uma execução de agente na tabela 'run_history'."""
+    record_runs([(run_id, agent_name, input_data, output_data)])
+
+
+def record_runs(records, blobs=()):
+    """
+    Registra vários itens na tabela 'run_history' em uma única transação. Saídas maiores
+    que RUN_INLINE_MAX_CHARS vão para a tabela 'blobs' (coluna output_blob).
+    Args:
+        records (list): Tuplas (run_id, agent_name, input_data, output_data).
+        blobs (iterable): Tuplas (run_id, blob_hash, texto) de conteúdos referenciados pelos
+            registros (ex: os prompts enviados ao modelo); cada texto é gravado uma única vez.
+    """
+    conn = create_connection()
+    if conn is None:
+        return
+    rows = []
+    references = []
+    texts = {}
+    for run_id, agent_name, input_data, output_data in records:
+        output_blob = None
+        if output_data is not None and len(output_data) > RUN_INLINE_MAX_CHARS:
+            output_blob = hash_content(output_data)
+            texts[output_blob] = output_data
+            references.append((run_id, output_blob))
+            output_data = None
+        rows.append((run_id, agent_name, input_data, output_data, output_blob))
+    for run_id, blob_hash, text in blobs:
+        texts[blob_hash] = text
+        references.append((run_id, blob_hash))
+    try:
+        # A compressão acontece antes da transação, para não segurar o bloqueio de escrita
+        compressed = _compress_missing_blobs(conn, texts)
+        with transaction(conn):
+            conn.executemany(
+                "INSERT OR IGNORE INTO blobs (blob_hash, codec, size_bytes, stored_bytes, data) VALUES (?, ?, ?, ?, ?)",
+                compressed
+            )
+            conn.executemany(
+                "INSERT INTO run_history (run_id, agent_name, input_data, output_data, output_blob) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.executemany("INSERT OR IGNORE INTO run_blobs (run_id, blob_hash) VALUES (?, ?)", references)
+    except Error as e:
+        print(f"Erro ao registrar o histórico de execuções: {e}")
+
+
+def _resolve_outputs(rows):
+    """Substitui a saída dos registros gravada em 'blobs' pelo texto. Linhas: (..., output_data, output_blob, timestamp)."""
+    resolved = []
+    for *head, output_data, output_blob, timestamp in rows:
+        if output_data is None and output_blob is not None:
+            output_data = load_blob(output_blob)
+        resolved.append((*head, output_data, timestamp))
+    return resolved
+
+
+def load_run_metrics(project_path=None, last_runs=50):
+    """
+    Retorna os registros de 'run_history' das últimas execuções, opcionalmente de um projeto.
+    Returns:
+        list: Tuplas (run_id, agent_name, output_data, timestamp) em ordem cronológica.
+    """
+    conn = create_connection()
+    if conn is None:
+        return []
+    try:
+        project_filter = ""
+        params = []
+        if project_path:
+            project_filter = "WHERE json_extract(input_data, '$.project_path') = ?"
+            params.append(project_path)
+        return _resolve_outputs(conn.execute(
+            f"""
+            SELECT run_id, agent_name, output_data, output_blob, timestamp FROM run_history
+            WHERE run_id IN (
+                SELECT run_id FROM run_history {project_filter}
+                GROUP BY run_id ORDER BY MAX(id) DESC LIMIT ?
+            )
+            ORDER BY id
+            """,
+            params + [last_runs]
+        ).fetchall())
+    except Error as e:
+        print(f"Erro ao ler o histórico de execuções: {e}")
+        return []
+
+
+def load_run_records(run_id):
+    """
+    Retorna os registros de 'run_history' de uma execução.
+    Returns:
+        list: Tuplas (run_id, agent_name, output_data, timestamp) em ordem cronológica.
+    """
+    conn = create_connection()
+    if conn is None:
+        return []
+    try:
+        return _resolve_outputs(conn.execute(
+            "SELECT run_id, agent_name, output_data, output_blob, timestamp FROM run_history "
+            "WHERE run_id = ? ORDER BY id",
+            (run_id,)
+        ).fetchall())
+    except Error as e:
+        print(f"Erro ao ler o histórico de execuções: {e}")
+        return []
+
+
+def prune_runs(keep=RUN_RETENTION, project_path=None, vacuum=False):
+    """
+    Política de retenção de 'run_history': mantém as `keep` execuções mais recentes de cada
+    projeto, remove as demais e os blobs que nenhuma execução restante usa e, com vacuum,
+    compacta o arquivo do banco (VACUUM e checkpoint do WAL) para devolver o espaço ao disco.
+    Args:
+        keep (int): Execuções mantidas por projeto; 0 ou menos não remove nada.
+        project_path (str): Restringe a limpeza às execuções deste projeto.
+        vacuum (bool): Compacta o banco ao final. Exige acesso exclusivo, então não é
+            feito automaticamente ao final de cada execução.
+    Returns:
+        dict: Execuções e blobs removidos e o tamanho do banco antes e depois.
+    """
+    result = {"runs": 0, "blobs": 0, "bytes_before": _database_size(), "bytes_after": None}
+    conn = create_connection()
+    if conn is None:
+        return result
+    try:
+        if keep > 0:
+            with transaction(conn):
+                # Uma execução pertence ao projeto registrado nos seus itens (ver metrics.RunRecorder)
+                run_ids = [(run_id,) for run_id, in conn.execute(
+                    """
+                    SELECT run_id FROM (
+                        SELECT run_id, ROW_NUMBER() OVER (PARTITION BY project ORDER BY last_id DESC) AS position
+                        FROM (
+                            SELECT run_id, MAX(json_extract(input_data, '$.project_path')) AS project,
+                                   MAX(id) AS last_id
+                            FROM run_history GROUP BY run_id
+                        )
+                        WHERE ?1 IS NULL OR project = ?1
+                    )
+                    WHERE position > ?2
+                    """,
+                    (project_path, keep)
+                )]
+                conn.executemany("DELETE FROM run_history WHERE run_id = ?", run_ids)
+                conn.executemany("DELETE FROM run_blobs WHERE run_id = ?", run_ids)
+                result["blobs"] = conn.execute(
+                    "DELETE FROM blobs WHERE NOT EXISTS "
+                    "(SELECT 1 FROM run_blobs WHERE run_blobs.blob_hash = blobs.blob_hash)"
+                ).rowcount
+                result["runs"] = len(run_ids)
+        if vacuum:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except Error as e:
+        print(f"Erro ao limpar o histórico de execuções: {e}")
+    result["bytes_after"] = _database_size()
+    return result
+
+
+def _database_size():
+    """Tamanho em bytes do doc_agent.db, incluindo o arquivo WAL."""
+    return sum(os.path.getsize(path) for path in (DB_FILE, DB_FILE + "-wal") if os.path.exists(path))
+
+
+def _compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompressor(codec):
+    """Descompressor incremental (métodos decompress e flush) do codec de um blob."""
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("blob comprimido com zstd, mas o pacote 'zstandard' não está instalado")
+        return zstandard.ZstdDecompressor().decompressobj()
+    if codec == "zlib":
+        return zlib.decompressobj()
+    raise ValueError(f"codec de blob desconhecido: {codec}")
+
+
+def _compress_missing_blobs(conn, texts):
+    """
+    Comprime os textos ainda ausentes da tabela 'blobs'.
+    Args:
+        texts (dict): Mapeamento blob_hash (ver hash_content) -> texto.
+    Returns:
+        list: Linhas (blob_hash, codec, size_bytes, stored_bytes, data) a inserir.
+    """
+    missing = set(texts)
+    for chunk in _chunks(list(texts)):
+        missing.difference_update(blob_hash for blob_hash, in conn.execute(
+            f"SELECT blob_hash FROM blobs WHERE blob_hash IN ({','.join('?' * len(chunk))})", chunk
+        ))
+    codec = BLOB_CODEC if BLOB_CODEC == "zlib" or zstandard is not None else "zlib"
+    rows = []
+    for blob_hash in missing:
+        data = texts[blob_hash].encode('utf-8', errors='surrogatepass')
+        compressed = _compress(data, codec)
+        rows.append((blob_hash, codec, len(data), len(compressed), compressed))
+    return rows
+
+
+def iter_blob(blob_hash, chunk_size=BLOB_READ_CHUNK_BYTES):
+    """
+    Lê um blob em streaming: os dados comprimidos são lidos do banco em trechos de
+    chunk_size bytes (E/S incremental do SQLite, quando disponível) e descomprimidos
+    aos poucos, sem carregar o conteúdo inteiro na memória.
+    Raises:
+        KeyError: Se o blob não existir.
+    Yields:
+        str: Trechos consecutivos do texto.
+    """
+    conn = create_connection()
+    row = conn.execute("SELECT rowid, codec FROM blobs WHERE blob_hash = ?", (blob_hash,)).fetchone() if conn else None
+    if row is None:
+        raise KeyError(blob_hash)
+    rowid, codec = row
+    decompressor = _decompressor(codec)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='surrogatepass')
+    if hasattr(conn, "blobopen"):
+        with conn.blobopen("blobs", "data", rowid, readonly=True) as blob:
+            while True:
+                data = blob.read(chunk_size)
+                if not data:
+                    break
+                yield decoder.decode(decompressor.decompress(data))
     else:
-        print("Erro! Não foi possível criar a conexão com o banco de dados.")
+        # Python < 3.11: sem E/S incremental, o valor comprimido é lido de uma vez
+        data = conn.execute("SELECT data FROM blobs WHERE rowid = ?", (rowid,)).fetchone()[0]
+        for start in range(0, len(data), chunk_size):
+            yield decoder.decode(decompressor.decompress(data[start:start + chunk_size]))
+    yield decoder.decode(decompressor.flush(), final=True)
+
+
+def load_blob(blob_hash):
+    """Retorna o texto completo de um blob, ou None se ele não existir ou não puder ser lido."""
+    try:
+        return "".join(iter_blob(blob_hash))
+    except KeyError:
+        return None
+    except (Error, ValueError, zlib.error) as e:
+        print(f"Erro ao ler o blob {blob_hash[:16]}: {e}")
+        return None
+
+
+def hash_content(content):
+    """Retorna o hash SHA-256 (hex) do texto fornecido."""
+    return hashlib.sha256(content.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+
+def get_file_contents(file_paths, reader):
+    """
+    Retorna o conteúdo decodificado de vários arquivos, consultando o cache de conteúdo.
+
+    Uma entrada do cache é válida enquanto o tamanho e o mtime do arquivo não mudarem,
+    então a invalidação custa apenas um os.stat. Arquivos novos ou alterados são lidos
+    com `reader` e gravados no cache; conteúdos idênticos são armazenados uma única vez.
+
+    Args:
+        file_paths (list): Caminhos dos arquivos.
+        reader (callable): Função que recebe um caminho e retorna o texto decodificado.
+            Pode lançar OSError, que é propagado ao chamador via o dicionário de erros.
+    Returns:
+        tuple: (conteúdos, hashes, erros) — dicionários indexados pelo caminho.
+    """
+    contents = {}
+    hashes = {}
+    errors = {}
+    conn = create_connection()
+    if conn is None:
+        for path in file_paths:
+            try:
+                contents[path] = reader(path)
+                hashes[path] = hash_content(contents[path])
+            except OSError as e:
+                errors[path] = e
+        return contents, hashes, errors
+
+    hits = []
+    new_entries = []
+    new_contents = []
+    try:
+        now = time.time()
+        # Metadados e conteúdos do cache consultados em blocos, em vez de uma consulta por arquivo
+        cached = {}
+        for chunk in _chunks(list(file_paths)):
+            cached.update((path, (size, mtime_ns, content_hash)) for path, size, mtime_ns, content_hash in conn.execute(
+                f"SELECT path, size, mtime_ns, content_hash FROM file_cache WHERE path IN ({','.join('?' * len(chunk))})",
+                chunk
+            ))
+        stats = {}
+        hit_hashes = {}
+        for path in file_paths:
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                errors[path] = e
+                continue
+            stats[path] = stat
+            entry = cached.get(path)
+            if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                hit_hashes[path] = entry[2]
+        cached_contents = {}
+        for chunk in _chunks(list(set(hit_hashes.values()))):
+            cached_contents.update(conn.execute(
+                f"SELECT content_hash, content FROM file_contents WHERE content_hash IN ({','.join('?' * len(chunk))})",
+                chunk
+            ))
+
+        for path, stat in stats.items():
+            content_hash = hit_hashes.get(path)
+            if content_hash in cached_contents:
+                hashes[path] = content_hash
+                contents[path] = cached_contents[content_hash]
+                hits.append((now, content_hash))
+                continue
+            try:
+                content = reader(path)
+            except OSError as e:
+                errors[path] = e
+                continue
+            content_hash = hash_content(content)
+            contents[path] = content
+            hashes[path] = content_hash
+            new_entries.append((path, stat.st_size, stat.st_mtime_ns, content_hash))
+            new_contents.append((content_hash, content, len(content.encode('utf-8', errors='surrogatepass')), now))
+
+        # Todas as gravações em uma única transação, depois das leituras do disco
+        with transaction(conn):
+            if hits:
+                conn.executemany("UPDATE file_contents SET last_access = ? WHERE content_hash = ?", hits)
+            if new_contents:
+                conn.executemany(
+                    "INSERT INTO file_contents (content_hash, content, size_bytes, last_access) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(content_hash) DO UPDATE SET last_access = excluded.last_access",
+                    new_contents
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO file_cache (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+                    new_entries
+                )
+                _evict_file_cache(conn)
+    except Error as e:
+        print(f"Erro ao acessar o cache de arquivos: {e}")
+
+    # Arquivos não resolvidos por causa de um erro do banco são lidos diretamente
+    for path in file_paths:
+        if path not in contents and path not in errors:
+            try:
+                contents[path] = reader(path)
+                hashes[path] = hash_content(contents[path])
+            except OSError as e:
+                errors[path] = e
+    print(f"[Cache] {len(hits)} de {len(file_paths)} arquivos servidos pelo cache.")
+    return contents, hashes, errors
+
+
+def _evict_file_cache(cursor):
+    """
+    Remove os conteúdos menos acessados recentemente até que o cache caiba no limite
+    configurado em DOC_AGENT_FILE_CACHE_MAX_BYTES.
+    """
+    max_bytes = int(os.getenv("DOC_AGENT_FILE_CACHE_MAX_BYTES", FILE_CACHE_MAX_BYTES))
+    total = cursor.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM file_contents").fetchone()[0]
+    if total <= max_bytes:
+        return
+    evicted = []
+    for content_hash, size_bytes in cursor.execute(
+        "SELECT content_hash, size_bytes FROM file_contents ORDER BY last_access ASC"
+    ).fetchall():
+        if total <= max_bytes:
+            break
+        evicted.append((content_hash,))
+        total -= size_bytes
+    cursor.executemany("DELETE FROM file_cache WHERE content_hash = ?", evicted)
+    cursor.executemany("DELETE FROM file_contents WHERE content_hash = ?", evicted)
+    print(f"[Cache] {len(evicted)} conteúdos removidos do cache para respeitar o limite de {max_bytes} bytes.")
+
+
+def create_llm_cache_connection():
+    """
+    Retorna a conexão persistente da thread corrente com o cache de respostas do modelo,
+    aplicando as migrações pendentes na primeira abertura.
+    """
+    return _get_connection(LLM_CACHE_DB_FILE, LLM_CACHE_MIGRATIONS)
+
+
+def get_llm_response(key):
+    """
+    Retorna a resposta em cache para a chave, ou None se ela não existir ou tiver
+    expirado (ver DOC_AGENT_LLM_CACHE_TTL).
+    """
+    conn = create_llm_cache_connection()
+    if conn is None:
+        return None
+    try:
+        ttl = float(os.getenv("DOC_AGENT_LLM_CACHE_TTL", LLM_CACHE_TTL_SECONDS))
+        now = time.time()
+        row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        response, created_at = row
+        if now - created_at > ttl:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+        return response
+    except Error as e:
+        print(f"Erro ao ler o cache de respostas: {e}")
+        return None
+
+
+def store_llm_response(key, model_id, response):
+    """
+    Grava uma resposta no cache, removendo as entradas expiradas e, se o limite
+    DOC_AGENT_LLM_CACHE_MAX_ENTRIES for ultrapassado, as menos usadas recentemente.
+    """
+    conn = create_llm_cache_connection()
+    if conn is None:
+        return
+    try:
+        ttl = float(os.getenv("DOC_AGENT_LLM_CACHE_TTL", LLM_CACHE_TTL_SECONDS))
+        max_entries = int(os.getenv("DOC_AGENT_LLM_CACHE_MAX_ENTRIES", LLM_CACHE_MAX_ENTRIES))
+        now = time.time()
+        with transaction(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model_id, response, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model_id, response, now, now)
+            )
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - ttl,))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (max_entries,)
+            )
+    except Error as e:
+        print(f"Erro ao gravar o cache de respostas: {e}")
+
 
 if __name__ == '__main__':
     # Permite inicializar o banco de dados diretamente via linha de comando
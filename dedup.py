@@ -0,0 +1,187 @@
+# dedup.py
+# Eliminação de arquivos duplicados e quase duplicados antes da montagem dos prompts:
+# duplicatas exatas pelo hash do conteúdo e quase duplicatas por MinHash sobre shingles
+# de palavras, com LSH (bandas) para encontrar os candidatos sem comparar todos os pares.
+import json
+import os
+import re
+import zlib
+import database
+
+# Versão do formato das assinaturas; incrementar invalida o cache
+DEDUP_VERSION = 1
+# Nome usado na tabela 'memory' para as assinaturas em cache
+DEDUP_MEMORY_AGENT = "dedup"
+# Palavras por shingle
+SHINGLE_SIZE = 5
+# Posições da assinatura MinHash (uma permutação, dividida em compartimentos)
+SIGNATURE_SIZE = 64
+# Bandas do LSH; com 8 bandas de 8 linhas, pares com similaridade ~0.77 têm 50% de chance de colidir
+LSH_BANDS = 8
+# Similaridade de Jaccard estimada a partir da qual dois arquivos são considerados quase duplicados
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("DOC_AGENT_DEDUP_THRESHOLD", "0.85"))
+# Candidatos verificados por arquivo, para limitar o custo em grupos muito parecidos
+MAX_CANDIDATES = 50
+# Caminhos listados na nota do representante
+MAX_LISTED_PATHS = 5
+
+# Prefixo de comentário da nota, por extensão; documentação recebe a nota sem prefixo
+_COMMENT_PREFIXES = {'.py': "# ", '.js': "// ", '.ts': "// "}
+
+_WORD_RE = re.compile(r"\w+")
+_BIN_BITS = SIGNATURE_SIZE.bit_length() - 1
+_EMPTY = 1 << 32
+
+
+def minhash_signature(text):
+    """
+    Assinatura MinHash de uma única permutação ("one permutation hashing"): cada shingle de
+    SHINGLE_SIZE palavras é reduzido a um hash de 32 bits, cujos bits baixos escolhem o
+    compartimento e os altos competem pelo mínimo. Compartimentos vazios copiam o próximo
+    compartimento preenchido (densificação), o que mantém a assinatura comparável posição
+    a posição.
+    Returns:
+        list: SIGNATURE_SIZE inteiros, ou None se o texto tiver menos de SHINGLE_SIZE palavras.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return None
+    signature = [_EMPTY] * SIGNATURE_SIZE
+    mask = SIGNATURE_SIZE - 1
+    for start in range(len(words) - SHINGLE_SIZE + 1):
+        value = zlib.crc32(" ".join(words[start:start + SHINGLE_SIZE]).encode('utf-8'))
+        position = value & mask
+        value >>= _BIN_BITS
+        if value < signature[position]:
+            signature[position] = value
+    if _EMPTY in signature:
+        original = list(signature)
+        for position in range(SIGNATURE_SIZE):
+            if original[position] == _EMPTY:
+                offset = 1
+                while original[(position + offset) % SIGNATURE_SIZE] == _EMPTY:
+                    offset += 1
+                # O deslocamento distingue valores emprestados de valores próprios
+                signature[position] = original[(position + offset) % SIGNATURE_SIZE] + offset * _EMPTY
+    return signature
+
+
+def estimate_similarity(first, second):
+    """Similaridade de Jaccard estimada: fração das posições em que as assinaturas coincidem."""
+    return sum(1 for a, b in zip(first, second) if a == b) / SIGNATURE_SIZE
+
+
+def _signatures(paths, contents, hashes):
+    """Assinaturas dos arquivos, em cache na tabela 'memory' indexadas pelo hash do conteúdo."""
+    keys = {path: f"v{DEDUP_VERSION}:{hashes[path]}" for path in paths}
+    cached = database.load_memory(DEDUP_MEMORY_AGENT, set(keys.values()), cache=True)
+    signatures = {}
+    new_items = {}
+    for path in paths:
+        key = keys[path]
+        if key not in cached:
+            cached[key] = new_items[key] = json.dumps(minhash_signature(contents[path]), separators=(',', ':'))
+        signatures[path] = json.loads(cached[key])
+    if new_items:
+        database.save_memory(DEDUP_MEMORY_AGENT, new_items, cache=True)
+    return signatures, len(new_items)
+
+
+class DuplicateCluster:
+    """Grupo de arquivos com conteúdo idêntico ou quase idêntico e o representante mantido."""
+    __slots__ = ('representative', 'duplicates')
+
+    def __init__(self, representative):
+        self.representative = representative
+        # Lista de (caminho, similaridade); 1.0 indica conteúdo idêntico
+        self.duplicates = []
+
+    def note(self):
+        """Nota compacta colocada antes do conteúdo do representante no prompt."""
+        listed = ", ".join(path for path, _ in self.duplicates[:MAX_LISTED_PATHS])
+        remaining = len(self.duplicates) - MAX_LISTED_PATHS
+        if remaining > 0:
+            listed += f" e mais {remaining}"
+        exact = all(similarity == 1.0 for _, similarity in self.duplicates)
+        kind = "idêntico" if exact else "idêntico ou quase idêntico"
+        # Em arquivos de código a nota é um comentário, para não quebrar a análise sintática
+        prefix = _COMMENT_PREFIXES.get(os.path.splitext(self.representative)[1].lower(), "")
+        count = len(self.duplicates)
+        where = "outro caminho, omitido" if count == 1 else "outros caminhos, omitidos"
+        return f"{prefix}[Conteúdo {kind} também aparece em {count} {where} do prompt: {listed}]\n"
+
+    def annotate(self, text):
+        """Texto do representante precedido da nota."""
+        return self.note() + text
+
+    def __repr__(self):
+        return f"DuplicateCluster({self.representative!r}, duplicates={len(self.duplicates)})"
+
+
+def find_duplicates(file_paths, file_types, file_contents, file_hashes):
+    """
+    Agrupa os arquivos idênticos (mesmo hash) e quase idênticos (similaridade estimada de
+    pelo menos NEAR_DUPLICATE_THRESHOLD), sempre entre arquivos do mesmo tipo. O primeiro
+    arquivo de cada grupo na ordem de file_paths (a ordem de prioridade da base) é o
+    representante.
+    Args:
+        file_paths (list): Caminhos, em ordem de prioridade.
+        file_types (dict): Tipo de cada caminho ('documentacao' ou 'codigo').
+        file_contents (dict): Texto de cada caminho.
+        file_hashes (dict): Hash do conteúdo de cada caminho; arquivos sem hash (ilegíveis)
+            nunca são agrupados.
+    Returns:
+        list: Os DuplicateCluster com pelo menos uma duplicata, na ordem dos representantes.
+    """
+    clusters = {}
+    owner = {}
+    by_hash = {}
+    unique_paths = []
+    for path in file_paths:
+        if path not in file_hashes:
+            continue
+        key = (file_types[path], file_hashes[path])
+        first = by_hash.get(key)
+        if first is None:
+            by_hash[key] = path
+            unique_paths.append(path)
+        else:
+            clusters.setdefault(first, DuplicateCluster(first)).duplicates.append((path, 1.0))
+            owner[path] = first
+    exact_count = len(owner)
+
+    signatures, computed = _signatures(unique_paths, file_contents, file_hashes)
+    rows = SIGNATURE_SIZE // LSH_BANDS
+    buckets = {}
+    for path in unique_paths:
+        signature = signatures[path]
+        if signature is None:
+            continue
+        candidates = {}
+        for band in range(LSH_BANDS):
+            bucket = buckets.setdefault((file_types[path], band, tuple(signature[band * rows:(band + 1) * rows])), [])
+            for candidate in bucket[:MAX_CANDIDATES]:
+                candidates[candidate] = None
+            bucket.append(path)
+        for candidate in list(candidates)[:MAX_CANDIDATES]:
+            similarity = estimate_similarity(signature, signatures[candidate])
+            if similarity >= NEAR_DUPLICATE_THRESHOLD:
+                # O candidato veio antes na ordem de prioridade; o grupo é o do seu representante
+                representative = owner.get(candidate, candidate)
+                cluster = clusters.setdefault(representative, DuplicateCluster(representative))
+                # Quase duplicatas nunca são anunciadas como idênticas, mesmo com estimativa 1.0
+                cluster.duplicates.append((path, min(round(similarity, 2), 0.99)))
+                owner[path] = representative
+                # As cópias idênticas deste arquivo passam para o grupo do novo representante
+                merged = clusters.pop(path, None)
+                if merged is not None:
+                    cluster.duplicates.extend(merged.duplicates)
+                    for duplicate, _ in merged.duplicates:
+                        owner[duplicate] = representative
+                break
+
+    print(f"[Duplicatas] {len(file_paths)} arquivos: {exact_count} idênticos e {len(owner) - exact_count} quase "
+          f"idênticos a outros, em {len(clusters)} grupos ({computed} assinaturas calculadas, "
+          f"{len(unique_paths) - computed} do cache).")
+    order = {path: position for position, path in enumerate(file_paths)}
+    return sorted(clusters.values(), key=lambda cluster: order[cluster.representative])
@@ -0,0 +1,217 @@
+# knowledge_base.py
+# Base de conhecimento compartilhada entre o Pesquisador, o Orquestrador, o Analista e o Escritor.
+import os
+from datetime import datetime
+import dedup
+
+# Extensões tratadas como documentação; o restante é código
+DOC_EXTENSIONS = ('.md', '.txt')
+
+
+class FileEntry:
+    """
+    Metadados de um arquivo do projeto. Usa __slots__ para que bases com dezenas de
+    milhares de arquivos ocupem pouca memória; o conteúdo nunca é guardado aqui e é
+    lido sob demanda (ver tools.read_project_context).
+    """
+    __slots__ = ('path', 'mtime', 'size', 'type', 'is_readme')
+
+    def __init__(self, path, mtime, size):
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        name = os.path.basename(path)
+        self.type = 'documentacao' if name.endswith(DOC_EXTENSIONS) else 'codigo'
+        self.is_readme = name.lower() == 'readme.md'
+
+    @classmethod
+    def from_stat(cls, path, stat):
+        return cls(path, stat.st_mtime, stat.st_size)
+
+    @property
+    def last_modified(self):
+        """Data de modificação em formato ISO, para exibição."""
+        return datetime.fromtimestamp(self.mtime).isoformat()
+
+    def __repr__(self):
+        return f"FileEntry({self.path!r}, mtime={self.mtime}, size={self.size}, type={self.type!r})"
+
+
+def _priority_key(entry):
+    return entry.is_readme, entry.mtime
+
+
+class KnowledgeBase:
+    """
+    Lista de FileEntry com as consultas usadas pelo pipeline: caminhos em ordem de
+    prioridade, arquivos de documentação, tamanho total e montagem de prompts.
+    O conteúdo dos arquivos é lido sob demanda, uma única vez por modo de contexto,
+    e compartilhado entre o Analista e o Escritor.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = list(entries)
+        self._prioritized = False
+        self._contents = {}
+        # Modos cujo conteúdo foi definido por use_contents (e cujas chaves são as enviadas)
+        self._selected = set()
+        # Grupos de duplicatas por representante e entradas removidas (ver deduplicate)
+        self.clusters = {}
+        self.duplicates = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def append(self, entry):
+        self.entries.append(entry)
+        self._prioritized = False
+        self.release_contents()
+
+    def sort_by_priority(self):
+        """Ordena a base com READMEs e arquivos modificados recentemente primeiro (apenas uma vez)."""
+        if not self._prioritized:
+            self.entries.sort(key=_priority_key, reverse=True)
+            self._prioritized = True
+        return self
+
+    def paths(self):
+        return [entry.path for entry in self.entries]
+
+    def documentation(self):
+        """Entradas de documentação (.md, .txt), na ordem atual da base."""
+        return [entry for entry in self.entries if entry.type == 'documentacao']
+
+    def types(self):
+        """Mapeamento caminho -> tipo ('documentacao' ou 'codigo')."""
+        return {entry.path: entry.type for entry in self.entries}
+
+    def total_size(self):
+        return sum(entry.size for entry in self.entries)
+
+    def contents(self, mode='full'):
+        """
+        Retorna o texto de cada arquivo no modo de contexto indicado, lendo-o
+        (via tools.read_project_context) apenas na primeira chamada. No modo 'summary',
+        depois da etapa de resumos (ver use_contents), as chaves são os nós da árvore.
+        """
+        if mode not in self._contents:
+            import tools  # importação tardia: tools depende deste módulo
+            self._contents[mode] = self._annotate(tools.read_project_context(self.paths(), mode))
+        return self._contents[mode]
+
+    def contents_of(self, mode, paths):
+        """
+        Conteúdo de apenas alguns arquivos no modo indicado: reaproveita o que contents()
+        já leu ou lê somente os caminhos pedidos (ex: esqueletos calculados em lotes pelo
+        orçamento de tokens, ver budget.select_within_budget).
+        """
+        if mode in self._contents:
+            return {path: self._contents[mode][path] for path in paths}
+        import tools  # importação tardia: tools depende deste módulo
+        return self._annotate(tools.read_project_context(paths, mode))
+
+    def _annotate(self, contents):
+        for representative, cluster in self.clusters.items():
+            if representative in contents:
+                contents[representative] = cluster.annotate(contents[representative])
+        return contents
+
+    def deduplicate(self):
+        """
+        Remove da base os arquivos idênticos ou quase idênticos a outro de maior prioridade
+        (ver dedup.find_duplicates). Cada representante mantido recebe, no conteúdo enviado
+        ao modelo, uma nota com os caminhos omitidos; as entradas removidas ficam em
+        self.duplicates. Deve ser chamado depois de sort_by_priority.
+        Returns:
+            list: Os grupos de duplicatas (dedup.DuplicateCluster).
+        """
+        import tools  # importação tardia: tools depende deste módulo
+        paths = self.paths()
+        contents, hashes = tools.read_project_files(paths, with_hashes=True)
+        clusters = dedup.find_duplicates(paths, self.types(), contents, hashes)
+        removed = {path for cluster in clusters for path, _ in cluster.duplicates}
+        if removed:
+            self.duplicates.extend(entry for entry in self.entries if entry.path in removed)
+            self.entries = [entry for entry in self.entries if entry.path not in removed]
+            self.clusters.update((cluster.representative, cluster) for cluster in clusters)
+        # O conteúdo completo já lido é reaproveitado pelo Analista e pelo Escritor
+        self._contents = {'full': self._annotate({path: contents[path] for path in self.paths()})}
+        self._selected.clear()
+        return clusters
+
+    def use_contents(self, mode, contents):
+        """
+        Define o conteúdo de um modo de contexto calculado fora da base (ex: a seleção da
+        árvore de resumos no modo 'summary', cujas chaves são arquivos e diretórios, ou a
+        seleção por orçamento de tokens, que omite arquivos). Daí em diante, as chaves de
+        contents, na ordem do dicionário, são as enviadas ao modelo nesse modo.
+        """
+        self._contents[mode] = contents
+        self._selected.add(mode)
+
+    def context_paths(self, mode='full'):
+        """Chaves enviadas ao modelo no modo indicado: os arquivos, ou as definidas por use_contents."""
+        if mode in self._selected:
+            return list(self._contents[mode])
+        return self.paths()
+
+    def release_contents(self):
+        """Descarta os conteúdos lidos, liberando a memória."""
+        self._contents.clear()
+        self._selected.clear()
+
+    def context_block(self, mode='full'):
+        """Bloco de contexto canônico com todos os arquivos da base (ver build_context_block)."""
+        return build_context_block(self.context_paths(mode), self.contents(mode))
+
+
+# Delimitadores do bloco de contexto canônico; alterá-los invalida os prefixos em cache do provedor
+CONTEXT_HEADER = "Conteúdo dos arquivos do projeto, em ordem alfabética de caminho:\n\n"
+CONTEXT_OPENING = "--- Início de: {path} ---\n"
+CONTEXT_CLOSING = "\n--- Fim de: {path} ---\n\n"
+
+
+def build_context_block(paths, contents):
+    """
+    Monta o bloco de contexto canônico enviado ao modelo antes das instruções de cada etapa.
+
+    O bloco é estável byte a byte: os caminhos vêm em ordem alfabética (não na ordem de
+    prioridade, que depende do mtime), com delimitadores fixos e nada volátil (discrepâncias,
+    instruções da etapa, datas). Os mesmos arquivos produzem sempre o mesmo bloco, no
+    Analista, no Escritor e em execuções seguintes, e o prefixo em cache do provedor é
+    reaproveitado (ver runtime.build_context_agent).
+    Returns:
+        str: O bloco de contexto.
+    """
+    return join_prompt(sorted(paths), contents, CONTEXT_HEADER, CONTEXT_OPENING, CONTEXT_CLOSING)
+
+
+def join_prompt(paths, contents, header, opening, closing, footer=""):
+    """
+    Monta um prompt com o conteúdo de vários arquivos em um único buffer.
+
+    Os trechos são acumulados em uma lista e unidos uma única vez, em vez de
+    concatenações sucessivas (quadráticas no tamanho total do prompt).
+    Args:
+        paths (list): Caminhos, na ordem em que devem aparecer.
+        contents (dict): Texto de cada caminho.
+        header (str): Texto antes dos arquivos.
+        opening (str): Delimitador de abertura de cada arquivo, com o campo {path}.
+        closing (str): Delimitador de fechamento de cada arquivo, com o campo {path}.
+        footer (str): Texto depois dos arquivos.
+    Returns:
+        str: O prompt completo.
+    """
+    parts = [header]
+    for path in paths:
+        parts.append(opening.format(path=path))
+        parts.append(contents[path])
+        parts.append(closing.format(path=path))
+    parts.append(footer)
+    return "".join(parts)
@@ -0,0 +1,265 @@
+# metrics.py
+# Instrumentação das execuções: cada etapa do orquestrador e cada chamada ao modelo
+# gera um registro estruturado na tabela 'run_history', agrupado por run_id.
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import database
+
+# Estimativa grosseira de tokens a partir do número de caracteres
+CHARS_PER_TOKEN = 4
+# Grava o bloco de contexto e a tarefa de cada chamada ao modelo na tabela 'blobs'
+# (comprimidos e uma única vez por conteúdo). Desativado por padrão: o contexto inclui o
+# código do projeto e pode ocupar megabytes por execução; use DOC_AGENT_LOG_PROMPTS=1 para ativar
+LOG_PROMPTS = os.getenv("DOC_AGENT_LOG_PROMPTS", "0") == "1"
+
+# Execução e etapa correntes; contextvars isolam execuções simultâneas (threads do daemon,
+# lotes do Analista) desde que as tarefas sejam submetidas com submit()
+_current_run = contextvars.ContextVar("doc_agent_run", default=None)
+_current_stage = contextvars.ContextVar("doc_agent_stage", default=None)
+
+
+class RunRecorder:
+    """Acumula os registros de uma execução e os grava em lote no final."""
+
+    def __init__(self, project_path):
+        self.run_id = str(uuid.uuid4())
+        self.project_path = project_path
+        self.records = []
+        self.blobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, agent_name, data):
+        input_data = json.dumps({"project_path": self.project_path}, ensure_ascii=False)
+        with self._lock:
+            self.records.append((self.run_id, agent_name, input_data, json.dumps(data, ensure_ascii=False)))
+
+    def add_blob(self, text):
+        """Guarda um texto grande para gravação em 'blobs' junto com os registros. Retorna o hash."""
+        blob_hash = database.hash_content(text)
+        with self._lock:
+            self.blobs[blob_hash] = text
+        return blob_hash
+
+    def flush(self):
+        with self._lock:
+            records, self.records = self.records, []
+            blobs, self.blobs = self.blobs, {}
+        if records:
+            database.record_runs(records, [(self.run_id, blob_hash, text) for blob_hash, text in blobs.items()])
+
+
+def estimate_tokens(text_or_length):
+    """Estimativa rápida de tokens a partir de um texto ou de um número de caracteres."""
+    length = text_or_length if isinstance(text_or_length, int) else len(text_or_length)
+    return length // CHARS_PER_TOKEN
+
+
+def current_run_id():
+    """Retorna o run_id da execução corrente, ou None fora de uma execução."""
+    recorder = _current_run.get()
+    return recorder.run_id if recorder else None
+
+
+@contextmanager
+def run(project_path):
+    """
+    Delimita uma execução: todas as etapas e chamadas ao modelo dentro do bloco são
+    registradas sob o mesmo run_id e gravadas no banco ao final (mesmo em caso de erro).
+    """
+    recorder = RunRecorder(project_path)
+    token = _current_run.set(recorder)
+    started = time.perf_counter()
+    try:
+        yield recorder
+    finally:
+        recorder.add("run", {"kind": "run", "wall_time": round(time.perf_counter() - started, 4)})
+        _current_run.reset(token)
+        recorder.flush()
+
+
+@contextmanager
+def stage(name, **initial):
+    """
+    Cronometra uma etapa da execução corrente. O dicionário retornado pode receber
+    métricas adicionais, e add() acumula contadores nele de qualquer ponto do código.
+    """
+    data = {"kind": "stage"}
+    data.update(initial)
+    token = _current_stage.set(data)
+    started = time.perf_counter()
+    try:
+        yield data
+    finally:
+        data["wall_time"] = round(time.perf_counter() - started, 4)
+        _current_stage.reset(token)
+        recorder = _current_run.get()
+        if recorder is not None:
+            recorder.add(name, data)
+
+
+def add(**counters):
+    """Soma os contadores (ex: files_read=3, bytes_read=1024) na etapa corrente, se houver."""
+    data = _current_stage.get()
+    if data is None:
+        return
+    for key, value in counters.items():
+        data[key] = data.get(key, 0) + value
+
+
+def record_agent_call(agent_name, model_id, prompt_chars, latency, input_tokens=None, output_tokens=None,
+                      cached=False, cache_read_tokens=None, context_hash=None, context=None, prompt=None):
+    """
+    Registra uma chamada ao modelo e acumula seus totais na etapa corrente.
+    cache_read_tokens são os tokens de entrada servidos pelo cache de prompts do provedor e
+    context_hash identifica o bloco de contexto enviado (ver runtime.context_hash). Com
+    LOG_PROMPTS, o contexto e a tarefa (context, prompt) são gravados como blobs; o mesmo
+    contexto enviado ao Analista e ao Escritor, ou em várias execuções, é armazenado uma vez.
+    """
+    add(model_calls=1, prompt_chars=prompt_chars, estimated_tokens=estimate_tokens(prompt_chars),
+        model_latency=round(latency, 4))
+    recorder = _current_run.get()
+    if recorder is None:
+        return
+    recorder.add(f"agent:{agent_name}", {
+        "kind": "agent_call",
+        "model_id": model_id,
+        "wall_time": round(latency, 4),
+        "prompt_chars": prompt_chars,
+        "estimated_tokens": estimate_tokens(prompt_chars),
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cached": cached,
+        "cache_read_tokens": cache_read_tokens,
+        "context_hash": context_hash,
+        "context_blob": recorder.add_blob(context) if LOG_PROMPTS and context else None,
+        "prompt_blob": recorder.add_blob(prompt) if LOG_PROMPTS and prompt else None,
+    })
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit que propaga a execução e a etapa correntes para a thread de trabalho."""
+    context = contextvars.copy_context()
+    return executor.submit(context.run, fn, *args, **kwargs)
+
+
+# ========================================
+# RELATÓRIOS (run.py stats)
+# ========================================
+
+def percentile(values, fraction):
+    """Percentil por interpolação linear de uma lista de números."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(rows):
+    """
+    Agrupa os registros por etapa/agente e calcula percentis e tendência.
+    Args:
+        rows (list): Tuplas (run_id, agent_name, output_data, timestamp) em ordem cronológica.
+    Returns:
+        list: Um dicionário por etapa/agente com contagem, p50/p90/p99 de wall_time,
+        médias de tokens e a variação da média entre a metade antiga e a recente das execuções.
+    """
+    groups = {}
+    for run_id, agent_name, output_data, timestamp in rows:
+        try:
+            data = json.loads(output_data)
+        except (TypeError, json.JSONDecodeError):
+            continue
+        if not isinstance(data, dict) or data.get("kind") not in ("stage", "agent_call", "run"):
+            continue
+        groups.setdefault(agent_name, []).append(data)
+
+    summary = []
+    for name, entries in groups.items():
+        times = [entry.get("wall_time", 0.0) for entry in entries]
+        half = len(times) // 2
+        trend = None
+        if half:
+            older = sum(times[:half]) / half
+            recent = sum(times[half:]) / (len(times) - half)
+            trend = (recent - older) / older * 100 if older else None
+        tokens = [entry.get("estimated_tokens") for entry in entries if entry.get("estimated_tokens")]
+        output_tokens = [entry.get("output_tokens") for entry in entries if entry.get("output_tokens")]
+        summary.append({
+            "name": name,
+            "count": len(entries),
+            "p50": percentile(times, 0.5),
+            "p90": percentile(times, 0.9),
+            "p99": percentile(times, 0.99),
+            "mean_estimated_tokens": sum(tokens) / len(tokens) if tokens else None,
+            "mean_output_tokens": sum(output_tokens) / len(output_tokens) if output_tokens else None,
+            "trend_percent": trend,
+        })
+    summary.sort(key=lambda item: item["name"])
+    return summary
+
+
+def print_stats(project_path=None, last_runs=50):
+    """Imprime o relatório de percentis e tendências das últimas execuções."""
+    rows = database.load_run_metrics(project_path, last_runs)
+    summary = summarize(rows)
+    if not summary:
+        print("Nenhuma métrica registrada ainda. Execute 'run.py analyze' primeiro.")
+        return
+    run_count = len({row[0] for row in rows})
+    print(f"Métricas de {run_count} execuções" + (f" do projeto {project_path}" if project_path else "") + ":\n")
+    print(f"{'etapa/agente':<24} {'n':>5} {'p50 (s)':>9} {'p90 (s)':>9} {'p99 (s)':>9} "
+          f"{'tokens est.':>12} {'tokens saída':>13} {'tendência':>10}")
+
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-"
+
+    for item in summary:
+        trend = f"{item['trend_percent']:+.1f}%" if item['trend_percent'] is not None else "-"
+        print(f"{item['name']:<24} {item['count']:>5} {fmt(item['p50'], '9.3f'):>9} {fmt(item['p90'], '9.3f'):>9} "
+              f"{fmt(item['p99'], '9.3f'):>9} {fmt(item['mean_estimated_tokens'], '12.0f'):>12} "
+              f"{fmt(item['mean_output_tokens'], '13.0f'):>13} {trend:>10}")
+
+
+def print_prompts(project_path=None, run_id=None, out=None):
+    """
+    Escreve os prompts registrados de uma execução (por padrão, a mais recente do projeto),
+    lendo os blobs em streaming.
+    """
+    out = out or sys.stdout
+    rows = database.load_run_records(run_id) if run_id else database.load_run_metrics(project_path, 1)
+    calls = []
+    for _, agent_name, output_data, timestamp in rows:
+        try:
+            data = json.loads(output_data)
+        except (TypeError, json.JSONDecodeError):
+            continue
+        if not isinstance(data, dict) or data.get("kind") != "agent_call":
+            continue
+        if data.get("context_blob") or data.get("prompt_blob"):
+            calls.append((agent_name, timestamp, data))
+    if not calls:
+        print("Nenhum prompt registrado para esta execução (o registro exige DOC_AGENT_LOG_PROMPTS=1).")
+        return
+    print(f"Execução {rows[0][0]}: {len(calls)} chamadas ao modelo com prompt registrado.\n")
+    for agent_name, timestamp, data in calls:
+        for part in ("context_blob", "prompt_blob"):
+            blob_hash = data.get(part)
+            if not blob_hash:
+                continue
+            out.write(f"===== {agent_name} ({timestamp}) - {'contexto' if part == 'context_blob' else 'tarefa'} "
+                      f"{blob_hash[:16]} =====\n")
+            try:
+                for chunk in database.iter_blob(blob_hash):
+                    out.write(chunk)
+            except KeyError:
+                out.write("[blob removido pela política de retenção]")
+            out.write("\n\n")
@@ -0,0 +1,176 @@
+# retrieval.py
+# Índice invertido (BM25) sobre os identificadores e o texto dos arquivos do projeto,
+# usado para emparelhar cada documento apenas com os arquivos de código relevantes.
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+import database
+
+# Versão do formato dos vetores de termos; incrementar invalida o cache
+RETRIEVAL_VERSION = 1
+# Nome usado na tabela 'memory' para os vetores de termos em cache
+RETRIEVAL_MEMORY_AGENT = "retrieval"
+# Número padrão de arquivos de código recuperados por documento
+DEFAULT_TOP_K = 5
+# Consultas usam apenas os termos mais distintivos do documento
+MAX_QUERY_TERMS = 64
+# Termos presentes em mais desta fração dos arquivos não ajudam a distinguir e são ignorados
+MAX_QUERY_DF_RATIO = 0.5
+
+# Parâmetros clássicos do BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD_RE = re.compile(r"[A-Za-zÀ-ÿ_][A-Za-zÀ-ÿ0-9_]*")
+_CAMEL_RE = re.compile(r"[A-ZÀ-Ý]+(?=[A-ZÀ-Ý][a-zà-ÿ])|[A-ZÀ-Ý]?[a-zà-ÿ]+|[A-ZÀ-Ý]+|[0-9]+")
+
+# Palavras muito frequentes em código e documentação, sem valor para a busca
+STOPWORDS = frozenset("""
+a o e de do da dos das em no na nos nas um uma para por com que se ao os as é ou
+the and of to in for on is it be as by an or at this that with from are not
+self def return import if else elif none true false var let const function new
+""".split())
+
+
+@lru_cache(maxsize=65536)
+def _split_identifier(word):
+    lowered = word.lower()
+    parts = [part.lower() for part in _CAMEL_RE.findall(word.replace('_', ' '))]
+    terms = [part for part in parts if len(part) > 1 and part not in STOPWORDS]
+    if len(parts) > 1 and len(lowered) > 2:
+        terms.insert(0, lowered.strip('_'))
+    return tuple(terms)
+
+
+def tokenize(text):
+    """
+    Divide o texto em termos: identificadores são quebrados em camelCase e snake_case
+    (getUserById -> get, user, by, id) e o identificador completo também é mantido.
+    """
+    terms = []
+    for word in _WORD_RE.findall(text):
+        terms.extend(_split_identifier(word))
+    return terms
+
+
+def term_frequencies(path, text):
+    """Vetor de termos de um arquivo: conteúdo mais os componentes do nome do arquivo."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    counts = Counter(tokenize(text))
+    counts.update(tokenize(name))
+    return counts
+
+
+class BM25Index:
+    """Índice invertido em memória com ranqueamento BM25."""
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = {}
+        self.total_length = 0
+        self._norms = None
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, path, frequencies):
+        length = sum(frequencies.values())
+        self.lengths[path] = length
+        self.total_length += length
+        self._norms = None
+        for term, count in frequencies.items():
+            self.postings.setdefault(term, []).append((path, count))
+
+    def idf(self, term):
+        df = len(self.postings.get(term, ()))
+        return math.log((len(self.lengths) - df + 0.5) / (df + 0.5) + 1.0)
+
+    def query_terms(self, frequencies, limit=MAX_QUERY_TERMS):
+        """
+        Seleciona os termos mais distintivos de um texto de consulta: os de maior idf,
+        desempatados pela frequência no texto, ignorando os presentes em quase todo arquivo.
+        """
+        max_df = max(1, int(len(self.lengths) * MAX_QUERY_DF_RATIO))
+        weighted = [
+            ((1 + math.log(count)) * self.idf(term), term)
+            for term, count in frequencies.items()
+            if term in self.postings and len(self.postings[term]) <= max_df
+        ]
+        weighted.sort(reverse=True)
+        return [term for _, term in weighted[:limit]]
+
+    def _length_norms(self):
+        # Parte do denominador do BM25 que depende apenas do tamanho do documento
+        if self._norms is None:
+            # Documentos sem nenhum termo (ex: um arquivo vazio) não podem zerar a média
+            average_length = self.total_length / len(self.lengths) or 1.0
+            self._norms = {
+                path: self.k1 * (1 - self.b + self.b * length / average_length)
+                for path, length in self.lengths.items()
+            }
+        return self._norms
+
+    def search(self, terms, k=DEFAULT_TOP_K):
+        """
+        Retorna os k documentos com maior pontuação BM25 para os termos.
+        Args:
+            terms (list): Termos da consulta.
+            k (int): Número máximo de resultados.
+        Returns:
+            list: Tuplas (caminho, pontuação) em ordem decrescente de pontuação.
+        """
+        if not self.lengths:
+            return []
+        norms = self._length_norms()
+        scores = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            weight = self.idf(term) * (self.k1 + 1)
+            for path, count in postings:
+                scores[path] = scores.get(path, 0.0) + weight * count / (count + norms[path])
+        return heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def build_index(file_paths, file_contents, indexed_paths=None):
+    """
+    Calcula os vetores de termos dos arquivos e monta o índice BM25. Os vetores ficam
+    em cache na tabela 'memory', indexados pelo hash do caminho e do conteúdo, então
+    apenas arquivos novos ou alterados são tokenizados novamente.
+    Args:
+        file_paths (list): Arquivos cujos vetores de termos são calculados.
+        file_contents (dict): Texto de cada caminho.
+        indexed_paths (list): Subconjunto de file_paths incluído no índice (ex: apenas o
+            código, que é o que se quer recuperar); por padrão, todos.
+    Returns:
+        tuple: (BM25Index, vetores de termos de cada caminho).
+    """
+    keys = {path: f"v{RETRIEVAL_VERSION}:{database.hash_content(path + chr(0) + file_contents[path])}"
+            for path in file_paths}
+    cached = database.load_memory(RETRIEVAL_MEMORY_AGENT, set(keys.values()), cache=True)
+
+    vectors = {}
+    new_items = {}
+    for path in file_paths:
+        key = keys[path]
+        if key in cached:
+            vectors[path] = Counter(json.loads(cached[key]))
+        else:
+            vectors[path] = term_frequencies(path, file_contents[path])
+            new_items[key] = json.dumps(vectors[path], ensure_ascii=False, separators=(',', ':'))
+    if new_items:
+        database.save_memory(RETRIEVAL_MEMORY_AGENT, new_items, cache=True)
+
+    index = BM25Index()
+    for path in (file_paths if indexed_paths is None else indexed_paths):
+        index.add(path, vectors[path])
+    print(f"[Índice] {len(index)} arquivos indexados ({len(new_items)} tokenizados, "
+          f"{len(file_paths) - len(new_items)} do cache), {len(index.postings)} termos.")
+    return index, vectors
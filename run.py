@@ -1,18 +1,100 @@
 import argparse
+import json
 import os
+import threading
 import database
+import metrics
+import tools
 
-# No futuro, importaremos e chamaremos o agente orquestrador daqui
-# from agents.orchestrator import run_orchestration
+# Os agentes (e o agno) só são carregados quando um comando chama o modelo
+from agents.orchestrator import run_orchestration, ARCHIVE_POLICIES
+from agents.analyzer import DEFAULT_SHARD_TOKEN_BUDGET
+from agents import batch, runtime, server
+from retrieval import DEFAULT_TOP_K
+from summaries import DEFAULT_SUMMARY_TOKEN_BUDGET
 
-from agents.orchestrator import run_orchestration
-
-def analyze_project(project_path):
+def analyze_project(project_path, **options):
     """
     Função que dispara o processo de análise de documentação.
-    Delega todo o trabalho para o Agente Orquestrador.
+    Delega todo o trabalho para o Agente Orquestrador; `options` são repassadas
+    para run_orchestration.
+    """
+    return run_orchestration(project_path, **options)
+
+
+def apply_run_retention():
+    """
+    Aplica a retenção de 'run_history' (database.RUN_RETENTION execuções por projeto) uma
+    vez por comando, depois das análises; uma falha na limpeza vira apenas um aviso.
     """
-    run_orchestration(project_path)
+    try:
+        database.prune_runs(database.RUN_RETENTION)
+    except Exception as e:
+        print(f"Aviso: não foi possível limpar o histórico de execuções: {e}")
+
+
+def _add_analysis_options(subparser):
+    """Adiciona as opções de análise compartilhadas pelos comandos 'analyze', 'batch' e 'submit'."""
+    subparser.add_argument("--researcher-agent", action="store_true",
+                           help="Usa o modelo de linguagem para descobrir os arquivos em vez da varredura local.")
+    subparser.add_argument("--incremental", action="store_true",
+                           help="Reanalisa apenas os arquivos alterados desde a última execução.")
+    subparser.add_argument("--sharded", action="store_true",
+                           help="Divide a análise em lotes limitados por tokens, processados em paralelo.")
+    subparser.add_argument("--shard-tokens", type=int, default=DEFAULT_SHARD_TOKEN_BUDGET,
+                           help=f"Orçamento aproximado de tokens por lote (padrão: {DEFAULT_SHARD_TOKEN_BUDGET}).")
+    subparser.add_argument("--crossref", action="store_true",
+                           help="Verificação cruzada determinística entre documentação e código; apenas os casos "
+                                "ambíguos são enviados ao modelo.")
+    subparser.add_argument("--retrieval", action="store_true",
+                           help="Analisa cada documento apenas contra os arquivos de código mais relevantes "
+                                "(índice BM25), em chamadas paralelas.")
+    subparser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K,
+                           help=f"Arquivos de código recuperados por documento no modo --retrieval (padrão: {DEFAULT_TOP_K}).")
+    subparser.add_argument("--dedup", action="store_true",
+                           help="Omite dos prompts arquivos idênticos ou quase idênticos a outro, com uma nota "
+                                "no arquivo mantido.")
+    subparser.add_argument("--sections", action="store_true",
+                           help="Regenera apenas as seções do README existente afetadas pelas discrepâncias.")
+    subparser.add_argument("--stream", action="store_true",
+                           help="Grava o novo README incrementalmente enquanto ele é gerado.")
+    subparser.add_argument("--context-mode", choices=tools.CONTEXT_MODES, default="full",
+                           help="Conteúdo enviado ao modelo: 'full' (arquivos completos), 'skeleton' "
+                                "(apenas assinaturas, docstrings, rotas e variáveis de ambiente do código) ou "
+                                "'summary' (árvore de resumos por diretório, na profundidade que cabe em --summary-tokens).")
+    subparser.add_argument("--summary-tokens", type=int, default=DEFAULT_SUMMARY_TOKEN_BUDGET,
+                           help=f"Orçamento aproximado de tokens do contexto no modo 'summary' "
+                                f"(padrão: {DEFAULT_SUMMARY_TOKEN_BUDGET}).")
+    subparser.add_argument("--token-budget", type=int, default=None,
+                           help="Limite de tokens de entrada por etapa; os arquivos de menor prioridade que não "
+                                "couberem são reduzidos ao esqueleto, truncados ou omitidos.")
+    subparser.add_argument("--cost-budget", type=float, default=None,
+                           help="Limite de custo por etapa, em US$, convertido em tokens pelos preços do modelo.")
+    subparser.add_argument("--dry-run", action="store_true",
+                           help="Apenas estima os tokens, o custo e a latência de cada etapa, sem chamar o modelo.")
+    subparser.add_argument("--no-cache", action="store_true",
+                           help="Ignora o cache de respostas do modelo e sempre consulta a API.")
+
+
+def _analysis_options(args):
+    """Converte os argumentos de análise nas opções de run_orchestration."""
+    return {
+        "use_researcher_agent": args.researcher_agent,
+        "incremental": args.incremental,
+        "sharded": args.sharded,
+        "shard_token_budget": args.shard_tokens,
+        "stream_writer": args.stream,
+        "context_mode": args.context_mode,
+        "archive_policy": args.archive,
+        "retrieval_top_k": args.top_k if args.retrieval else None,
+        "use_crossref": args.crossref,
+        "section_writer": args.sections,
+        "deduplicate": args.dedup,
+        "summary_token_budget": args.summary_tokens,
+        "token_budget": args.token_budget,
+        "cost_budget": args.cost_budget,
+        "dry_run": args.dry_run,
+    }
 
 
 def main():
@@ -20,6 +102,8 @@ def main():
     Ponto de entrada principal da CLI.
     Configura o parser de argumentos e direciona para a função apropriada.
     """
+    # Carrega o .env uma única vez, antes de ler qualquer configuração
+    runtime.load_environment()
     # Garante que o banco de dados e as tabelas existam antes de qualquer operação
     database.initialize_database()
     print("-" * 50)
@@ -35,9 +119,141 @@ def main():
     # Define o comando 'analyze'
     analyze_parser = subparsers.add_parser("analyze", help="Executa a análise completa de um projeto.")
     analyze_parser.add_argument("project_path", type=str, help="O caminho para o diretório do projeto a ser analisado.")
+    _add_analysis_options(analyze_parser)
+    analyze_parser.add_argument("--archive", choices=ARCHIVE_POLICIES, default="ask",
+                                help="Arquivamento da documentação antiga em docs.old: 'ask' (pergunta), "
+                                     "'always' ou 'never' (padrão: ask).")
+
+    # Define o comando 'batch'
+    batch_parser = subparsers.add_parser("batch", help="Analisa vários projetos em paralelo, sem interação.")
+    batch_parser.add_argument("project_paths", type=str, nargs="*", help="Os diretórios dos projetos.")
+    batch_parser.add_argument("--manifest", type=str,
+                              help="Arquivo com um caminho de projeto por linha (linhas com '#' são ignoradas).")
+    batch_parser.add_argument("--workers", type=int, default=None,
+                              help="Número de processos em paralelo (padrão: número de CPUs).")
+    batch_parser.add_argument("--max-requests", type=int, default=4,
+                              help="Máximo de requisições simultâneas ao modelo entre todos os processos (padrão: 4).")
+    batch_parser.add_argument("--log-dir", type=str, default=batch.DEFAULT_LOG_DIR,
+                              help=f"Diretório dos logs de cada projeto (padrão: {batch.DEFAULT_LOG_DIR}).")
+    _add_analysis_options(batch_parser)
+    batch_parser.add_argument("--archive", choices=("always", "never"), default="never",
+                              help="Arquivamento da documentação antiga em docs.old (padrão: never).")
+
+    # Define o comando 'serve'
+    serve_parser = subparsers.add_parser("serve", help="Inicia o daemon que atende análises por um socket local.")
+    serve_parser.add_argument("--socket", type=str, default=server.DEFAULT_SOCKET_PATH,
+                              help=f"Socket Unix do servidor (padrão: {server.DEFAULT_SOCKET_PATH}).")
+    serve_parser.add_argument("--port", type=int, default=None,
+                              help=f"Escuta em TCP ({server.DEFAULT_HOST}:PORT) em vez do socket Unix.")
+    serve_parser.add_argument("--workers", type=int, default=server.DEFAULT_WORKERS,
+                              help=f"Pedidos atendidos em paralelo (padrão: {server.DEFAULT_WORKERS}).")
+    serve_parser.add_argument("--max-requests", type=int, default=4,
+                              help="Máximo de requisições simultâneas ao modelo entre todos os pedidos (padrão: 4).")
+    serve_parser.add_argument("--watch", type=str, nargs="*", default=[],
+                              help="Projetos observados e aquecidos em segundo plano desde o início.")
+    serve_parser.add_argument("--no-cache", action="store_true",
+                              help="Ignora o cache de respostas do modelo em todos os pedidos.")
+    serve_parser.add_argument("--status", action="store_true", help="Exibe o estado de um servidor em execução.")
+    serve_parser.add_argument("--stop", action="store_true", help="Encerra um servidor em execução.")
+
+    # Define o comando 'submit'
+    submit_parser = subparsers.add_parser("submit", help="Envia uma análise para o servidor iniciado com 'serve'.")
+    submit_parser.add_argument("project_path", type=str, help="O caminho para o diretório do projeto.")
+    _add_analysis_options(submit_parser)
+    submit_parser.add_argument("--archive", choices=("always", "never"), default="never",
+                               help="Arquivamento da documentação antiga em docs.old (padrão: never).")
+    submit_parser.add_argument("--watch-only", action="store_true",
+                               help="Apenas registra o projeto para observação e aquecimento, sem analisar.")
+    submit_parser.add_argument("--socket", type=str, default=server.DEFAULT_SOCKET_PATH,
+                               help="Socket Unix do servidor.")
+    submit_parser.add_argument("--port", type=int, default=None, help="Porta TCP do servidor, se ele escuta em TCP.")
+
+    # Define o comando 'stats'
+    stats_parser = subparsers.add_parser("stats", help="Exibe percentis e tendências das métricas das execuções.")
+    stats_parser.add_argument("project_path", type=str, nargs="?",
+                              help="Restringe o relatório às execuções deste projeto.")
+    stats_parser.add_argument("--last", type=int, default=50,
+                              help="Número de execuções mais recentes consideradas (padrão: 50).")
+
+    # Define o comando 'prompts'
+    prompts_parser = subparsers.add_parser("prompts", help="Exibe os prompts enviados ao modelo em uma execução.")
+    prompts_parser.add_argument("project_path", type=str, nargs="?",
+                                help="Exibe a execução mais recente deste projeto (padrão: a mais recente de todas).")
+    prompts_parser.add_argument("--run", type=str, default=None, help="O run_id da execução.")
+
+    # Define o comando 'prune'
+    prune_parser = subparsers.add_parser("prune", help="Remove execuções antigas do histórico e compacta o banco.")
+    prune_parser.add_argument("project_path", type=str, nargs="?",
+                              help="Restringe a limpeza às execuções deste projeto.")
+    prune_parser.add_argument("--keep", type=int, default=database.RUN_RETENTION,
+                              help=f"Execuções mantidas por projeto (padrão: {database.RUN_RETENTION}, "
+                                   f"ou DOC_AGENT_RUN_RETENTION).")
 
     args = parser.parse_args()
 
+    if args.command == "stats":
+        project_path = os.path.abspath(args.project_path) if args.project_path else None
+        metrics.print_stats(project_path, args.last)
+        return
+
+    if args.command == "prompts":
+        project_path = os.path.abspath(args.project_path) if args.project_path else None
+        metrics.print_prompts(project_path, args.run)
+        return
+
+    if args.command == "prune":
+        project_path = os.path.abspath(args.project_path) if args.project_path else None
+        result = database.prune_runs(args.keep, project_path, vacuum=True)
+        print(f"{result['runs']} execuções e {result['blobs']} blobs removidos; banco com "
+              f"{result['bytes_after'] / 1024:.0f} KB (antes: {result['bytes_before'] / 1024:.0f} KB).")
+        return
+
+    if args.command == "serve":
+        if args.status or args.stop:
+            request = {"command": "status" if args.status else "shutdown"}
+            print(json.dumps(server.send_request(request, args.socket, args.port), ensure_ascii=False, indent=2))
+            return
+        if args.no_cache:
+            runtime.set_llm_cache_enabled(False)
+        runtime.set_request_limiter(threading.BoundedSemaphore(args.max_requests))
+        server.serve(args.socket, args.port, workers=args.workers, watch_paths=args.watch)
+        apply_run_retention()
+        return
+
+    if args.command == "submit":
+        options = _analysis_options(args)
+        if args.no_cache:
+            print("Aviso: --no-cache é ignorado por 'submit'; use 'serve --no-cache' ao iniciar o servidor.")
+        command = "watch" if args.watch_only else "analyze"
+        response = server.send_request({"command": command, "project_path": os.path.abspath(args.project_path),
+                                        "options": options}, args.socket, args.port)
+        if not response.get("ok"):
+            print(response.get("error"))
+        elif command == "watch":
+            print(f"Projeto registrado para observação: {response['project_path']}")
+        else:
+            batch.print_batch_summary([response["summary"]])
+        return
+
+    if args.command == "batch":
+        project_paths = list(args.project_paths)
+        if args.manifest:
+            project_paths.extend(batch.read_manifest(args.manifest))
+        if not project_paths:
+            print("Erro: informe os projetos como argumentos ou com --manifest.")
+            return
+        summaries = batch.run_batch(
+            project_paths,
+            workers=args.workers,
+            max_requests=args.max_requests,
+            log_dir=args.log_dir,
+            use_llm_cache=not args.no_cache,
+            **_analysis_options(args),
+        )
+        batch.print_batch_summary(summaries)
+        apply_run_retention()
+        return
+
     if args.command == "analyze":
         project_path = args.project_path
         # Se o caminho não for fornecido via argumento, solicita interativamente
@@ -54,8 +270,11 @@ def main():
             return
         
         project_path = os.path.abspath(project_path)
+        if args.no_cache:
+            runtime.set_llm_cache_enabled(False)
         print(f"Iniciando análise no projeto: {project_path}")
-        analyze_project(project_path)
+        analyze_project(project_path, **_analysis_options(args))
+        apply_run_retention()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,99 @@
+# sections.py
+# Divisão de um README em seções delimitadas por títulos e associação de cada
+# discrepância às seções afetadas, para que o Escritor regenere apenas essas seções.
+import re
+import retrieval
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_CODE_NAME_RE = re.compile(r"`([^`\n]+)`")
+
+
+class Section:
+    """
+    Trecho do README que vai de um título (linha '# ...' a '###### ...') até o próximo
+    título de qualquer nível. O texto antes do primeiro título é uma seção de nível 0.
+    """
+    __slots__ = ('level', 'title', 'text')
+
+    def __init__(self, level, title, text):
+        self.level = level
+        self.title = title
+        self.text = text
+
+    @property
+    def heading(self):
+        """A linha de título da seção ('' para o preâmbulo)."""
+        return self.text.split('\n', 1)[0] if self.level else ""
+
+    def __repr__(self):
+        return f"Section(level={self.level}, title={self.title!r}, chars={len(self.text)})"
+
+
+def split_sections(markdown):
+    """
+    Divide o markdown em seções, sem perder nenhum caractere: "".join(s.text for s in
+    split_sections(md)) == md. Títulos dentro de blocos de código cercados são ignorados.
+    Returns:
+        list: As seções, na ordem do documento.
+    """
+    sections = []
+    current_level, current_title, current_lines = 0, "", []
+    in_fence = None
+    for line in markdown.splitlines(keepends=True):
+        fence = _FENCE_RE.match(line)
+        if fence:
+            if in_fence is None:
+                in_fence = fence.group(1)
+            elif fence.group(1) == in_fence:
+                in_fence = None
+        heading = _HEADING_RE.match(line.rstrip('\r\n')) if in_fence is None and not fence else None
+        if heading:
+            if current_lines:
+                sections.append(Section(current_level, current_title, "".join(current_lines)))
+            current_level, current_title, current_lines = len(heading.group(1)), heading.group(2), []
+        current_lines.append(line)
+    if current_lines:
+        sections.append(Section(current_level, current_title, "".join(current_lines)))
+    return sections
+
+
+def join_sections(sections):
+    """Reconstrói o documento, garantindo que cada seção termine em uma linha própria."""
+    parts = []
+    for index, section in enumerate(sections):
+        text = section.text
+        if index < len(sections) - 1 and not text.endswith('\n'):
+            text += '\n'
+        parts.append(text)
+    return "".join(parts)
+
+
+def map_discrepancies(sections, discrepancies):
+    """
+    Associa cada discrepância à seção mais relevante, com um índice BM25 sobre o título e
+    o texto das seções (ver retrieval.BM25Index). O título conta em dobro.
+    Returns:
+        tuple: (dicionário índice da seção -> discrepâncias, discrepâncias sem seção).
+    """
+    index = retrieval.BM25Index()
+    for position, section in enumerate(sections):
+        frequencies = retrieval.term_frequencies("", section.text)
+        frequencies.update(retrieval.tokenize(section.title))
+        index.add(position, frequencies)
+
+    mapping = {}
+    unmatched = []
+    for discrepancy in discrepancies:
+        terms = retrieval.term_frequencies("", discrepancy)
+        results = index.search(index.query_terms(terms), k=1) if len(index) else []
+        if results and results[0][1] > 0:
+            mapping.setdefault(results[0][0], []).append(discrepancy)
+        else:
+            unmatched.append(discrepancy)
+    return mapping, unmatched
+
+
+def cited_names(text):
+    """Nomes citados entre crases (ex: `auth.py`, `getUser`), usados para escolher o contexto de código."""
+    return [name.strip() for name in _CODE_NAME_RE.findall(text) if name.strip()]
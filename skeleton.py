@@ -0,0 +1,382 @@
+# skeleton.py
+# Extração de "esqueletos" de código: assinaturas, docstrings, decorators, rotas e
+# variáveis de ambiente. Usado para reduzir o tamanho dos prompts do Analista e do Escritor.
+import ast
+import bisect
+import os
+import re
+
+# Incrementar quando o formato do esqueleto mudar, para invalidar o cache
+SKELETON_VERSION = 1
+
+PYTHON_EXTENSIONS = ('.py',)
+JS_EXTENSIONS = ('.js', '.ts', '.jsx', '.tsx', '.mjs', '.cjs')
+
+# Número máximo de linhas de docstring mantidas por definição
+MAX_DOCSTRING_LINES = 3
+
+_HTTP_METHODS = ('get', 'post', 'put', 'patch', 'delete', 'head', 'options', 'route', 'all', 'use')
+
+
+def supports_skeleton(file_path):
+    """Indica se existe um extrator de esqueleto para o tipo do arquivo."""
+    return file_path.endswith(PYTHON_EXTENSIONS + JS_EXTENSIONS)
+
+
+def extract_skeleton(file_path, content):
+    """
+    Gera o esqueleto de um arquivo de código.
+    Args:
+        file_path (str): Caminho do arquivo (a extensão define o extrator).
+        content (str): Conteúdo do arquivo.
+    Returns:
+        str: O esqueleto, ou None se o tipo de arquivo não for suportado.
+    """
+    if file_path.endswith(PYTHON_EXTENSIONS):
+        body = _python_skeleton(content)
+    elif file_path.endswith(JS_EXTENSIONS):
+        body = _js_skeleton(content)
+    else:
+        return None
+    header = f"# Esqueleto de {os.path.basename(file_path)}: apenas assinaturas, docstrings, rotas e variáveis de ambiente."
+    return header + "\n" + body
+
+
+def extract_symbols(file_path, content):
+    """
+    Extrai a tabela de símbolos de um arquivo de código, usada pela verificação
+    cruzada determinística (crossref.py).
+    Returns:
+        dict: 'names' (funções, classes, métodos e atribuições), 'routes' (pares
+        [método, caminho]) e 'env_keys', ou None se o tipo de arquivo não for suportado.
+    """
+    if file_path.endswith(PYTHON_EXTENSIONS):
+        return _python_symbols(content)
+    if file_path.endswith(JS_EXTENSIONS):
+        return _js_symbols(content)
+    return None
+
+
+# ========================================
+# PYTHON (via ast)
+# ========================================
+
+def _docstring_lines(node, indent):
+    docstring = ast.get_docstring(node)
+    if not docstring:
+        return []
+    lines = [line.strip() for line in docstring.strip().splitlines() if line.strip()][:MAX_DOCSTRING_LINES]
+    return [f'{indent}"""{" ".join(lines)}"""']
+
+
+def _format_args(args):
+    try:
+        return ast.unparse(args)
+    except Exception:
+        return "..."
+
+
+def _python_skeleton(content):
+    try:
+        tree = ast.parse(content)
+    except SyntaxError:
+        # Código que não compila (ex: Python 2) ainda pode ter suas definições listadas
+        return _generic_skeleton(content, re.compile(r"^\s*(async\s+def|def|class)\s+\w+.*$"))
+
+    lines = _docstring_lines(tree, "")
+    routes = []
+    env_keys = []
+
+    def visit(node, indent):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                for decorator in child.decorator_list:
+                    decorator_source = ast.unparse(decorator)
+                    lines.append(f"{indent}@{decorator_source}")
+                    routes.extend(_python_decorator_routes(decorator))
+                if isinstance(child, ast.ClassDef):
+                    bases = ", ".join(ast.unparse(base) for base in child.bases)
+                    lines.append(f"{indent}class {child.name}({bases}):" if bases else f"{indent}class {child.name}:")
+                else:
+                    prefix = "async def" if isinstance(child, ast.AsyncFunctionDef) else "def"
+                    returns = f" -> {ast.unparse(child.returns)}" if child.returns else ""
+                    lines.append(f"{indent}{prefix} {child.name}({_format_args(child.args)}){returns}:")
+                lines.extend(_docstring_lines(child, indent + "    "))
+                visit(child, indent + "    ")
+            elif isinstance(child, ast.Assign) and not indent:
+                # Constantes de módulo (ex: DEFAULT_TIMEOUT = 30) costumam ser configuração
+                targets = [t.id for t in child.targets if isinstance(t, ast.Name) and t.id.isupper()]
+                if targets:
+                    lines.append(f"{' = '.join(targets)} = ...")
+                visit(child, indent)
+            else:
+                visit(child, indent)
+
+    visit(tree, "")
+    for node in ast.walk(tree):
+        key = _python_env_key(node)
+        if key and key not in env_keys:
+            env_keys.append(key)
+        if isinstance(node, ast.Call):
+            routes.extend(_python_call_routes(node))
+
+    return _append_summary(lines, routes, env_keys)
+
+
+# Só vale percorrer as expressões das linhas que podem ler variáveis de ambiente ou definir rotas
+_PY_EXPRESSION_HINT = re.compile(r"environ|getenv|['\"]/|\bre_path\(|\bpath\(")
+_PY_STATEMENT_FIELDS = ('body', 'orelse', 'finalbody', 'handlers', 'cases')
+
+
+def _python_statements(statements):
+    """Percorre apenas os comandos (incluindo os aninhados), sem descer nas expressões."""
+    for statement in statements:
+        yield statement
+        for field in _PY_STATEMENT_FIELDS:
+            children = getattr(statement, field, None)
+            if children:
+                yield from _python_statements(children)
+
+
+def _python_hinted_nodes(node, hint_lines):
+    """Como ast.walk, mas ignora subárvores cujas linhas não contêm nenhuma linha de hint_lines."""
+    for child in ast.iter_child_nodes(node):
+        start = getattr(child, 'lineno', None)
+        if start is not None:
+            # Em definições, lineno aponta para o 'def'/'class', depois dos decorators
+            decorators = getattr(child, 'decorator_list', None)
+            if decorators:
+                start = decorators[0].lineno
+            position = bisect.bisect_left(hint_lines, start)
+            if position == len(hint_lines) or hint_lines[position] > child.end_lineno:
+                continue
+        yield child
+        yield from _python_hinted_nodes(child, hint_lines)
+
+
+def _python_symbols(content):
+    try:
+        tree = ast.parse(content)
+    except SyntaxError:
+        names = re.findall(r"^\s*(?:async\s+def|def|class)\s+(\w+)", content, re.MULTILINE)
+        return {"names": sorted(set(names)), "routes": [], "env_keys": []}
+
+    names = set()
+    for node in _python_statements(tree.body):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names.update(target.id for target in targets if isinstance(target, ast.Name))
+
+    routes = []
+    env_keys = []
+    hint_lines = [number for number, line in enumerate(content.splitlines(), 1) if _PY_EXPRESSION_HINT.search(line)]
+    if hint_lines:
+        for node in _python_hinted_nodes(tree, hint_lines):
+            if isinstance(node, ast.Call):
+                routes.extend(_python_call_routes(node))
+            key = _python_env_key(node)
+            if key and key not in env_keys:
+                env_keys.append(key)
+    return {"names": sorted(names), "routes": [_split_route(route) for route in dict.fromkeys(routes)],
+            "env_keys": env_keys}
+
+
+def _split_route(route):
+    method, _, path = route.rpartition(" ")
+    return [method, path]
+
+
+def _dotted_name(node):
+    """Nome pontilhado de uma expressão como os.environ.get, ou None (mais barato que ast.unparse)."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def _python_env_key(node):
+    """Retorna a chave de os.getenv("X"), os.environ.get("X") ou os.environ["X"]."""
+    if isinstance(node, ast.Call) and node.args and isinstance(node.args[0], ast.Constant) \
+            and isinstance(node.args[0].value, str):
+        if _dotted_name(node.func) in ("os.getenv", "getenv", "os.environ.get", "environ.get"):
+            return node.args[0].value
+    if isinstance(node, ast.Subscript) and _dotted_name(node.value) in ("os.environ", "environ"):
+        key = node.slice
+        if isinstance(key, ast.Constant) and isinstance(key.value, str):
+            return key.value
+    return None
+
+
+def _python_decorator_routes(decorator):
+    if isinstance(decorator, ast.Call):
+        return _python_call_routes(decorator)
+    return []
+
+
+def _python_call_routes(call):
+    """Extrai rotas de chamadas como app.get("/x"), router.route("/x", methods=[...]), path("x/")."""
+    func = call.func
+    name = func.attr if isinstance(func, ast.Attribute) else getattr(func, 'id', '')
+    if name.lower() not in _HTTP_METHODS + ('path', 're_path', 'add_url_rule', 'add_api_route'):
+        return []
+    if not call.args or not isinstance(call.args[0], ast.Constant) or not isinstance(call.args[0].value, str):
+        return []
+    route = call.args[0].value
+    if not route.startswith('/') and name not in ('path', 're_path'):
+        return []
+    method = name.upper() if name.lower() not in ('route', 'use', 'path', 're_path', 'add_url_rule', 'add_api_route') else ''
+    for keyword in call.keywords:
+        if keyword.arg == 'methods':
+            try:
+                method = "|".join(ast.literal_eval(keyword.value))
+            except (ValueError, TypeError):
+                pass
+    return [f"{method} {route}".strip()]
+
+
+# ========================================
+# JAVASCRIPT / TYPESCRIPT (tokenizador leve)
+# ========================================
+
+_JS_DEFINITION = re.compile(
+    r"^\s*(?:export\s+(?:default\s+)?)?(?:"
+    r"(?:async\s+)?function\s*\*?\s*\w+\s*(?:<[^>]*>)?\s*\([^)]*\)"          # function foo(a, b)
+    r"|(?:abstract\s+)?class\s+\w+(?:\s+extends\s+[\w.]+)?(?:\s+implements\s+[\w.,\s]+)?"  # class Foo extends Bar
+    r"|(?:interface|type|enum)\s+\w+"                                          # TypeScript
+    r"|(?:const|let|var)\s+\w+\s*(?::[^=]+)?=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|\w+\s*=>)"  # const foo = () =>
+    r")"
+)
+_JS_METHOD = re.compile(
+    r"^\s+(?:(?:public|private|protected|static|async|get|set|readonly)\s+)*"
+    r"(?!if\b|for\b|while\b|switch\b|catch\b|return\b|function\b)\w+\s*\([^)]*\)\s*(?::\s*[^{]+)?\{"
+)
+_JS_ROUTE = re.compile(
+    r"\b\w+\.(get|post|put|patch|delete|all|use|route)\(\s*['\"`](/[^'\"`]*)['\"`]", re.IGNORECASE
+)
+_JS_ENV = re.compile(r"process\.env(?:\.([A-Za-z_]\w*)|\[\s*['\"]([^'\"]+)['\"]\s*\])")
+_JS_DECORATOR = re.compile(r"^\s*@\w+(?:\([^)]*\))?\s*$")
+
+
+def _strip_js_comments(content):
+    """
+    Remove comentários // e /* */ preservando strings e JSDoc (/** */), que são
+    mantidos como documentação.
+    """
+    result = []
+    i = 0
+    length = len(content)
+    quote = None
+    while i < length:
+        char = content[i]
+        if quote:
+            result.append(char)
+            if char == '\\' and i + 1 < length:
+                result.append(content[i + 1])
+                i += 2
+                continue
+            if char == quote:
+                quote = None
+            i += 1
+            continue
+        if char in ('"', "'", '`'):
+            quote = char
+            result.append(char)
+            i += 1
+        elif content.startswith('/**', i):
+            end = content.find('*/', i + 3)
+            end = length if end == -1 else end + 2
+            result.append(content[i:end])
+            i = end
+        elif content.startswith('/*', i):
+            end = content.find('*/', i + 2)
+            end = length if end == -1 else end + 2
+            # Mantém as quebras de linha para não juntar linhas de código
+            result.append('\n' * content.count('\n', i, end))
+            i = end
+        elif content.startswith('//', i):
+            end = content.find('\n', i)
+            i = length if end == -1 else end
+        else:
+            result.append(char)
+            i += 1
+    return ''.join(result)
+
+
+def _jsdoc_summary(block):
+    text = block.replace('/**', '').replace('*/', '')
+    lines = [line.strip().lstrip('*').strip() for line in text.splitlines()]
+    return " ".join([line for line in lines if line][:MAX_DOCSTRING_LINES])
+
+
+def _js_skeleton(content):
+    code = _strip_js_comments(content)
+    lines = []
+    pending_doc = None
+    for raw_line in code.splitlines():
+        stripped = raw_line.strip()
+        if stripped.startswith('/**'):
+            pending_doc = stripped
+            if '*/' not in stripped:
+                continue
+        elif pending_doc is not None and '*/' not in pending_doc:
+            pending_doc += "\n" + stripped
+            continue
+        if _JS_DECORATOR.match(raw_line):
+            lines.append(stripped)
+            continue
+        match = _JS_DEFINITION.match(raw_line) or _JS_METHOD.match(raw_line)
+        if match:
+            indent = raw_line[:len(raw_line) - len(raw_line.lstrip())]
+            if pending_doc:
+                lines.append(f"{indent}/** {_jsdoc_summary(pending_doc)} */")
+            lines.append(indent + match.group(0).strip().rstrip('{').rstrip())
+        if not stripped.startswith('/**'):
+            pending_doc = None
+
+    routes = [f"{method.upper()} {path}" for method, path in _JS_ROUTE.findall(code)]
+    env_keys = []
+    for dotted, bracketed in _JS_ENV.findall(code):
+        key = dotted or bracketed
+        if key not in env_keys:
+            env_keys.append(key)
+    return _append_summary(lines, routes, env_keys)
+
+
+_JS_NAME = re.compile(r"\b(?:function\s*\*?|class|interface|type|enum|const|let|var)\s+([A-Za-z_$][\w$]*)")
+_JS_METHOD_NAME = re.compile(
+    r"^\s+(?:(?:public|private|protected|static|async|get|set|readonly)\s+)*"
+    r"(?!if\b|for\b|while\b|switch\b|catch\b|return\b|function\b)([A-Za-z_$][\w$]*)\s*\([^)]*\)\s*(?::\s*[^{]+)?\{",
+    re.MULTILINE
+)
+
+
+def _js_symbols(content):
+    code = _strip_js_comments(content)
+    names = set(_JS_NAME.findall(code)) | set(_JS_METHOD_NAME.findall(code))
+    routes = list(dict.fromkeys((method.upper(), path) for method, path in _JS_ROUTE.findall(code)))
+    env_keys = list(dict.fromkeys(dotted or bracketed for dotted, bracketed in _JS_ENV.findall(code)))
+    return {"names": sorted(names), "routes": [list(route) for route in routes], "env_keys": env_keys}
+
+
+# ========================================
+# AUXILIARES
+# ========================================
+
+def _generic_skeleton(content, pattern):
+    return "\n".join(line.rstrip() for line in content.splitlines() if pattern.match(line))
+
+
+def _append_summary(lines, routes, env_keys):
+    unique_routes = list(dict.fromkeys(routes))
+    if unique_routes:
+        lines.append("")
+        lines.append("# Rotas: " + ", ".join(unique_routes))
+    if env_keys:
+        lines.append("# Variáveis de ambiente: " + ", ".join(env_keys))
+    return "\n".join(lines)
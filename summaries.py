@@ -0,0 +1,174 @@
+# summaries.py
+# Árvore de resumos hierárquica do projeto (arquivos -> diretórios -> projeto). Cada nó
+# é identificado por um hash calculado a partir dos seus filhos, então uma alteração em um
+# arquivo só muda as chaves dos nós no caminho até a raiz; os demais resumos continuam
+# válidos na tabela 'memory'. Os resumos de diretório são gerados pelo Agente Resumidor
+# (ver agents/summarizer.py); aqui ficam a árvore, as chaves e a seleção por orçamento.
+import heapq
+import os
+import database
+import metrics
+
+# Versão do formato dos resumos; incrementar invalida o cache
+SUMMARY_VERSION = 1
+# Nome usado na tabela 'memory' para os resumos de diretório em cache
+SUMMARY_MEMORY_AGENT = "summaries"
+# Tamanho máximo do resumo de um arquivo (esqueleto do código ou texto da documentação)
+MAX_LEAF_CHARS = 4000
+# Diretórios cujos filhos somam menos que isto não são resumidos pelo modelo: o resumo é
+# o próprio texto dos filhos
+MIN_SUMMARY_CHARS = 2000
+# Orçamento de tokens de entrada de cada chamada ao Resumidor; diretórios maiores são
+# resumidos em partes
+SUMMARY_INPUT_TOKENS = 30000
+# Orçamento padrão de tokens do contexto montado a partir da árvore
+DEFAULT_SUMMARY_TOKEN_BUDGET = int(os.getenv("DOC_AGENT_SUMMARY_TOKENS", "60000"))
+
+
+def leaf_summary(text):
+    """Resumo de um arquivo: o texto (já reduzido ao esqueleto, no caso do código) limitado a MAX_LEAF_CHARS."""
+    if len(text) <= MAX_LEAF_CHARS:
+        return text
+    return text[:MAX_LEAF_CHARS] + "\n[... truncado ...]\n"
+
+
+class SummaryNode:
+    """
+    Nó da árvore de resumos. Arquivos são folhas (children None) cujo texto é o resumo do
+    arquivo; diretórios têm filhos e recebem o texto do resumo depois de resumidos.
+    O rótulo é o caminho absoluto (com separador final, nos diretórios).
+    """
+    __slots__ = ('label', 'children', 'depth', 'key', 'text', 'files')
+
+    def __init__(self, label, children, depth):
+        self.label = label
+        self.children = children
+        self.depth = depth
+        self.key = None
+        self.text = None
+        self.files = 0 if children is not None else 1
+
+    @property
+    def is_directory(self):
+        return self.children is not None
+
+    def children_text(self):
+        """Texto dos filhos, cada um sob o seu rótulo (entrada do resumo do diretório)."""
+        return "\n\n".join(f"### {child.label}\n{child.text}" for child in self.children)
+
+    def __repr__(self):
+        kind = "dir" if self.is_directory else "file"
+        return f"SummaryNode({self.label!r}, {kind}, files={self.files})"
+
+
+def build_tree(project_path, leaf_texts):
+    """
+    Monta a árvore de diretórios a partir dos resumos dos arquivos e calcula a chave de
+    cada nó: folhas pelo hash do resumo, diretórios pelo hash do rótulo e das chaves dos
+    filhos (como uma árvore de Merkle). Nenhuma chamada ao modelo é feita aqui.
+    Args:
+        project_path (str): Raiz do projeto (raiz da árvore).
+        leaf_texts (dict): Resumo de cada arquivo (ver leaf_summary).
+    Returns:
+        SummaryNode: A raiz da árvore.
+    """
+    project_path = os.path.abspath(project_path)
+    root = SummaryNode(os.path.join(project_path, ""), [], 0)
+    directories = {"": root}
+    for path in sorted(leaf_texts):
+        parts = os.path.relpath(path, project_path).split(os.sep)
+        parent = root
+        prefix = ""
+        for part in parts[:-1]:
+            prefix = os.path.join(prefix, part)
+            node = directories.get(prefix)
+            if node is None:
+                node = directories[prefix] = SummaryNode(os.path.join(project_path, prefix, ""), [], parent.depth + 1)
+                parent.children.append(node)
+            parent = node
+        leaf = SummaryNode(path, None, parent.depth + 1)
+        leaf.text = leaf_texts[path]
+        leaf.key = database.hash_content(leaf.text)
+        parent.children.append(leaf)
+
+    for node in directories_bottom_up(root):
+        node.files = sum(child.files for child in node.children)
+        node.key = database.hash_content(
+            f"v{SUMMARY_VERSION}\0{node.label}\0" + "\0".join(child.key for child in node.children))
+    return root
+
+
+def directories_bottom_up(root):
+    """Os diretórios da árvore, dos mais profundos para a raiz."""
+    directories = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        directories.append(node)
+        stack.extend(child for child in node.children if child.is_directory)
+    directories.sort(key=lambda node: node.depth, reverse=True)
+    return directories
+
+
+def memory_key(node):
+    return f"v{SUMMARY_VERSION}:{node.key}"
+
+
+def load_cached(nodes):
+    """Preenche o texto dos nós já resumidos em execuções anteriores. Retorna quantos foram encontrados."""
+    cached = database.load_memory(SUMMARY_MEMORY_AGENT, {memory_key(node) for node in nodes}, cache=True)
+    found = 0
+    for node in nodes:
+        text = cached.get(memory_key(node))
+        if text is not None:
+            node.text = text
+            found += 1
+    return found
+
+
+def save(nodes):
+    """Grava os resumos dos nós na tabela 'memory'."""
+    if nodes:
+        database.save_memory(SUMMARY_MEMORY_AGENT, {memory_key(node): node.text for node in nodes}, cache=True)
+
+
+def chunk_children(node, token_budget=SUMMARY_INPUT_TOKENS):
+    """Divide os filhos de um diretório em grupos que cabem em uma chamada ao Resumidor."""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for child in node.children:
+        tokens = metrics.estimate_tokens(child.text)
+        if current and current_tokens + tokens > token_budget:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(child)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def select_context(root, token_budget=DEFAULT_SUMMARY_TOKEN_BUDGET):
+    """
+    Escolhe a profundidade da árvore que cabe no orçamento: começa pelo resumo do projeto
+    e troca o resumo de um diretório pelos resumos dos seus filhos enquanto o total couber,
+    expandindo primeiro os diretórios com mais arquivos.
+    Returns:
+        dict: Texto de cada nó escolhido (rótulo -> texto), em ordem de rótulo.
+    """
+    frontier = {root.label: root}
+    total = metrics.estimate_tokens(root.text)
+    queue = [(-root.files, root.label, root)]
+    while queue:
+        _, _, node = heapq.heappop(queue)
+        expanded = sum(metrics.estimate_tokens(child.text) for child in node.children)
+        if total - metrics.estimate_tokens(node.text) + expanded > token_budget:
+            continue
+        del frontier[node.label]
+        total += expanded - metrics.estimate_tokens(node.text)
+        for child in node.children:
+            frontier[child.label] = child
+            if child.is_directory:
+                heapq.heappush(queue, (-child.files, child.label, child))
+    return {label: frontier[label].text for label in sorted(frontier)}
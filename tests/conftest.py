@@ -0,0 +1,19 @@
+# tests/conftest.py
+# Configuração comum dos testes: os módulos do projeto ficam na raiz do repositório.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture
+def temp_database(tmp_path, monkeypatch):
+    """Bancos temporários: os testes não usam nem alteram os caches do usuário."""
+    import database
+    monkeypatch.setattr(database, "DB_FILE", str(tmp_path / "doc_agent.db"))
+    monkeypatch.setattr(database, "LLM_CACHE_DB_FILE", str(tmp_path / "llm_cache.db"))
+    database.initialize_database()
+    yield database
+    database.close_connections()
@@ -0,0 +1,74 @@
+# tests/test_context_prefix.py
+# O Analista e o Escritor precisam enviar o mesmo bloco de contexto, byte a byte, para
+# que o prefixo em cache do provedor seja reaproveitado (ver knowledge_base.build_context_block).
+import random
+
+import pytest
+
+import tools
+from agents import analyzer, runtime, writer
+from knowledge_base import build_context_block
+
+FIXTURE_FILES = {
+    "README.md": "# Projeto\n\nUse `python app.py --porta 8080`.\n",
+    "app.py": "import os\n\n\ndef main(porta=8080):\n    \"\"\"Inicia o servidor.\"\"\"\n"
+              "    return os.getenv(\"APP_TOKEN\")\n",
+    "docs/guia.md": "## Guia\n\nConfigure `APP_TOKEN` antes de iniciar.\n",
+    "src/rotas.ts": "export function listar(req: any): string {\n  return process.env.API_URL;\n}\n",
+    "src/util.py": "class Cache:\n    def obter(self, chave):\n        return chave\n",
+}
+
+
+@pytest.fixture
+def fixture_project(tmp_path, temp_database):
+    for relative, text in FIXTURE_FILES.items():
+        path = tmp_path / "projeto" / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    knowledge_base = tools.scan_project(str(tmp_path / "projeto"), ["**/*.py", "**/*.ts", "**/*.md"])
+    knowledge_base.sort_by_priority()
+    return knowledge_base
+
+
+@pytest.mark.parametrize("mode", ["full", "skeleton"])
+def test_analyzer_and_writer_share_the_context_prefix(fixture_project, mode):
+    paths = fixture_project.context_paths(mode)
+    contents = fixture_project.contents(mode)
+    assert len(paths) == len(FIXTURE_FILES)
+    analyzer_context, analyzer_prompt = analyzer._build_prompt(paths, contents)
+    writer_context, writer_prompt = writer._build_writer_prompt(
+        ["O README não documenta `APP_TOKEN`."], fixture_project, mode)
+
+    assert runtime.context_hash(analyzer_context) == runtime.context_hash(writer_context)
+    assert analyzer_context == writer_context
+    # O que muda entre as etapas vai apenas no prompt, depois do prefixo
+    assert analyzer_prompt != writer_prompt
+    assert "APP_TOKEN`." not in writer_context
+
+
+def test_context_prefix_does_not_depend_on_file_order(fixture_project):
+    paths = fixture_project.paths()
+    contents = fixture_project.contents()
+    expected = runtime.context_hash(build_context_block(paths, contents))
+
+    assert runtime.context_hash(build_context_block(list(reversed(paths)), contents)) == expected
+    rng = random.Random(0)
+    for _ in range(5):
+        shuffled = list(paths)
+        rng.shuffle(shuffled)
+        reordered = {path: contents[path] for path in reversed(shuffled)}
+        assert runtime.context_hash(build_context_block(shuffled, reordered)) == expected
+
+
+def test_context_prefix_does_not_depend_on_discrepancies(fixture_project):
+    first, _ = writer._build_writer_prompt(["Uma discrepância."], fixture_project)
+    second, _ = writer._build_writer_prompt(["Outra discrepância.", "Mais uma."], fixture_project)
+    assert runtime.context_hash(first) == runtime.context_hash(second)
+
+
+def test_context_prefix_changes_with_file_contents(fixture_project):
+    paths = fixture_project.paths()
+    contents = dict(fixture_project.contents())
+    expected = runtime.context_hash(build_context_block(paths, contents))
+    contents[paths[0]] += "\n# alterado\n"
+    assert runtime.context_hash(build_context_block(paths, contents)) != expected
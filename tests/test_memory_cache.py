@@ -0,0 +1,52 @@
+# tests/test_memory_cache.py
+# Validade e limite (LRU) dos caches derivados guardados na tabela 'memory' (database.py).
+import pytest
+
+
+@pytest.fixture
+def db(temp_database, monkeypatch):
+    monkeypatch.setenv("DOC_AGENT_MEMORY_CACHE_MAX_ENTRIES", "3")
+    return temp_database
+
+
+def _keys(db, agent_name):
+    conn = db.create_connection()
+    return {key for key, in conn.execute("SELECT key FROM memory WHERE agent_name = ?", (agent_name,))}
+
+
+def _age(db, agent_name, key, days):
+    conn = db.create_connection()
+    conn.execute("UPDATE memory SET timestamp = datetime('now', ?) WHERE agent_name = ? AND key = ?",
+                 (f"-{days} days", agent_name, key))
+
+
+def test_cache_keeps_at_most_max_entries(db):
+    for index in range(5):
+        db.save_memory("skeleton", {f"k{index}": "texto"}, cache=True)
+    assert _keys(db, "skeleton") == {"k2", "k3", "k4"}
+
+
+def test_reading_an_entry_keeps_it_in_the_cache(db):
+    db.save_memory("skeleton", {"k0": "a", "k1": "b", "k2": "c"}, cache=True)
+    for days, key in ((3, "k0"), (2, "k1"), (2, "k2")):
+        _age(db, "skeleton", key, days)
+    # A entrada mais antiga é lida e deixa de ser a menos usada recentemente
+    assert db.load_memory("skeleton", {"k0"}, cache=True) == {"k0": "a"}
+    db.save_memory("skeleton", {"k3": "d"}, cache=True)
+    assert _keys(db, "skeleton") == {"k0", "k2", "k3"}
+
+
+def test_expired_entries_are_removed(db):
+    db.save_memory("tokens", {"velho": "10", "recente": "20"}, cache=True)
+    _age(db, "tokens", "velho", 31)
+    db.save_memory("tokens", {"novo": "30"}, cache=True)
+    assert _keys(db, "tokens") == {"recente", "novo"}
+
+
+def test_limits_apply_per_agent_and_only_to_caches(db):
+    db.save_memory("analyzer_incremental", {f"estado{index}": "x" for index in range(5)})
+    _age(db, "analyzer_incremental", "estado0", 365)
+    for index in range(5):
+        db.save_memory("dedup", {f"k{index}": "assinatura"}, cache=True)
+    assert len(_keys(db, "analyzer_incremental")) == 5
+    assert len(_keys(db, "dedup")) == 3
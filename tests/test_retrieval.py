@@ -0,0 +1,19 @@
+# tests/test_retrieval.py
+# Testes do índice BM25 (retrieval.py).
+from retrieval import BM25Index, term_frequencies
+
+
+def test_search_with_only_empty_documents():
+    index = BM25Index()
+    index.add("a.py", term_frequencies("", ""))
+    assert index.search(["cache"]) == []
+
+
+def test_empty_document_does_not_affect_ranking():
+    index = BM25Index()
+    index.add("a.py", term_frequencies("", ""))
+    index.add("cache.py", term_frequencies("cache.py", "def obter_cache(chave):\n    return cache[chave]\n"))
+    index.add("rotas.py", term_frequencies("rotas.py", "def listar_rotas():\n    return rotas\n"))
+    results = index.search(["cache"])
+    assert [path for path, _ in results] == ["cache.py"]
+    assert results[0][1] > 0
@@ -0,0 +1,316 @@
+# tests/test_scheduler.py
+# Testes do escalonador de chamadas ao modelo (agents/scheduler.py) com chamadas falsas,
+# sem rede e sem esperas reais.
+import threading
+import time
+
+import pytest
+
+from agents import scheduler
+from agents.scheduler import ModelScheduler, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ModelError(Exception):
+    """Imita os erros do SDK do provedor, que trazem o status HTTP em status_code."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeResponse:
+    def __init__(self, content, status=None):
+        self.content = content
+        self.status = status
+
+
+def make_scheduler(**kwargs):
+    """
+    Escalonador sem limites por minuto, com relógio falso: as esperas do backoff são
+    registradas e avançam o relógio em vez de dormir.
+    """
+    clock = FakeClock()
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock.now += seconds
+
+    kwargs.setdefault("max_retries", 3)
+    sched = ModelScheduler(requests_per_minute=0, tokens_per_minute=0, clock=clock, sleep=sleep, **kwargs)
+    return sched, sleeps
+
+
+def failing(failures, error):
+    """Chamada falsa que lança `error` nas primeiras `failures` tentativas e depois responde."""
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return "ok"
+
+    return fn, calls
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condição não satisfeita a tempo"
+        time.sleep(0.001)
+
+
+# ----------------------------------------
+# Classificação dos erros
+# ----------------------------------------
+
+@pytest.mark.parametrize("error", [
+    ModelError("rate limited", status_code=429),
+    ModelError("overloaded", status_code=529),
+    ModelError("internal", status_code=500),
+    "Error code: 429 - {'type': 'error', 'error': {'type': 'rate_limit_error'}}",
+    "Error code: 529 - overloaded_error",
+    "status_code=503",
+    "Request timed out.",
+    ConnectionError("connection reset by peer"),
+])
+def test_transient_errors_are_retryable(error):
+    assert scheduler.is_retryable_error(error)
+
+
+@pytest.mark.parametrize("error", [
+    ModelError("bad request", status_code=400),
+    "max_tokens: 512 > limit",
+    "Erro de sintaxe na linha 503",
+    "Error code: 400 - invalid_request_error: prompt has 520 tokens too many",
+    ValueError("invalid api key"),
+])
+def test_permanent_errors_are_not_retryable(error):
+    assert not scheduler.is_retryable_error(error)
+
+
+# ----------------------------------------
+# Token bucket
+# ----------------------------------------
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)  # uma ficha por segundo
+    assert bucket.wait_time(60) == 0.0
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now = 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    clock.now = 30.0
+    assert bucket.wait_time(30) == pytest.approx(0.0)
+    # Nunca passa da capacidade de um minuto
+    clock.now = 1000.0
+    assert bucket.wait_time(61) == pytest.approx(0.0)
+    bucket.consume(61)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+
+def test_disabled_token_bucket_never_waits():
+    bucket = TokenBucket(0)
+    bucket.consume(10 ** 9)
+    assert bucket.wait_time(10 ** 9) == 0.0
+
+
+# ----------------------------------------
+# Novas tentativas
+# ----------------------------------------
+
+def test_retries_transient_errors_then_succeeds():
+    sched, sleeps = make_scheduler()
+    fn, calls = failing(2, ModelError("Error code: 429 - rate_limit_error", status_code=429))
+    assert sched.call(fn) == ("ok", False)
+    assert len(calls) == 3
+    assert len(sleeps) == 2
+    assert sched.stats["retries"] == 2
+    assert sched.stats["rate_limited"] == 2
+
+
+def test_does_not_retry_permanent_errors():
+    sched, sleeps = make_scheduler()
+    fn, calls = failing(1, ModelError("max_tokens: 512 > limit", status_code=400))
+    with pytest.raises(ModelError):
+        sched.call(fn)
+    assert len(calls) == 1
+    assert sleeps == []
+    assert sched.stats["retries"] == 0
+
+
+def test_gives_up_after_max_retries():
+    sched, sleeps = make_scheduler(max_retries=2)
+    fn, calls = failing(10, ModelError("overloaded", status_code=529))
+    with pytest.raises(ModelError):
+        sched.call(fn)
+    assert len(calls) == 3
+    assert len(sleeps) == 2
+
+
+def test_backoff_grows_exponentially_with_jitter():
+    sched, sleeps = make_scheduler(max_retries=4, base_delay=1.0, max_delay=5.0)
+    fn, _ = failing(4, ModelError("internal", status_code=500))
+    sched.call(fn)
+    for attempt, delay in enumerate(sleeps):
+        assert 0.0 <= delay <= min(5.0, 2 ** attempt)
+
+
+def test_retries_error_responses_reported_by_check():
+    sched, sleeps = make_scheduler()
+    responses = [FakeResponse("Error code: 529 - overloaded_error", status="ERROR"), FakeResponse("ok")]
+
+    def check(response):
+        return response.content if response.status == "ERROR" else None
+
+    result, deduplicated = sched.call(lambda: responses.pop(0), check=check)
+    assert result.content == "ok" and not deduplicated
+    assert len(sleeps) == 1
+
+
+def test_returns_permanent_error_response_without_retrying():
+    sched, sleeps = make_scheduler()
+    error = FakeResponse("Error code: 400 - invalid_request_error", status="ERROR")
+    result, _ = sched.call(lambda: error, check=lambda response: response.content)
+    assert result is error
+    assert sleeps == []
+
+
+def test_stream_retries_errors_before_the_first_item():
+    sched, sleeps = make_scheduler()
+    attempts = []
+
+    def open_stream():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ModelError("Error code: 429 - rate_limit_error")
+        yield "a"
+        yield "b"
+
+    assert list(sched.stream(open_stream)) == ["a", "b"]
+    assert len(attempts) == 2
+    assert len(sleeps) == 1
+
+
+def test_stream_raises_errors_after_the_first_item():
+    sched, sleeps = make_scheduler()
+
+    def open_stream():
+        yield "a"
+        raise ModelError("Error code: 529 - overloaded_error")
+
+    received = []
+    with pytest.raises(ModelError):
+        for item in sched.stream(open_stream):
+            received.append(item)
+    assert received == ["a"]
+    assert sleeps == []
+    assert sched._active == 0
+
+
+# ----------------------------------------
+# Prioridade e desduplicação
+# ----------------------------------------
+
+def test_queued_calls_are_admitted_by_priority():
+    sched, _ = make_scheduler(max_concurrent=1)
+    order = []
+    threads = []
+    with sched.slot():
+        # Com a única vaga ocupada, as chamadas entram na fila na ordem inversa da prioridade
+        for priority in (scheduler.PRIORITY_LOW, scheduler.PRIORITY_NORMAL, scheduler.PRIORITY_HIGH):
+            thread = threading.Thread(target=sched.call, args=(lambda p=priority: order.append(p), priority))
+            thread.start()
+            threads.append(thread)
+            wait_until(lambda n=len(threads): len(sched._queue) == n)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == [scheduler.PRIORITY_HIGH, scheduler.PRIORITY_NORMAL, scheduler.PRIORITY_LOW]
+
+
+def test_same_priority_calls_keep_arrival_order():
+    sched, _ = make_scheduler(max_concurrent=1)
+    order = []
+    threads = []
+    with sched.slot():
+        for index in range(4):
+            thread = threading.Thread(target=sched.call, args=(lambda i=index: order.append(i),))
+            thread.start()
+            threads.append(thread)
+            wait_until(lambda n=len(threads): len(sched._queue) == n)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == [0, 1, 2, 3]
+
+
+def test_concurrent_identical_keys_share_one_execution():
+    sched, _ = make_scheduler()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "resposta"
+
+    results = {}
+
+    def worker(name):
+        results[name] = sched.call(fn, key="mesmo-prompt")
+
+    first = threading.Thread(target=worker, args=("first",))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=worker, args=("second",))
+    second.start()
+    wait_until(lambda: sched.stats["deduplicated"] == 1)
+    release.set()
+    first.join(timeout=5)
+    second.join(timeout=5)
+    assert len(calls) == 1
+    assert results == {"first": ("resposta", False), "second": ("resposta", True)}
+    # Terminada a chamada, a chave deixa de ser compartilhada
+    assert sched.call(fn, key="mesmo-prompt") == ("resposta", False)
+    assert len(calls) == 2
+
+
+def test_deduplicated_calls_share_the_error():
+    sched, _ = make_scheduler()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+        raise ValueError("invalid api key")
+
+    errors = []
+
+    def worker():
+        try:
+            sched.call(fn, key="mesmo-prompt")
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=worker))
+    threads[1].start()
+    wait_until(lambda: sched.stats["deduplicated"] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert len(errors) == 2
@@ -1,15 +1,32 @@
 # tools.py
 import os
+import re
 import glob
 import json
+import fnmatch
+import mmap
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
-from agno.tools import tool
+import database
+import metrics
+import skeleton
+import summaries
+from knowledge_base import DOC_EXTENSIONS, FileEntry, KnowledgeBase
 
 # ========================================
-# TOOLS PARA AGENTES (usando decorator @tool)
+# TOOLS PARA AGENTES (expostas com o decorator @tool do agno via agent_tools)
 # ========================================
 
-@tool
+def agent_tools(*names):
+    """
+    Retorna as funções deste módulo indicadas em `names` decoradas com o @tool do agno.
+    O decorator é aplicado apenas quando um agente é construído, para que importar
+    este módulo não carregue o agno.
+    """
+    from agno.tools import tool
+    return [tool(globals()[name]) for name in names]
+
+
 def find_files_in_project(project_path: str, patterns: List[str]) -> str:
     """
     Encontra arquivos em um projeto baseado em padrões glob.
@@ -21,32 +38,13 @@ def find_files_in_project(project_path: str, patterns: List[str]) -> str:
     Returns:
         JSON string com lista de caminhos de arquivos encontrados
     """
-    found_files = []
-    
-    # Converte para caminho absoluto
-    project_path = os.path.abspath(project_path)
-    
-    # Para cada padrão fornecido
-    for pattern in patterns:
-        # Combina o caminho do projeto com o padrão
-        full_pattern = os.path.join(project_path, pattern)
-        
-        # Encontra arquivos que correspondem ao padrão
-        matching_files = glob.glob(full_pattern, recursive=True)
-        
-        # Adiciona à lista (evita duplicatas)
-        for file_path in matching_files:
-            if os.path.isfile(file_path) and file_path not in found_files:
-                found_files.append(file_path)
-    
-    # Ordena e remove duplicatas
-    found_files = sorted(list(set([os.path.abspath(f) for f in found_files])))
+    # Uma única varredura do diretório atende a todos os padrões de uma vez
+    found_files = scan_project(project_path, patterns).paths()
     
     # Retorna como JSON
     return json.dumps(found_files, indent=2)
 
 
-@tool 
 def read_file_content(file_path: str) -> str:
     """
     Lê o conteúdo de um arquivo de texto.
@@ -58,22 +56,7 @@ def read_file_content(file_path: str) -> str:
         Conteúdo do arquivo como string
     """
     try:
-        # Tenta diferentes codificações
-        encodings = ['utf-8', 'utf-16', 'latin1', 'cp1252']
-        
-        for encoding in encodings:
-            try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    content = f.read()
-                return content
-            except UnicodeDecodeError:
-                continue
-        
-        # Se todas as codificações falharem, lê como binário e converte
-        with open(file_path, 'rb') as f:
-            content = f.read()
-            return content.decode('utf-8', errors='replace')
-            
+        return read_text_file(file_path)
     except FileNotFoundError:
         return f"Erro: Arquivo '{file_path}' não encontrado."
     except Exception as e:
@@ -84,29 +67,345 @@ def read_file_content(file_path: str) -> str:
 # FUNÇÕES AUXILIARES (não são tools)
 # ========================================
 
+# Limites do leitor de arquivos (sobrescritos por DOC_AGENT_MAX_FILE_BYTES)
+DEFAULT_MAX_FILE_BYTES = 512 * 1024
+# Arquivos maiores que isto são lidos via mmap em vez de um read() completo
+MMAP_THRESHOLD = 1024 * 1024
+# Quantidade de bytes inspecionada para detectar conteúdo binário
+BINARY_SNIFF_BYTES = 8192
+# Fração do limite reservada ao início do arquivo quando ele é truncado
+TRUNCATE_HEAD_RATIO = 0.75
+
+_BOMS = (
+    (b'\xef\xbb\xbf', 'utf-8-sig'),
+    (b'\xff\xfe', 'utf-16'),
+    (b'\xfe\xff', 'utf-16'),
+)
+
+
+def _max_file_bytes():
+    return int(os.getenv("DOC_AGENT_MAX_FILE_BYTES", DEFAULT_MAX_FILE_BYTES))
+
+
+def _read_bytes(file_path, size, max_bytes):
+    """
+    Lê os bytes do arquivo em uma única passada. Arquivos acima de max_bytes têm
+    apenas o início e o fim lidos; arquivos grandes usam mmap.
+    Returns:
+        tuple: (início, fim) — fim é None quando o arquivo é lido por completo.
+    """
+    with open(file_path, 'rb') as f:
+        if size == 0:
+            return b'', None
+        if size <= max_bytes:
+            if size < MMAP_THRESHOLD:
+                return f.read(), None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[:], None
+        head_size = int(max_bytes * TRUNCATE_HEAD_RATIO)
+        tail_size = max_bytes - head_size
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[:head_size], mapped[size - tail_size:]
+
+
+def _sniff_encoding(data):
+    """
+    Identifica a codificação a partir do BOM ou da validade UTF-8 do conteúdo.
+    Retorna None para conteúdo binário.
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return encoding
+    if b'\x00' in data[:BINARY_SNIFF_BYTES]:
+        return None
+    try:
+        data.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # Um caractere multibyte cortado no fim de um trecho truncado ainda é UTF-8 válido
+        if e.start >= len(data) - 3 and e.reason == 'unexpected end of data':
+            return 'utf-8'
+    try:
+        data.decode('cp1252')
+        return 'cp1252'
+    except UnicodeDecodeError:
+        return 'latin1'
+
+
+def read_text_file(file_path, max_bytes=None):
+    """
+    Lê e decodifica um arquivo de texto lendo seus bytes uma única vez.
+
+    A codificação é detectada pelo BOM ou pela validade UTF-8 (com cp1252 e latin1
+    como alternativas). Arquivos binários são omitidos, e arquivos acima de max_bytes
+    (padrão: DOC_AGENT_MAX_FILE_BYTES) são truncados, mantendo o início e o fim.
+    Lança OSError (ex: FileNotFoundError) se o arquivo não puder ser aberto.
+    """
+    if max_bytes is None:
+        max_bytes = _max_file_bytes()
+    size = os.stat(file_path).st_size
+    head, tail = _read_bytes(file_path, size, max_bytes)
+
+    encoding = _sniff_encoding(head)
+    if encoding is None:
+        return f"[Arquivo binário omitido: {os.path.basename(file_path)} ({size} bytes)]"
+    if tail is None:
+        return head.decode(encoding, errors='replace')
+
+    # Os cortes podem cair no meio de um caractere multibyte; descartamos os fragmentos
+    omitted = size - len(head) - len(tail)
+    tail_encoding = 'utf-8' if encoding == 'utf-8-sig' else encoding
+    return (
+        head.decode(encoding, errors='ignore')
+        + f"\n\n[... {omitted} bytes omitidos de {os.path.basename(file_path)} ...]\n\n"
+        + tail.decode(tail_encoding, errors='ignore')
+    )
+
+
+def read_project_files(file_paths, with_hashes=False):
+    """
+    Lê vários arquivos através do cache de conteúdo compartilhado (database.file_cache),
+    usado tanto pelo Analista quanto pelo Escritor.
+
+    Returns:
+        dict: Conteúdo de cada caminho; arquivos ilegíveis recebem uma mensagem de erro.
+        Com with_hashes=True, retorna a tupla (conteúdos, hashes); arquivos ilegíveis
+        não têm hash.
+    """
+    contents, hashes, errors = database.get_file_contents(file_paths, read_text_file)
+    metrics.add(files_read=len(contents), bytes_read=sum(len(content.encode('utf-8', errors='surrogatepass'))
+                                                         for content in contents.values()))
+    for path, error in errors.items():
+        if isinstance(error, FileNotFoundError):
+            contents[path] = f"Erro: Arquivo '{path}' não encontrado."
+        else:
+            contents[path] = f"Erro ao ler arquivo '{path}': {error}"
+    if with_hashes:
+        return contents, hashes
+    return contents
+
+
+# Modos de contexto aceitos por read_project_context
+CONTEXT_MODES = ('full', 'skeleton', 'summary')
+# Nome usado na tabela 'memory' para os esqueletos em cache
+SKELETON_MEMORY_AGENT = "skeleton"
+
+
+def read_project_context(file_paths, mode='full'):
+    """
+    Lê os arquivos que serão enviados ao modelo, no modo de contexto escolhido.
+
+    No modo 'full' retorna o conteúdo completo (ver read_project_files). No modo
+    'skeleton', arquivos de código suportados são substituídos por seus esqueletos
+    (assinaturas, docstrings, rotas e variáveis de ambiente), que ficam em cache na
+    tabela 'memory' indexados pelo hash do conteúdo; a documentação segue completa. No
+    modo 'summary', cada arquivo é reduzido ao seu resumo (o texto do modo 'skeleton'
+    truncado, ver summaries.leaf_summary); os resumos de diretório da árvore completa são
+    montados pelo Agente Resumidor.
+    Returns:
+        dict: Texto de cada caminho.
+    """
+    if mode not in CONTEXT_MODES:
+        raise ValueError(f"Modo de contexto desconhecido: {mode!r}. Use um de {CONTEXT_MODES}.")
+    if mode == 'full':
+        return read_project_files(file_paths)
+    if mode == 'summary':
+        contents = read_project_context(file_paths, 'skeleton')
+        return {path: summaries.leaf_summary(text) for path, text in contents.items()}
+
+    contents, hashes = read_project_files(file_paths, with_hashes=True)
+    code_paths = [path for path in file_paths if path in hashes and skeleton.supports_skeleton(path)]
+    keys = {path: f"v{skeleton.SKELETON_VERSION}:{hashes[path]}" for path in code_paths}
+    cached = database.load_memory(SKELETON_MEMORY_AGENT, set(keys.values()), cache=True)
+
+    new_items = {}
+    original_size = 0
+    skeleton_size = 0
+    for path in code_paths:
+        original_size += len(contents[path])
+        key = keys[path]
+        if key not in cached:
+            cached[key] = new_items[key] = skeleton.extract_skeleton(path, contents[path])
+        contents[path] = cached[key]
+        skeleton_size += len(contents[path])
+    if new_items:
+        database.save_memory(SKELETON_MEMORY_AGENT, new_items, cache=True)
+    if code_paths:
+        print(f"[Esqueletos] {len(code_paths)} arquivos de código reduzidos de {original_size} "
+              f"para {skeleton_size} caracteres ({len(new_items)} gerados, {len(code_paths) - len(new_items)} do cache).")
+    return contents
+
+
+# Diretórios de dependências, builds e ambientes virtuais que nunca são analisados
+VENDOR_DIRS = {
+    '.git', '.hg', '.svn', 'node_modules', 'bower_components', 'vendor',
+    '__pycache__', '.venv', 'venv', 'env', '.tox', '.nox', '.mypy_cache',
+    '.pytest_cache', '.ruff_cache', 'dist', 'build', 'site-packages', 'docs.old',
+}
+
+
+def _compile_patterns(patterns):
+    """
+    Converte os padrões glob em duas expressões regulares: uma aplicada ao nome
+    do arquivo (padrões do tipo '**/*.py') e outra ao caminho relativo completo.
+    """
+    name_patterns = []
+    path_patterns = []
+    for pattern in patterns:
+        pattern = pattern.replace('\\', '/')
+        if pattern.startswith('**/') and '/' not in pattern[3:]:
+            name_patterns.append(fnmatch.translate(pattern[3:]))
+        else:
+            path_patterns.append(fnmatch.translate(pattern.replace('**/', '*')))
+    name_regex = re.compile('|'.join(name_patterns)) if name_patterns else None
+    path_regex = re.compile('|'.join(path_patterns)) if path_patterns else None
+    return name_regex, path_regex
+
+
+def _load_gitignore(project_path):
+    """
+    Lê o .gitignore da raiz do projeto e retorna os padrões de exclusão.
+    Negações ('!padrão') não são suportadas e são ignoradas.
+    """
+    rules = []
+    gitignore_path = os.path.join(project_path, '.gitignore')
+    try:
+        with open(gitignore_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#') or line.startswith('!'):
+                    continue
+                dir_only = line.endswith('/')
+                line = line.strip('/')
+                if line:
+                    rules.append((line, dir_only, '/' in line))
+    except OSError:
+        pass
+    return rules
+
+
+def _is_ignored(rel_path, name, is_dir, gitignore_rules):
+    for pattern, dir_only, anchored in gitignore_rules:
+        if dir_only and not is_dir:
+            continue
+        target = rel_path if anchored else name
+        if fnmatch.fnmatch(target, pattern):
+            return True
+    return False
+
+
+def _process_entries(project_path, entries, name_regex, path_regex, gitignore_rules):
+    """
+    Classifica as entradas de um diretório: retorna os registros dos arquivos que
+    correspondem aos padrões (com metadados do stat) e os subdiretórios a visitar.
+    """
+    results = []
+    subdirs = []
+    for entry in entries:
+        rel_path = os.path.relpath(entry.path, project_path).replace(os.sep, '/')
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            continue
+        if is_dir:
+            if entry.name not in VENDOR_DIRS and not _is_ignored(rel_path, entry.name, True, gitignore_rules):
+                subdirs.append(entry.path)
+            continue
+        if not ((name_regex and name_regex.match(entry.name)) or
+                (path_regex and path_regex.match(rel_path))):
+            continue
+        if gitignore_rules and _is_ignored(rel_path, entry.name, False, gitignore_rules):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError as e:
+            print(f"[Scanner] Aviso: não foi possível obter metadados de '{entry.path}': {e}")
+            continue
+        results.append(FileEntry.from_stat(entry.path, stat))
+    return results, subdirs
+
+
+def _list_dir(path):
+    try:
+        with os.scandir(path) as it:
+            return list(it)
+    except OSError as e:
+        print(f"[Scanner] Aviso: não foi possível listar '{path}': {e}")
+        return None
+
+
+def _scan_tree(project_path, start_dir, name_regex, path_regex, gitignore_rules):
+    """
+    Percorre iterativamente uma subárvore com os.scandir, coletando os metadados
+    dos arquivos que correspondem aos padrões na mesma passada.
+    """
+    results = []
+    stack = [start_dir]
+    while stack:
+        entries = _list_dir(stack.pop())
+        if entries is None:
+            continue
+        found, subdirs = _process_entries(project_path, entries, name_regex, path_regex, gitignore_rules)
+        results.extend(found)
+        stack.extend(subdirs)
+    return results
+
+
+def scan_project(project_path, patterns, max_workers=None):
+    """
+    Varre o projeto uma única vez, aplicando todos os padrões glob simultaneamente,
+    e retorna os registros da base de conhecimento já com os metadados de cada arquivo.
+
+    Diretórios de dependências (VENDOR_DIRS) e entradas do .gitignore da raiz são
+    podados durante a varredura. As subárvores de primeiro nível são percorridas
+    em paralelo por um pool de threads.
+
+    Args:
+        project_path: Caminho para o diretório do projeto.
+        patterns: Lista de padrões glob (ex: ['**/*.py', '**/*.md']).
+        max_workers: Número máximo de threads de varredura.
+
+    Returns:
+        KnowledgeBase: Entradas (FileEntry) ordenadas por caminho.
+    """
+    project_path = os.path.abspath(project_path)
+    name_regex, path_regex = _compile_patterns(patterns)
+    gitignore_rules = _load_gitignore(project_path)
+
+    root_entries = _list_dir(project_path)
+    if root_entries is None:
+        return KnowledgeBase()
+
+    # Arquivos da raiz são tratados aqui; cada subdiretório vira uma tarefa do pool
+    results, subdirs = _process_entries(project_path, root_entries, name_regex, path_regex, gitignore_rules)
+    if subdirs:
+        workers = max_workers or min(32, (os.cpu_count() or 1) * 4, len(subdirs))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_scan_tree, project_path, subdir, name_regex, path_regex, gitignore_rules)
+                for subdir in subdirs
+            ]
+            for future in futures:
+                results.extend(future.result())
+
+    results.sort(key=lambda entry: entry.path)
+    return KnowledgeBase(results)
+
+
 def get_project_documentation(project_path):
     """
     Lê todos os arquivos .md e .txt do diretório de um projeto e retorna seu conteúdo.
     Isso fornece a base de conhecimento para o agente.
     """
-    docs_content = ""
-    search_pattern = os.path.join(project_path, "**", "*")
-    
-    # Encontra todos os arquivos .md e .txt recursivamente
-    doc_files = [f for f in glob.glob(search_pattern, recursive=True) 
-                 if f.endswith((".md", ".txt")) and os.path.isfile(f)]
-    
-    for file_path in doc_files:
+    parts = []
+    for file_path in list_doc_files(project_path):
         filename = os.path.basename(file_path)
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                docs_content += f"--- Início de {filename} ---\n"
-                docs_content += f.read()
-                docs_content += f"\n--- Fim de {filename} ---\n\n"
+            parts.append(f"--- Início de {filename} ---\n{read_text_file(file_path)}\n--- Fim de {filename} ---\n\n")
         except Exception as e:
-            docs_content += f"--- Erro ao ler {filename}: {e}---\n\n"
+            parts.append(f"--- Erro ao ler {filename}: {e}---\n\n")
             
-    return docs_content
+    return "".join(parts)
 
 
 def list_doc_files(project_path):
@@ -150,8 +449,7 @@ def read_file_content_legacy(file_path):
     Use read_file_content() com @tool em vez desta.
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        return read_text_file(file_path)
     except FileNotFoundError:
         return f"Erro: Arquivo não encontrado em '{file_path}'."
     except Exception as e: